@@ -1,374 +1,1060 @@
-import paramiko
-from getpass import getpass
-import time
-import re
-import ast
-import numpy as np
-from scipy.interpolate import interp1d
-
-# -*- coding: utf-8 -*-
-import time
-import paramiko
-from typing import Optional
-
-class LLRFConnection:
-    def __init__(self,
-                 ip_address: str,
-                 username: str,
-                 password: Optional[str] = None,
-                 keyfile: Optional[str] = None,
-                 port: Optional[int] = None):
-        self.ip = ip_address
-        self.user = username
-        self.password = password
-        self.keyfile = keyfile
-        self.port = port
-        self.client: Optional[paramiko.SSHClient] = None
-        self.chan = None
-
-    def connect(self, timeout: int = 10, look_for_keys: bool = False, allow_agent: bool = False):
-        
-        self.client = paramiko.SSHClient()
-        self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        self.client.connect(
-            hostname=self.ip,
-            #port=self.port,
-            username=self.user,
-            password=self.password,
-            #key_filename=self.keyfile,
-            timeout=timeout,
-            #look_for_keys=look_for_keys,
-            #allow_agent=allow_agent
-        )
-        # apri una shell interattiva se ti serve un tty
-        self.chan = self.client.invoke_shell()
-        time.sleep(0.5)
-        # svuota il banner iniziale (MOTD)
-        while self.chan.recv_ready():
-            self.chan.recv(65536)
-        command = "libera-ireg access boards.kupvm1.dsp.ff_pulse_shape.mode=Table"
-        self.run_command(command)
-            
-            
-    def FF_Change_MaxAmp(self, New_amp, printing = True ):
-        cmd_set = f'libera-ireg access boards.kupvm1.dsp.ff_amp.amplitude={New_amp}'
-        self.Send(cmd_set, False)
-
-        cmd_check = 'libera-ireg dump boards.kupvm1.dsp.ff_amp.amplitude'
-        output = self.Send(cmd_check)
-        try:
-            value_str = output.split('=')[1].strip().split()[0]
-            New_amp_readback = float(value_str)
-            if printing == True:
-                print("="*40)
-                print(f"  NEW USER SET AMPLITUDE: {New_amp_readback}  ")
-                print("="*40)            
-                return New_amp_readback
-        except (IndexError, ValueError) as e:
-            print(f"Errore nel leggere il nuovo valore dell'ampiezza: {output}")
-            raise e
-
-
-    def Restore(self):
-      
-        command_amp = f"libera-ireg access  boards.kupvm1.dsp.ff_pulse_shape.table_amp=1"
-        command_phase = f"libera-ireg access  boards.kupvm1.dsp.ff_pulse_shape.table_phase=0"
-        self.run_command(command_amp,False)
-        self.run_command(command_phase, False)
-
-
-    def FF_Get_Interval(self):
-        cmd_checkoff = 'libera-ireg dump  boards.kupvm1.feed_forward.offset'
-        cmd_checkdur = 'libera-ireg dump  boards.kupvm1.feed_forward.duration'
-        outputoff = self.Send(cmd_checkoff)
-        outputdur = self.Send(cmd_checkdur)
-        value_stroff = outputoff.split('=')[1].strip().split()[0]
-        readbackoff = float(value_stroff)
-        value_strdur = outputdur.split('=')[1].strip().split()[0]
-        readbackdur = float(value_strdur)
-        return [readbackoff,readbackdur]
-
-    def FF_Get_MaxAmp(self):
-        cmd_check = 'libera-ireg dump boards.kupvm1.dsp.ff_amp.amplitude'
-        output = self.Send(cmd_check)
-        value_str = output.split('=')[1].strip().split()[0]
-        New_amp_readback = float(value_str)
-        return New_amp_readback
-
-
-    def FF_Change_Interval(self, Offset, Duration, printing = True):
-        if Offset==0 : Offset=0.03
-        "   Inserisce la durata dell'impulso e l'offset  unita' di misura micro secondi"
-        cmd_set_duration = f'libera-ireg access boards.kupvm1.feed_forward.duration={Duration}'
-        cmd_set_Offset = f'libera-ireg access boards.kupvm1.feed_forward.offset={Offset}'
-        Out_dur = self.Send(cmd_set_duration)
-        Out_off = self.Send(cmd_set_Offset, False)
-        try:
-            if printing == True:
-                value_str = Out_dur.split('=')[1].strip().split()[0]
-                New_dur = float(value_str)
-                print("="*40)
-                print(f"  NEW USER SET Duration: {New_dur}  ")
-                value_str = Out_off.split('=')[1].strip().split()[0]
-                New_off = float(value_str)
-                print(f"  NEW USER SET Offset: {New_off}  ")
-                print("="*40) 
-                return np.array([New_dur, New_off])
-
-        except (IndexError, ValueError) as e:
-             print(f"Error in reading the new interval: {[Offset,Duration]} micros")
-             raise 
-   
-        
-   
-    
-   
-    def FF_Change_Phase(self, New_phase, printing):
-        cmd_set = f'libera-ireg access boards.kupvm1.dsp.ff_phase.phase={New_phase}'
-        if (New_phase < -400 or New_phase>400):
-            raise Exception("!!!!!! Errore- The new phase must be between -400 and 400")
-        self.Send(cmd_set, False)
-        cmd_check = 'libera-ireg dump boards.kupvm1.dsp.ff_phase.phase'
-        output = self.Send(cmd_check)
-        try:
-            value_str = output.split('=')[1].strip().split()[0]
-            New_amp_readback = float(value_str)
-            if printing == True:
-                print("="*40)
-                print(f"  NEW USER SET PHASE: {New_amp_readback}  ")
-                print("="*40)            
-                return New_amp_readback
-        except (IndexError, ValueError) as e:
-            print(f"Errore nel leggere il nuovo valore dell'ampiezza: {output}")
-            raise e
-
-    
-    
-
-
-
-
-
-    def Set_Arbitrary_Shape_AndTime(self,  Arb, Max_amp, init_t, final_t):
-             if init_t == 0 : init_t = 0.03
-             self.FF_Change_Interval(init_t, final_t - init_t, False)    ##### For stability reason pulse length is foxed to maximum, suppressed where
-             if Shape_Duration > 34:
-                print("   The arbitary  shape can be fixed only 34 micro seconds after thwe offeset  ")
-             offset = init_t
-             duration = final_t - init_t
-             print("Offset and duration changed")
-             if (np.max(Arb) > 1 or np.min(Arb)<0):
-                 Max_amp = np.max(Arb)
-                 Arb -= np.min(Arb)
-                 Arb /= np.max(Arb)
-             # zero-out values outside the active pulse region
-             initial_index = 0
-             self.FF_Change_MaxAmp(Max_amp, False)
-             final_index = int(final_t/34*4096)
-             length = (final_index - initial_index) + 1
-             shape = np.zeros(4096)
-             Interpolated_shape =  np.interp(np.linspace(0,1,length), np.linspace(0,1,len(Arb)),Arb) 
-             shape[initial_index:final_index +1 ] = Interpolated_shape
-             Norm_string = ",".join(f"{x:.6f}" for x in shape )
-             commandD = "libera-ireg access boards.kupvm1.dsp.ff_pulse_shape.table_amp=" + Norm_string
-             self.run_command(commandD)
-
-             
-    def Set_Arbitrary_Shape(self, Arb, Max_amp,init_t):
-                    # self.FF_Change_Interval(init_t, 33.99 + init_t)
-                     if (np.max(Arb) > 1 or np.min(Arb)<0):
-                         Max_amp = np.max(Arb)
-                         Arb -= np.min(Arb)
-                         Arb /= np.max(Arb)
-                         
-                     self.FF_Change_MaxAmp(Max_amp, False)
-                     Interpolated_shape =  np.interp(np.linspace(0,1,4096), np.linspace(0,1,len(Arb)),Arb)
-                     Norm_string = ",".join(f"{x:.6f}" for x in Interpolated_shape )
-                     commandD = "libera-ireg access boards.kupvm1.dsp.ff_pulse_shape.table_amp=" + Norm_string
-                     self.run_command(commandD)     
-             
-             
-             
-             
-             
-    def Set_Arbitrary_Phase(self, Arb, Cent_phase, init_t ):
-                     self.FF_Change_Interval(init_t, 33.99 + init_t)
-                     if (np.max(Arb) > 180 or np.min(Arb)<-180):
-                         Cent_phase = (np.max(Arb) - np.min(Arb))/2
-                         Arb /=np.max(Arb)
-                         Arb *=180
-                         cent = -((np.max(Arb) - np.min(Arb))/2)
-                         Arb += cent
-                     self.FF_Change_Phase(Cent_phase, False)
-                     # zero-out values outside the active pulse region
-                     Interpolated_shape =  np.interp(np.linspace(0,1,4096), np.linspace(0,1,len(Arb)),Arb)
-                     Norm_string = ",".join(f"{x:.6f}" for x in Interpolated_shape )
-                     commandD = "libera-ireg access boards.kupvm1.dsp.ff_pulse_shape.table_phase=" + Norm_string
-                     self.run_command(commandD)
-
-    def Set_Arbitrary_Phase_AndTime(self,  Arb, Cent_phase, init_t, final_t):
-             if init_t == 0 : init_t = 0.03
-             self.FF_Change_Interval(init_t, final_t - init_t, False)    ##### For stability reason pulse length is foxed to maximum, suppressed where
-             if Shape_Duration > 34:
-                print("   The arbitary  shape can be fixed only 34 micro seconds after thwe offeset  ")
-             offset = init_t
-             duration = final_t - init_t
-             final_t = offset + duration
-             print("Offset and duration changed")
-             if (np.max(Arb) > 180 or np.min(Arb)<-180):
-                 Cent_phase = (np.max(Arb) - np.min(Arb))/2
-                 Arb /=np.max(Arb)
-                 Arb *=180
-                 Arb -= Cent_phase
-             self.FF_Change_Phase(Cent_phase, False)
-             initial_index = 0
-             final_index = int(final_t/34*4096)
-             length = (final_index - initial_index) + 1
-             shape = np.zeros(4096)
-             Interpolated_shape =  np.interp(np.linspace(0,1,length), np.linspace(0,1,len(Arb)),Arb)
-             shape[initial_index:final_index +1 ] = Interpolated_shape
-             Norm_string = ",".join(f"{x:.6f}" for x in shape )
-             commandD = "libera-ireg access boards.kupvm1.dsp.ff_pulse_shape.table_phase=" + Norm_string
-             self.run_command(commandD)
-        
-        
-    def run_command(self, command):
-        if not self.client:
-            raise Exception("Client not connected. Call connect() first.")
-        stdin, stdout, stderr = self.client.exec_command(command)
-        out = stdout.read().decode()
-        err = stderr.read().decode()
-        if err:
-            print("STDERR:\n", err)
-        return out, err
-    
-    def Send(self, command, Label=False, timeout=0.5):
-        """
-        Esegue un comando sul canale interattivo mantenendo la sessione SSH attiva.
-        Legge tutto l'output fino a inattività o timeout.
-        """
-        if not self.chan:
-            raise Exception("Channel not open. Call connect() first.")
-        
-        # Pulisci eventuale output precedente
-        while self.chan.recv_ready():
-            self.chan.recv(65536)
-    
-        # Invia il comando
-        self.chan.send(command + "\n")
-    
-        output = ""
-        start_time = time.time()
-    
-        # Leggi fino a che arrivano dati o fino a timeout
-        while True:
-            if self.chan.recv_ready():
-                chunk = self.chan.recv(65536).decode(errors="ignore")
-                output += chunk
-                start_time = time.time()  # resetta timer ogni volta che arrivano dati
-            else:
-                time.sleep(0.05)
-            
-            # Esci se non arriva più niente per un po'
-            if time.time() - start_time > timeout:
-                break
-    
-        output = output.strip()
-        if Label:
-            print(f"\n[Command]: {command}\n[Output]:\n{output}\n")
-    
-        return output
-
-
-
-    def close(self):
-        """Chiude client e canale."""
-        try:
-            if self.chan:
-                self.chan.close()
-        finally:
-            if self.client:
-                self.client.close()
-            self.chan = None
-            self.client = None
-
-    # supporto per "with"
-    def __enter__(self):
-        self.connect()
-        return self
-
-    def __exit__(self, exc_type, exc, tb):
-        
-        self.close()
-        return False  # non sopprime eccezioni
-  
-    def help(self):
-        """Print available methods and their purpose."""
-        print("="*60)
-        print(" LLRFConnection Class - Command Reference Guide")
-        print("="*60)
-        print("Connection and Control:")
-        print("  connect()              → Connect to the LLRF system via SSH.")
-        print("  close()                → Close the SSH connection.")
-        print("  run_command(cmd)       → Execute a single SSH command.")
-        print("  Send(cmd, Label=False) → Send a command through the interactive channel.")
-        print()
-        print("Feed Forward (FF) Functions:")
-        print("  FF_Get_MaxAmp()        → Read the current feed-forward maximum amplitude.")
-        print("  FF_Change_MaxAmp(val)  → Set a new maximum amplitude value.")
-        print("  FF_Get_Interval()      → Read the feed-forward offset and duration.")
-        print("  FF_Change_Interval(off, dur) → Change the FF pulse offset and duration.")
-        print()
-        print("Ramping Functions:")
-        print("  Single_ramp(init_t, final_t, init_amp, final_amp, ...) → Generate and send a single feed-forward ramp.")
-        print()
-        print("Utility:")
-        print("  help()                 → Show this help message.")
-        print("="*60)
-
-
-
-    def Single_ramp(self, init_t, final_t, init_amp, final_amp, Max_amp , Change_Max_amp = None, change_pulse = False):
-        if change_pulse == True:
-            self.FF_Change_Interval(init_t, final_t - init_t, False)
-            offset = init_t
-            duration = final_t - init_t
-            print("Offset and duration changed to fit the single ramp")
-        else:
-            [offset, duration] = self.FF_Get_Interval()
-            print(f"Offset and duration kept the same as {[offset, duration]}")
-    
-        if Change_Max_amp != None:
-            self.FF_Change_MaxAmp(Max_amp, False)
-        if (final_amp > Max_amp):
-            self.FF_Change_MaxAmp(final_amp, False)
-            print("Final amplitude bigger than max → Maximum amplitude changed to final one")
-        if (init_amp > Max_amp):
-            self.FF_Change_MaxAmp(init_amp, False)
-            print("Initial amplitude bigger than max → Maximum amplitude changed to initial one")
-    
-        Max_amp = self.FF_Get_MaxAmp()
-        Norm_init_amp = init_amp / Max_amp
-        Norm_final_amp = final_amp / Max_amp
-    
-        Ramp_time = np.linspace(init_t, final_t, 4096)
-        Pulse_time = np.linspace(offset, offset + duration, 4096)
-        True_time = Ramp_time
-        index = (Pulse_time >= init_t) & (Pulse_time <= final_t)
-
-        slope = (Norm_final_amp - Norm_init_amp) / (True_time[-1] - True_time[0])
-    
-        Normalised_amplitude_vect = slope * (Pulse_time - Pulse_time[0]) + Norm_init_amp
-    
-        # zero-out values outside the active pulse region
-        Normalised_amplitude_vect[np.where(index == False)] = 0
-    
-        Norm_string = ",".join(f"{x:.6f}" for x in Normalised_amplitude_vect)
-        commandD = "libera-ireg access boards.kupvm1.dsp.ff_pulse_shape.table_amp=" + Norm_string
-        self.run_command("libera-ireg access boards.kupvm1.dsp.ff_pulse_shape.table_amp=" + Norm_string)
-        return Normalised_amplitude_vect
-
-
-
-
-My_first_connection = LLRFConnection('192.168.0.109', 'root', 'Jungle')
+import paramiko
+from getpass import getpass
+import time
+import re
+import ast
+import socket
+import uuid
+import gzip
+import hashlib
+import threading
+import numpy as np
+
+# -*- coding: utf-8 -*-
+import time
+import paramiko
+from typing import Optional
+
+from LLRF_channels import ChannelPool, new_channel_metrics
+from LLRF_coalesce import CoalescingWriter
+from LLRF_metrics import Metrics, command_paths
+from LLRF_shapes import cached_table
+from LLRF_waveforms import as_waveform, DEVICE_TABLE_LENGTH
+from LLRF_tables import (format_table, parse_table, compare_tables, decimals_for_resolution,
+                         DECIMALS, TABLE_AMP_RESOLUTION, TABLE_PHASE_RESOLUTION)
+
+# Prefisso del marker di fine risposta usato da Send() in modalita' framed
+FRAME_MARKER = "__LLRF_END_"
+
+# Le tabelle piu' lunghe di cosi' vengono caricate compresse (vedi upload_table)
+COMPRESS_MIN_BYTES = 2048
+COMPRESS_LEVEL = 6
+# Stato di uscita dell'upload compresso quando gunzip fallisce (il valore non viene scritto)
+GUNZIP_FAILED_STATUS = 97
+
+# Riga "path=value" stampata da libera-ireg dump
+REGISTER_LINE = re.compile(r"^\s*([A-Za-z_][\w\-]*(?:\.[\w\-]+)+)\s*=\s*(.*?)\s*$")
+
+# Prefisso dei registri della scheda LLRF (una per unita' Libera)
+DEFAULT_BOARD = 'boards.kupvm1'
+
+
+def changed_ranges(old, new):
+    """Intervalli [start, stop) di indici in cui ``new`` differisce da ``old``."""
+    diff = np.flatnonzero(np.asarray(old) != np.asarray(new))
+    if diff.size == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(diff) > 1)
+    starts = np.concatenate(([diff[0]], diff[breaks + 1]))
+    stops = np.concatenate((diff[breaks], [diff[-1]])) + 1
+    return [(int(a), int(b)) for a, b in zip(starts, stops)]
+
+
+def parse_register_dump(text):
+    """Parse the ``path=value`` lines of a libera-ireg output into a dict.
+
+    If a path appears more than once the last occurrence wins, so the tty
+    echo of the command line never shadows the device answer.
+    """
+    values = {}
+    for line in text.splitlines():
+        match = REGISTER_LINE.match(line)
+        if match:
+            values[match.group(1)] = match.group(2)
+    return values
+
+
+def write_errors(text, paths):
+    """
+    Righe di errore di un output libera-ireg attribuibili ai registri ``paths``:
+    citano il path ma non sono ne' ``path=value`` ne' l'eco del comando.
+    """
+    errors = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or REGISTER_LINE.match(line):
+            continue
+        for path in paths:
+            if path in errors or not re.search(re.escape(path) + r"(?![\w.\-])", line):
+                continue
+            if f"access {path}=" in line or f"dump {path}" in line:
+                continue      # eco del comando (tty)
+            errors[path] = line
+    return errors
+
+
+def dump_value(text, path):
+    """Valore di ``path`` nell'output di libera-ireg dump, senza regex (righe di tabella lunghe)."""
+    start = text.rfind(path)
+    if start < 0:
+        raise RuntimeError(f"{path} not found in the dump output")
+    end = text.find("\n", start)
+    name_tail, eq, value = text[start + len(path):end if end >= 0 else None].partition("=")
+    if not eq or name_tail.strip():
+        raise RuntimeError(f"Unexpected dump output for {path}: {text[start:start + 80]!r}")
+    return value
+
+
+class RegisterCache:
+    """
+    Copia locale (shadow) dei registri scritti o riletti tramite le transazioni.
+
+    ``ttl`` e' la validita' in secondi di una voce (None = finche' non viene
+    invalidata, 0 = cache disattivata). ``rules`` associa prefissi di path a
+    un ttl specifico, es. {'boards.kupvm1.dsp.ff_amp': 5.0}; vince il
+    prefisso piu' lungo. Thread-safe: la stessa connessione puo' essere usata
+    da piu' thread (LLRF_async, LLRF_executor).
+    """
+
+    def __init__(self, ttl=30.0, rules=None):
+        self.ttl = ttl
+        self.rules = dict(rules or {})
+        self.entries = {}   # path -> [valore richiesto, readback, timestamp]
+        self.read_hits = 0
+        self.write_hits = 0
+        self._lock = threading.Lock()
+
+    def _ttl_for(self, path):
+        prefixes = [p for p in self.rules if path.startswith(p)]
+        return self.rules[max(prefixes, key=len)] if prefixes else self.ttl
+
+    def _fresh(self, path):
+        with self._lock:
+            entry = self.entries.get(path)
+        if entry is None:
+            return None
+        ttl = self._ttl_for(path)
+        if ttl is not None and time.time() - entry[2] > ttl:
+            return None
+        return entry
+
+    def readback(self, path):
+        """Readback in cache di ``path`` (stringa) oppure None se assente o scaduto."""
+        entry = self._fresh(path)
+        return entry[1] if entry else None
+
+    def is_current(self, path, value):
+        """True se ``value`` e' l'ultimo valore scritto su ``path`` e la voce e' valida."""
+        entry = self._fresh(path)
+        return entry is not None and entry[0] == str(value)
+
+    def store(self, path, readback=None, requested=None):
+        """Registra un readback e/o l'ultimo valore scritto su ``path``."""
+        with self._lock:
+            if requested is None:
+                # lettura pura: il valore scritto resta valido solo se il dispositivo non e' cambiato
+                entry = self.entries.get(path)
+                if entry is not None and entry[1] in (None, readback):
+                    requested = entry[0]
+            self.entries[path] = [None if requested is None else str(requested), readback, time.time()]
+
+    def paths(self):
+        """Path presenti nella cache (copia)."""
+        with self._lock:
+            return list(self.entries)
+
+    def invalidate(self, path=None):
+        """Invalida ``path`` (e il sottoalbero ``path.*``), o tutta la cache."""
+        with self._lock:
+            if path is None:
+                self.entries.clear()
+                return
+            # il registro e il suo sottoalbero, non i fratelli con lo stesso prefisso (offset/offset2)
+            for key in [k for k in self.entries if k == path or k.startswith(path + ".")]:
+                del self.entries[key]
+
+
+class RegisterTransaction:
+    """
+    Accumula scritture e letture libera-ireg e le invia in un solo round trip.
+
+    Se la connessione ha una ``cache``, le scritture di un valore identico e
+    le letture ancora valide vengono servite localmente senza traffico SSH
+    (``use_cache=False`` forza il dispositivo).
+
+    Usage:
+        with conn.transaction() as tx:
+            tx.write('boards.kupvm1.feed_forward.offset', 1.0)
+            tx.read('boards.kupvm1.feed_forward.offset')
+        offset = tx.value('boards.kupvm1.feed_forward.offset')
+    """
+
+    def __init__(self, conn, use_cache=True):
+        self.conn = conn
+        self.cache = getattr(conn, 'cache', None) if use_cache else None
+        self.commands = []
+        self.reads = []
+        self.writes = {}
+        self.results = {}
+        self.errors = {}             # path → riga di errore del dispositivo (scritture)
+
+    def write(self, path, value):
+        """Queue ``libera-ireg access path=value``."""
+        if self.cache is not None and path not in self.writes and self.cache.is_current(path, value):
+            self.cache.write_hits += 1
+            return self
+        self.commands.append(f"libera-ireg access {path}={value}")
+        self.writes[path] = value
+        return self
+
+    def read(self, path):
+        """Queue ``libera-ireg dump path``; the value is available after commit."""
+        if self.cache is not None and path not in self.writes:
+            cached = self.cache.readback(path)
+            if cached is not None:
+                self.cache.read_hits += 1
+                self.results[path] = cached
+                return self
+        self.commands.append(f"libera-ireg dump {path}")
+        self.reads.append(path)
+        return self
+
+    def commit(self):
+        """
+        Send all queued commands as one chained invocation and parse the reads.
+
+        Writes answered by an error line, or read back without a value, are
+        listed in ``errors`` and dropped from the cache instead of being
+        recorded as current.
+        """
+        if not self.commands:
+            return self.results
+        command = "; ".join(self.commands)
+        output = self.conn.Send(command)
+        self.commands = []
+        start = time.perf_counter()
+        parsed = parse_register_dump(output)
+        metrics = getattr(self.conn, 'metrics', None)
+        if metrics is not None and metrics.enabled:
+            metrics.record('parse', command_paths(command), time.perf_counter() - start,
+                           bytes_in=len(output))
+        self.results.update({path: parsed[path] for path in self.reads if path in parsed})
+        errors = write_errors(output, list(self.writes))
+        for path in self.writes:
+            if path not in errors and path in self.reads and path not in parsed:
+                errors[path] = "no readback"
+        self.errors.update(errors)
+        cache = getattr(self.conn, 'cache', None)
+        if cache is not None:
+            for path, value in self.writes.items():
+                if path in errors:
+                    cache.invalidate(path)
+                else:
+                    cache.store(path, parsed.get(path) if path in self.reads else None, value)
+            for path in self.reads:
+                if path not in self.writes and path in parsed:
+                    cache.store(path, parsed[path])
+        self.reads = []
+        self.writes = {}
+        return self.results
+
+    def value(self, path):
+        """Return the committed readback of ``path`` as a float."""
+        try:
+            return float(self.results[path].split()[0])
+        except (KeyError, IndexError):
+            raise ValueError(f"No readback for {path} in transaction output")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        return False
+
+
+class LLRFConnection:
+    def __init__(self,
+                 ip_address: str,
+                 username: str,
+                 password: Optional[str] = None,
+                 keyfile: Optional[str] = None,
+                 port: Optional[int] = None,
+                 cache_ttl: Optional[float] = 30.0,
+                 board: str = DEFAULT_BOARD):
+        self.ip = ip_address
+        self.board = board
+        self.user = username
+        self.password = password
+        self.keyfile = keyfile
+        self.port = port
+        self.client: Optional[paramiko.SSHClient] = None
+        self.chan = None
+        self.last_exit_status: Optional[int] = None
+        # Exec channel pre-aperti, keepalive del trasporto e riconnessione automatica
+        self.channel_pool: Optional[ChannelPool] = None
+        self.channel_pool_size = 2
+        self.channel_metrics = new_channel_metrics()
+        self.keepalive = 30            # secondi tra i keepalive SSH (0 = disattivato)
+        self.reconnect_attempts = 5    # 0 = nessuna riconnessione automatica
+        self.reconnect_backoff = 0.5   # attesa iniziale, raddoppia a ogni tentativo
+        # Il canale interattivo e' unico: Send() lo usa un thread alla volta.
+        # Gli upload (exec channel) possono procedere in parallelo, ma uno
+        # alla volta per registro.
+        self._shell_lock = threading.RLock()
+        self._table_locks = {'table_amp': threading.Lock(), 'table_phase': threading.Lock()}
+        # Una sola riconnessione alla volta; _generation conta le connessioni aperte,
+        # cosi' chi fallisce durante la riconnessione di un altro thread riprova e basta
+        self._connection_lock = threading.RLock()
+        self._generation = 0
+        # None = non ancora verificato, poi True/False (vedi upload_table)
+        self.compressed_upload: Optional[bool] = None
+        # True → tabelle quantizzate sul passo del registro (stringhe piu' corte)
+        self.quantize_tables = False
+        # Digest (e valori) dell'ultima tabella caricata per registro, vedi upload_table
+        self.uploaded_tables = {}
+        self.last_upload = None
+        self.upload_stats = {'uploads': 0, 'skipped': 0, 'bytes_sent': 0, 'bytes_skipped': 0,
+                             'verified': 0, 'verify_failures': 0}
+        # True → ogni upload viene riletto con un dump e confrontato (vedi verify_table);
+        # tolleranza None = mezzo passo del registro + arrotondamento della stringa
+        self.verify_uploads = False
+        self.verify_tolerance: Optional[float] = None
+        self.last_verify = None
+        # Formato per scrivere un intervallo di indici della tabella, es.
+        # "libera-ireg access {path}[{start}:{stop}]={values}"; None = solo upload completi
+        self.partial_table_command: Optional[str] = None
+        # Shadow dei registri scalari: None disattiva la cache
+        self.cache: Optional[RegisterCache] = RegisterCache(cache_ttl)
+        # Latenze/byte/errori per registro e operazione (vedi LLRF_metrics), off di default
+        self.metrics = Metrics()
+        # Ricampionamento sulla tabella dei Set_Arbitrary_*: 'linear' (come np.interp),
+        # 'sinc' o 'polyphase' per catture lunghe (anti-aliasing, vedi LLRF_resample)
+        self.resample_mode = "linear"
+
+    def connect(self, timeout: int = 10, look_for_keys: bool = False, allow_agent: bool = False):
+        
+        self.client = paramiko.SSHClient()
+        self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        self.client.connect(
+            hostname=self.ip,
+            port=self.port or 22,
+            username=self.user,
+            password=self.password,
+            #key_filename=self.keyfile,
+            timeout=timeout,
+            #look_for_keys=look_for_keys,
+            #allow_agent=allow_agent
+        )
+        transport = self.client.get_transport()
+        # comandi brevi e frequenti: niente Nagle sul socket del trasporto
+        transport.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.keepalive:
+            transport.set_keepalive(self.keepalive)
+        self.channel_pool = ChannelPool(transport, self.channel_pool_size, self.channel_metrics)
+        self.channel_pool.fill()
+        if self.cache is not None:
+            self.cache.invalidate()  # il dispositivo puo' essere cambiato nel frattempo
+        self.uploaded_tables.clear()
+        # apri una shell interattiva se ti serve un tty
+        self.chan = self.client.invoke_shell()
+        time.sleep(0.5)
+        # svuota il banner iniziale (MOTD)
+        while self.chan.recv_ready():
+            self.chan.recv(65536)
+        self._generation += 1
+        command = f"libera-ireg access {self.board}.dsp.ff_pulse_shape.mode=Table"
+        self.run_command(command)
+            
+            
+    def transaction(self, use_cache=True):
+        """Return a RegisterTransaction that commits in one round trip on exit."""
+        return RegisterTransaction(self, use_cache)
+
+    def coalescing(self, delay=0.0, readback=True):
+        """CoalescingWriter su questa connessione: scritture last-write-wins in un solo round trip."""
+        return CoalescingWriter(self, delay, readback)
+
+    def refresh(self):
+        """Rilegge dal dispositivo tutti i registri presenti nella cache."""
+        paths = self.cache.paths() if self.cache is not None else []
+        if not paths:
+            return {}
+        self.cache.invalidate()
+        with self.transaction(use_cache=False) as tx:
+            for path in paths:
+                tx.read(path)
+        return dict(tx.results)
+
+    def FF_Change_MaxAmp(self, New_amp, printing = True ):
+        path = f'{self.board}.dsp.ff_amp.amplitude'
+        with self.transaction() as tx:
+            tx.write(path, New_amp).read(path)
+        try:
+            New_amp_readback = tx.value(path)
+            if printing == True:
+                print("="*40)
+                print(f"  NEW USER SET AMPLITUDE: {New_amp_readback}  ")
+                print("="*40)            
+            return New_amp_readback
+        except (IndexError, ValueError) as e:
+            print(f"Errore nel leggere il nuovo valore dell'ampiezza: {tx.results}")
+            raise e
+
+
+    def Restore(self):
+      
+        command_amp = f"libera-ireg access {self.board}.dsp.ff_pulse_shape.table_amp=1"
+        command_phase = f"libera-ireg access {self.board}.dsp.ff_pulse_shape.table_phase=0"
+        self.run_command(command_amp)
+        self.run_command(command_phase)
+        self.uploaded_tables.clear()
+
+
+    def FF_Get_Interval(self):
+        path_off = f'{self.board}.feed_forward.offset'
+        path_dur = f'{self.board}.feed_forward.duration'
+        with self.transaction() as tx:
+            tx.read(path_off).read(path_dur)
+        return [tx.value(path_off), tx.value(path_dur)]
+
+    def FF_Get_MaxAmp(self):
+        path = f'{self.board}.dsp.ff_amp.amplitude'
+        with self.transaction() as tx:
+            tx.read(path)
+        return tx.value(path)
+
+
+    def FF_Change_Interval(self, Offset, Duration, printing = True):
+        if Offset==0 : Offset=0.03
+        "   Inserisce la durata dell'impulso e l'offset  unita' di misura micro secondi"
+        path_dur = f'{self.board}.feed_forward.duration'
+        path_off = f'{self.board}.feed_forward.offset'
+        with self.transaction() as tx:
+            tx.write(path_dur, Duration).write(path_off, Offset)
+            tx.read(path_dur).read(path_off)
+        try:
+            New_dur = tx.value(path_dur)
+            New_off = tx.value(path_off)
+            if printing == True:
+                print("="*40)
+                print(f"  NEW USER SET Duration: {New_dur}  ")
+                print(f"  NEW USER SET Offset: {New_off}  ")
+                print("="*40) 
+            return np.array([New_dur, New_off])
+
+        except (IndexError, ValueError) as e:
+             print(f"Error in reading the new interval: {[Offset,Duration]} micros")
+             raise 
+   
+        
+   
+    
+   
+    def FF_Change_Phase(self, New_phase, printing):
+        path = f'{self.board}.dsp.ff_phase.phase'
+        if (New_phase < -400 or New_phase>400):
+            raise Exception("!!!!!! Errore- The new phase must be between -400 and 400")
+        with self.transaction() as tx:
+            tx.write(path, New_phase).read(path)
+        try:
+            New_amp_readback = tx.value(path)
+            if printing == True:
+                print("="*40)
+                print(f"  NEW USER SET PHASE: {New_amp_readback}  ")
+                print("="*40)            
+            return New_amp_readback
+        except (IndexError, ValueError) as e:
+            print(f"Errore nel leggere il nuovo valore della fase: {tx.results}")
+            raise e
+
+    
+    
+
+
+
+
+
+    def Set_Arbitrary_Shape_AndTime(self,  Arb, Max_amp, init_t, final_t):
+             if init_t == 0 : init_t = 0.03
+             offset = init_t
+             duration = final_t - init_t
+             if duration > 34:
+                print("   The arbitary  shape can be fixed only 34 micro seconds after thwe offeset  ")
+             wave = as_waveform(Arb)
+             if (np.max(wave.values) > 1 or np.min(wave.values)<0):
+                 Max_amp = np.max(wave.values)
+                 wave = wave.rescaled()
+             # interval and max amplitude in a single round trip
+             with self.transaction() as tx:
+                 tx.write(f'{self.board}.feed_forward.duration', duration)
+                 tx.write(f'{self.board}.feed_forward.offset', offset)
+                 tx.write(f'{self.board}.dsp.ff_amp.amplitude', Max_amp)
+             print("Offset and duration changed")
+             # zero-out values outside the active pulse region
+             initial_index = 0
+             final_index = int(final_t/34*DEVICE_TABLE_LENGTH)
+             length = (final_index - initial_index) + 1
+             shape = np.zeros(DEVICE_TABLE_LENGTH)
+             shape[initial_index:final_index +1 ] = wave.resampled(length, self.resample_mode)
+             Norm_string = self._format_table(shape, 'table_amp')
+             self.upload_table('table_amp', Norm_string, shape)
+
+             
+    def Set_Arbitrary_Shape(self, Arb, Max_amp,init_t):
+                    # self.FF_Change_Interval(init_t, 33.99 + init_t)
+                     # Arb (array o Waveform) non viene modificato: la normalizzazione crea un nuovo Waveform
+                     wave = as_waveform(Arb)
+                     if (np.max(wave.values) > 1 or np.min(wave.values)<0):
+                         Max_amp = np.max(wave.values)
+                         wave = wave.rescaled()
+                         
+                     self.FF_Change_MaxAmp(Max_amp, False)
+                     Interpolated_shape = wave.device_table(mode=self.resample_mode)
+                     Norm_string = self._format_table(Interpolated_shape, 'table_amp')
+                     self.upload_table('table_amp', Norm_string, Interpolated_shape)
+             
+             
+             
+             
+             
+    def Set_Arbitrary_Phase(self, Arb, Cent_phase, init_t ):
+                     self.FF_Change_Interval(init_t, 33.99 + init_t)
+                     wave = as_waveform(Arb)
+                     if (np.max(wave.values) > 180 or np.min(wave.values)<-180):
+                         Cent_phase = (np.max(wave.values) - np.min(wave.values))/2
+                         scaled = wave.values / np.max(wave.values) * 180
+                         cent = -((np.max(scaled) - np.min(scaled))/2)
+                         wave = wave.with_values(scaled + cent)
+                     self.FF_Change_Phase(Cent_phase, False)
+                     # zero-out values outside the active pulse region
+                     Interpolated_shape = wave.device_table(mode=self.resample_mode)
+                     Norm_string = self._format_table(Interpolated_shape, 'table_phase')
+                     self.upload_table('table_phase', Norm_string, Interpolated_shape)
+
+    def Set_Arbitrary_Phase_AndTime(self,  Arb, Cent_phase, init_t, final_t):
+             if init_t == 0 : init_t = 0.03
+             offset = init_t
+             duration = final_t - init_t
+             final_t = offset + duration
+             if duration > 34:
+                print("   The arbitary  shape can be fixed only 34 micro seconds after thwe offeset  ")
+             wave = as_waveform(Arb)
+             if (np.max(wave.values) > 180 or np.min(wave.values)<-180):
+                 Cent_phase = (np.max(wave.values) - np.min(wave.values))/2
+                 wave = wave.with_values(wave.values / np.max(wave.values) * 180 - Cent_phase)
+             if (Cent_phase < -400 or Cent_phase>400):
+                 raise Exception("!!!!!! Errore- The new phase must be between -400 and 400")
+             # interval and central phase in a single round trip
+             with self.transaction() as tx:
+                 tx.write(f'{self.board}.feed_forward.duration', duration)
+                 tx.write(f'{self.board}.feed_forward.offset', offset)
+                 tx.write(f'{self.board}.dsp.ff_phase.phase', Cent_phase)
+             print("Offset and duration changed")
+             initial_index = 0
+             final_index = int(final_t/34*DEVICE_TABLE_LENGTH)
+             length = (final_index - initial_index) + 1
+             shape = np.zeros(DEVICE_TABLE_LENGTH)
+             shape[initial_index:final_index +1 ] = wave.resampled(length, self.resample_mode)
+             Norm_string = self._format_table(shape, 'table_phase')
+             self.upload_table('table_phase', Norm_string, shape)
+        
+        
+    def _format_table(self, values, register):
+        """Serializza una tabella per ``register`` (table_amp / table_phase)."""
+        start = time.perf_counter()
+        if not self.quantize_tables:
+            table_string = format_table(values)
+        else:
+            resolution = TABLE_PHASE_RESOLUTION if register == 'table_phase' else TABLE_AMP_RESOLUTION
+            table_string = format_table(values, resolution=resolution)
+        if self.metrics.enabled:
+            self.metrics.record('format', register, time.perf_counter() - start, bytes_out=len(table_string))
+        return table_string
+
+    def _shape_table(self, kind, register, **params):
+        """(tabella, stringa) di una forma di LLRF_shapes, in cache, con la quantizzazione della connessione."""
+        resolution = None
+        if self.quantize_tables:
+            resolution = TABLE_PHASE_RESOLUTION if register == 'table_phase' else TABLE_AMP_RESOLUTION
+        return cached_table(kind, resolution, **params)
+
+    def Set_Shape(self, kind, register='table_amp', **params):
+        """
+        Carica una forma di LLRF_shapes (raised_cosine, flat_top, spline, ...)
+        in ``register``; tempi in µs assoluti sulla finestra offset/duration.
+        """
+        values, table_string = self._shape_table(kind, register, **params)
+        self.upload_table(register, table_string, values)
+        return np.array(values)
+
+    def upload_table(self, register, table_string, values=None):
+        """
+        Carica una tabella ``v0,v1,...`` in ``dsp.ff_pulse_shape.<register>``.
+
+        Se il digest della tabella coincide con l'ultimo caricato sullo stesso
+        registro l'upload viene saltato. Con ``values`` (l'array serializzato)
+        e ``partial_table_command`` impostato, vengono inviati solo gli
+        intervalli di indici cambiati. Il resoconto dell'ultimo upload e' in
+        ``self.last_upload``, i totali in ``self.upload_stats``.
+
+        Sopra ``COMPRESS_MIN_BYTES`` la tabella viene inviata compressa (gzip)
+        sullo stdin di un exec channel e decompressa sul dispositivo con
+        ``gunzip -c`` in una variabile di shell; ``libera-ireg access`` parte
+        solo se gunzip riesce, mai con un valore vuoto. Se il dispositivo non
+        ha gunzip, gunzip fallisce o cade il canale si torna al percorso
+        testuale, che resta sempre disponibile; un valore rifiutato da
+        libera-ireg e' invece un errore dell'upload, come nel percorso testuale.
+
+        Il digest viene registrato solo dopo un upload senza errori: se il
+        dispositivo risponde con un errore (``last_upload['error']``) o
+        l'upload solleva un'eccezione, lo stesso upload ripetuto parte di
+        nuovo invece di essere saltato.
+
+        Con ``verify_uploads`` ogni upload effettivo viene riletto e
+        confrontato (verify_table); il resoconto e' in ``last_upload['verify']``.
+        """
+        # le tabelle di registri diversi possono caricarsi in parallelo: si usa il
+        # resoconto locale e lo si pubblica in self.last_upload solo alla fine
+        with self._table_locks.setdefault(register, threading.Lock()):
+            if not self.metrics.enabled:
+                result, report = self._upload_table(register, table_string, values)
+            else:
+                start = time.perf_counter()
+                try:
+                    result, report = self._upload_table(register, table_string, values)
+                except Exception:
+                    self.metrics.record('upload', register, time.perf_counter() - start, error=True)
+                    raise
+                op = 'skip' if report['skipped'] else 'upload'
+                self.metrics.record(op, register, time.perf_counter() - start,
+                                    bytes_out=report['bytes_sent'], error=bool(report['error']))
+            if self.verify_uploads and not report['skipped'] and not report['error']:
+                expected = values if values is not None else parse_table(table_string)
+                report['verify'] = self.verify_table(register, expected)
+            self.last_upload = report
+            return result
+
+    def verify_table(self, register, expected=None):
+        """
+        Rilegge ``dsp.ff_pulse_shape.<register>`` con un solo dump e lo confronta
+        con ``expected`` (default: l'ultima tabella caricata) entro la tolleranza
+        di quantizzazione. Restituisce il resoconto di compare_tables con i
+        tempi di lettura e parsing, salvato anche in ``self.last_verify``. Se la
+        tabella non coincide il prossimo upload dello stesso registro non
+        viene saltato.
+        """
+        if expected is None:
+            previous = self.uploaded_tables.get(register)
+            if previous is None or previous[1] is None:
+                raise ValueError(f"No uploaded values to verify for {register}")
+            expected = previous[1]
+        path = f'{self.board}.dsp.ff_pulse_shape.{register}'
+        start = time.perf_counter()
+        out, _ = self.run_command(f"libera-ireg dump {path}")
+        fetched = time.perf_counter()
+        try:
+            readback = parse_table(dump_value(out, path))
+        except (RuntimeError, ValueError) as e:
+            if self.metrics.enabled:
+                self.metrics.record('verify', register, time.perf_counter() - start,
+                                    bytes_in=len(out), error=True)
+            raise RuntimeError(f"Cannot read back {register}: {e}") from None
+        report = compare_tables(expected, readback, self._table_tolerance(register))
+        report.update(register=register, fetch_ms=(fetched - start) * 1e3,
+                      parse_ms=(time.perf_counter() - fetched) * 1e3)
+        self.last_verify = report
+        self.upload_stats['verified'] += 1
+        if not report['ok']:
+            self.upload_stats['verify_failures'] += 1
+            self.uploaded_tables.pop(register, None)
+            print(f"Verify {register}: {report['mismatches']} of {report['length']} values out of tolerance "
+                  f"(max error {report['max_error']:.3g}), first (index, sent, read): {report['first'][:3]}")
+        if self.metrics.enabled:
+            self.metrics.record('verify', register, time.perf_counter() - start,
+                                bytes_in=len(out), error=not report['ok'])
+        return report
+
+    def _table_tolerance(self, register):
+        if self.verify_tolerance is not None:
+            return self.verify_tolerance
+        resolution = TABLE_PHASE_RESOLUTION if register == 'table_phase' else TABLE_AMP_RESOLUTION
+        decimals = decimals_for_resolution(resolution) if self.quantize_tables else DECIMALS
+        # quantizzazione (del dispositivo o di quantize_tables) + arrotondamento della
+        # stringa inviata, con margine per il float
+        return (0.5 * resolution + 0.5 * 10.0 ** -decimals) * (1 + 1e-9)
+
+    def _upload_table(self, register, table_string, values):
+        """Upload (o salto) della tabella; restituisce (risultato del comando, resoconto)."""
+        path = f'{self.board}.dsp.ff_pulse_shape.{register}'
+        digest = hashlib.blake2b(table_string.encode(), digest_size=16).hexdigest()
+        previous = self.uploaded_tables.get(register)
+        report = {'register': register, 'digest': digest, 'skipped': False,
+                  'bytes_sent': 0, 'bytes_skipped': 0, 'changed_ranges': None, 'error': None}
+        self.upload_stats['uploads'] += 1
+
+        if previous is not None and previous[0] == digest:
+            report['skipped'] = True
+            report['bytes_skipped'] = len(table_string)
+            report['changed_ranges'] = []
+            self.upload_stats['skipped'] += 1
+            self.upload_stats['bytes_skipped'] += len(table_string)
+            return ("", ""), report
+
+        # da qui il contenuto sul dispositivo non e' noto finche' l'upload non riesce:
+        # un errore o un'eccezione (link caduto a comando inviato) non lascia il vecchio digest
+        self.uploaded_tables.pop(register, None)
+        result = None
+        if values is not None:
+            values = np.asarray(values, dtype=float)
+            if previous is not None and previous[1] is not None and previous[1].shape == values.shape:
+                report['changed_ranges'] = changed_ranges(previous[1], values)
+                if self.partial_table_command:
+                    result = self._upload_table_ranges(path, values, report)
+                    if result is not None:
+                        report['bytes_skipped'] = max(0, len(table_string) - report['bytes_sent'])
+
+        if result is None:
+            result = self._upload_table_full(path, table_string, report)
+        self.upload_stats['bytes_sent'] += report['bytes_sent']
+        self.upload_stats['bytes_skipped'] += report['bytes_skipped']
+        err = result[1] if result else ""
+        if err:
+            # rifiutato (o applicato in parte): il prossimo upload deve partire comunque
+            report['error'] = err.strip()
+        else:
+            self.uploaded_tables[register] = (digest, None if values is None else values.copy())
+        return result, report
+
+    def _upload_table_full(self, path, table_string, report):
+        if len(table_string) >= COMPRESS_MIN_BYTES and self._compressed_upload_available():
+            try:
+                payload = gzip.compress(table_string.encode(), COMPRESS_LEVEL)
+                result = self._upload_table_compressed(path, payload)
+                report['bytes_sent'] = len(payload)
+                return result
+            except (OSError, EOFError, paramiko.SSHException) as e:
+                print(f"Compressed upload failed ({e}), falling back to text upload")
+                self.compressed_upload = False
+        command = f"libera-ireg access {path}={table_string}"
+        report['bytes_sent'] = len(command)
+        return self.run_command(command)
+
+    def _upload_table_ranges(self, path, values, report):
+        """Invia solo gli intervalli cambiati, se sono meno della meta' della tabella."""
+        ranges = report['changed_ranges']
+        changed = sum(stop - start for start, stop in ranges)
+        if changed * 2 > len(values):
+            return None
+        commands = [self.partial_table_command.format(
+                        path=path, start=start, stop=stop,
+                        values=self._format_table(values[start:stop], path.rsplit('.', 1)[-1]))
+                    for start, stop in ranges]
+        command = "; ".join(commands)
+        report['bytes_sent'] = len(command)
+        return self.run_command(command)
+
+    def _compressed_upload_available(self):
+        """Verifica (una sola volta) che il dispositivo abbia gunzip."""
+        if self.compressed_upload is None:
+            out, _ = self.run_command("command -v gunzip")
+            self.compressed_upload = bool(out.strip())
+        return self.compressed_upload
+
+    def _upload_table_compressed(self, path, payload):
+        return self._with_reconnect(self._upload_compressed_once, path, payload)
+
+    def _upload_compressed_once(self, path, payload):
+        stdin, stdout, stderr = self.channel_pool.exec_command(
+            f'v=$(gunzip -c) || exit {GUNZIP_FAILED_STATUS}; libera-ireg access {path}="$v"')
+        stdin.write(payload)
+        stdin.flush()
+        stdin.channel.shutdown_write()
+        out = stdout.read().decode()
+        err = stderr.read().decode()
+        status = stdout.channel.recv_exit_status()
+        if status == GUNZIP_FAILED_STATUS:
+            raise OSError(f"gunzip failed: {err.strip()}")
+        if status != 0 and not err.strip():
+            err = f"libera-ireg access exit status {status}\n"
+        if err:
+            print("STDERR:\n", err)
+        return out, err
+
+    def _transport_active(self):
+        transport = self.client.get_transport() if self.client else None
+        shell_open = self.chan is not None and not self.chan.closed
+        return transport is not None and transport.is_active() and shell_open
+
+    def reconnect(self):
+        """
+        Richiude e riapre la connessione, con backoff esponenziale tra i tentativi.
+        Una credenziale rifiutata (AuthenticationException) non viene ritentata.
+        """
+        with self._connection_lock:
+            delay = self.reconnect_backoff
+            for attempt in range(1, self.reconnect_attempts + 1):
+                try:
+                    self.close()
+                    self.connect()
+                    self.channel_metrics["reconnects"] += 1
+                    print(f"Reconnected to {self.ip} (attempt {attempt})")
+                    return
+                except paramiko.AuthenticationException:
+                    raise
+                except (paramiko.SSHException, EOFError, OSError) as e:
+                    print(f"Reconnect to {self.ip} failed (attempt {attempt}): {e}")
+                    if attempt < self.reconnect_attempts:
+                        time.sleep(delay)
+                        delay *= 2
+            raise ConnectionError(f"Could not reconnect to {self.ip} after {self.reconnect_attempts} attempts")
+
+    def _with_reconnect(self, func, *args):
+        """Esegue ``func``; se il trasporto e' caduto si riconnette e riprova una volta."""
+        with self._connection_lock:     # attende una riconnessione in corso
+            generation = self._generation
+        try:
+            return func(*args)
+        except paramiko.AuthenticationException:
+            raise
+        except (paramiko.SSHException, EOFError, OSError, AttributeError):
+            # AttributeError: canale o pool azzerati da una riconnessione iniziata nel frattempo
+            if not self.reconnect_attempts:
+                raise
+            with self._connection_lock:
+                # ricontrollo sotto il lock: un altro thread puo' aver gia' riconnesso
+                if self._generation == generation:
+                    if self._transport_active() or self.client is None:
+                        raise
+                    self.reconnect()
+            if self.metrics.enabled:
+                op = 'send' if func == self._send_once else 'exec'
+                self.metrics.retry(op, command_paths(str(args[0])) if args else '-')
+            return func(*args)
+
+    def run_command(self, command):
+        if not self.client:
+            raise Exception("Client not connected. Call connect() first.")
+        if not self.metrics.enabled:
+            return self._with_reconnect(self._run_command, command)
+        start = time.perf_counter()
+        try:
+            out, err = self._with_reconnect(self._run_command, command)
+        except Exception:
+            self.metrics.record('exec', command_paths(command), time.perf_counter() - start,
+                                bytes_out=len(command), error=True)
+            raise
+        self.metrics.record('exec', command_paths(command), time.perf_counter() - start,
+                            bytes_out=len(command), bytes_in=len(out) + len(err), error=bool(err))
+        return out, err
+
+    def _run_command(self, command):
+        stdin, stdout, stderr = self.channel_pool.exec_command(command)
+        out = stdout.read().decode()
+        err = stderr.read().decode()
+        if err:
+            print("STDERR:\n", err)
+        return out, err
+    
+    def Send(self, command, Label=False, timeout=0.5, framed=True, max_wait=10.0):
+        """
+        Esegue un comando sul canale interattivo mantenendo la sessione SSH attiva.
+
+        In modalita' framed (default) il comando e' seguito da un marker univoco
+        con l'exit status: la lettura termina appena il marker arriva, e
+        ``max_wait`` resta solo come tetto di sicurezza. Con ``framed=False``
+        legge fino a ``timeout`` secondi di inattivita' (comportamento storico).
+        L'exit status dell'ultimo comando framed e' in ``self.last_exit_status``.
+        Il canale e' condiviso: chiamate da thread diversi vengono serializzate.
+        """
+        if not self.chan:
+            raise Exception("Channel not open. Call connect() first.")
+
+        with self._shell_lock:
+            start = time.perf_counter()
+            try:
+                output = self._with_reconnect(self._send_once, command, timeout, framed, max_wait)
+            except Exception:
+                if self.metrics.enabled:
+                    self.metrics.record('send', command_paths(command), time.perf_counter() - start,
+                                        bytes_out=len(command), error=True)
+                raise
+            if self.metrics.enabled:
+                failed = framed and self.last_exit_status not in (None, 0)
+                self.metrics.record('send', command_paths(command), time.perf_counter() - start,
+                                    bytes_out=len(command), bytes_in=len(output), error=failed)
+
+        output = output.strip()
+        if Label:
+            print(f"\n[Command]: {command}\n[Output]:\n{output}\n")
+    
+        return output
+
+    def _send_once(self, command, timeout, framed, max_wait):
+        # Pulisci eventuale output precedente
+        while self.chan.recv_ready():
+            self.chan.recv(65536)
+
+        if framed:
+            return self._send_framed(command, max_wait)
+        return self._send_idle(command, timeout)
+
+    def _send_idle(self, command, timeout):
+        """Invia il comando e legge fino a ``timeout`` secondi di silenzio."""
+        self.chan.send(command + "\n")
+    
+        output = ""
+        start_time = time.time()
+    
+        # Leggi fino a che arrivano dati o fino a timeout
+        while True:
+            if self.chan.recv_ready():
+                chunk = self.chan.recv(65536).decode(errors="ignore")
+                output += chunk
+                start_time = time.time()  # resetta timer ogni volta che arrivano dati
+            else:
+                time.sleep(0.05)
+            
+            # Esci se non arriva più niente per un po'
+            if time.time() - start_time > timeout:
+                break
+        return output
+
+    def _send_framed(self, command, max_wait):
+        """
+        Invia il comando seguito da ``echo <marker> $?`` e legge fino al marker.
+
+        Il marker e' spezzato da ``""`` nella riga inviata, cosi' l'eco del tty
+        non puo' essere scambiato per la risposta della shell.
+        """
+        tag = uuid.uuid4().hex[:12]
+        marker = f"{FRAME_MARKER}{tag}__"
+        sentinel = re.compile(re.escape(marker) + r"\s+(-?\d+)")
+        quoted = f'{FRAME_MARKER[:-1]}""{FRAME_MARKER[-1]}{tag}__'
+        self.chan.send(f"{command}\necho {quoted} $?\n")
+
+        output = ""
+        deadline = time.time() + max_wait
+        self.last_exit_status = None
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                print(f"[Send] No end marker after {max_wait} s for: {command[:80]}")
+                break
+            self.chan.settimeout(remaining)
+            try:
+                chunk = self.chan.recv(65536)
+            except socket.timeout:
+                continue
+            if not chunk:
+                raise EOFError("Interactive channel closed")
+            output += chunk.decode(errors="ignore")
+            match = sentinel.search(output)
+            if match:
+                self.last_exit_status = int(match.group(1))
+                output = output[:match.start()]
+                break
+        self.chan.settimeout(None)
+
+        # Rimuovi l'eco della riga del marker
+        lines = [ln for ln in output.splitlines() if FRAME_MARKER[:-1] not in ln]
+        return "\n".join(lines)
+
+
+
+    def close(self):
+        """Chiude client e canale."""
+        try:
+            if self.channel_pool:
+                self.channel_pool.close()
+            if self.chan:
+                self.chan.close()
+        finally:
+            if self.client:
+                self.client.close()
+            self.channel_pool = None
+            self.chan = None
+            self.client = None
+
+    # supporto per "with"
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        
+        self.close()
+        return False  # non sopprime eccezioni
+  
+    def help(self):
+        """Print available methods and their purpose."""
+        print("="*60)
+        print(" LLRFConnection Class - Command Reference Guide")
+        print("="*60)
+        print("Connection and Control:")
+        print("  connect()              → Connect to the LLRF system via SSH.")
+        print("  close()                → Close the SSH connection.")
+        print("  run_command(cmd)       → Execute a single SSH command.")
+        print("  Send(cmd, Label=False) → Send a command through the interactive channel.")
+        print("  reconnect()            → Reopen the SSH session (done automatically on link loss).")
+        print("  transaction()          → Batch register reads/writes in one round trip.")
+        print("  refresh()              → Resync the shadow register cache with the device.")
+        print("  coalescing(delay)      → Writer that merges pending writes/tables (last write wins).")
+        print("  upload_table(reg, str) → Upload a pulse table (compressed, skipped if unchanged).")
+        print("  verify_uploads = True  → Read back every uploaded table and report mismatches.")
+        print("  verify_table(reg)      → Compare the table on the device with the last upload.")
+        print("  metrics.enabled = True → Record per-register latency/bytes/errors (see LLRF_metrics).")
+        print("  resample_mode = 'sinc' → Anti-aliased table resampling for long captures (see LLRF_resample).")
+        print()
+        print("Feed Forward (FF) Functions:")
+        print("  FF_Get_MaxAmp()        → Read the current feed-forward maximum amplitude.")
+        print("  FF_Change_MaxAmp(val)  → Set a new maximum amplitude value.")
+        print("  FF_Get_Interval()      → Read the feed-forward offset and duration.")
+        print("  FF_Change_Interval(off, dur) → Change the FF pulse offset and duration.")
+        print("  Set_Shape(kind, **params) → Upload a generated shape (see LLRF_shapes).")
+        print()
+        print("Ramping Functions:")
+        print("  Single_ramp(init_t, final_t, init_amp, final_amp, ...) → Generate and send a single feed-forward ramp.")
+        print()
+        print("Utility:")
+        print("  help()                 → Show this help message.")
+        print("="*60)
+
+
+
+    def Single_ramp(self, init_t, final_t, init_amp, final_amp, Max_amp , Change_Max_amp = None, change_pulse = False):
+        if change_pulse == True:
+            self.FF_Change_Interval(init_t, final_t - init_t, False)
+            offset = init_t
+            duration = final_t - init_t
+            print("Offset and duration changed to fit the single ramp")
+        else:
+            offset = duration = None
+    
+        # max amplitude writes and all readbacks in a single round trip
+        path_amp = f'{self.board}.dsp.ff_amp.amplitude'
+        path_off = f'{self.board}.feed_forward.offset'
+        path_dur = f'{self.board}.feed_forward.duration'
+        with self.transaction() as tx:
+            if Change_Max_amp != None:
+                tx.write(path_amp, Max_amp)
+            if (final_amp > Max_amp):
+                tx.write(path_amp, final_amp)
+                print("Final amplitude bigger than max → Maximum amplitude changed to final one")
+            if (init_amp > Max_amp):
+                tx.write(path_amp, init_amp)
+                print("Initial amplitude bigger than max → Maximum amplitude changed to initial one")
+            if offset is None:
+                tx.read(path_off).read(path_dur)
+            tx.read(path_amp)
+
+        if offset is None:
+            [offset, duration] = [tx.value(path_off), tx.value(path_dur)]
+            print(f"Offset and duration kept the same as {[offset, duration]}")
+        Max_amp = tx.value(path_amp)
+        Norm_init_amp = init_amp / Max_amp
+        Norm_final_amp = final_amp / Max_amp
+    
+        # rampa (zero fuori dalla regione attiva) e stringa dalla cache di LLRF_shapes
+        Normalised_amplitude_vect, Norm_string = self._shape_table(
+            'single_ramp', 'table_amp', init_t=init_t, final_t=final_t,
+            init_amp=Norm_init_amp, final_amp=Norm_final_amp, offset=offset, duration=duration)
+        self.upload_table('table_amp', Norm_string, Normalised_amplitude_vect)
+        return np.array(Normalised_amplitude_vect)
+
+
+
+
+if __name__ == "__main__":
+    My_first_connection = LLRFConnection('192.168.0.109', 'root', 'Jungle')
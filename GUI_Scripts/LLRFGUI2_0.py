@@ -1,953 +1,1315 @@
-# llrfgui_threadsafe.py
-import sys
-import os
-import numpy as np
-from PIL import Image
-
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
-from PyQt5.QtGui import QPixmap, QDoubleValidator
-from PyQt5.QtWidgets import (
-    QApplication, QWidget, QPushButton, QLineEdit, QLabel,
-    QVBoxLayout, QHBoxLayout, QTabWidget, QFileDialog, QMessageBox,
-    QSlider, QDialog, QPlainTextEdit, QGroupBox, QSizePolicy, QSpacerItem
-)
-
-import pyqtgraph as pg
-
-# --- CONSTANTS ---
-MAX_PULSE_TIME_US = 34.0
-DEFAULT_IP = "192.168.0.109"
-DEFAULT_USER = "root"
-DEFAULT_PWD = "Jungle"
-DEFAULT_MAX_AMP = "1000"
-
-# --- STYLES (Estetica Migliorata) ---
-GUI_STYLE = """
-    QGroupBox {
-        font-weight: bold;
-        margin-top: 10px;
-        border: 2px solid #555555;
-        border-radius: 5px;
-        padding-top: 15px;
-    }
-    QPushButton {
-        padding: 5px;
-        border-radius: 3px;
-        /* Imposta uno sfondo predefinito per i pulsanti abilitati */
-        background-color: #007BFF; 
-        color: white;
-    }
-    QTabWidget::pane { 
-        border: 1px solid #C4C4C3;
-        background: white;
-    }
-    QLabel#StatusLabel {
-        font-size: 14px;
-        font-weight: bold;
-        padding: 5px;
-        border-radius: 3px;
-        background-color: #222222;
-        color: white; 
-    }
-    /* CORREZIONE VISIBILITÀ: Rende i widget non-input visibili. */
-    QLineEdit {
-        background-color: #F0F0F0;
-        border: 1px solid #AAAAAA;
-        padding: 3px;
-        color: black; 
-    }
-    QLabel {
-        color: black;
-    }
-    /* SOLUZIONE DEFINITIVA VISIBILITÀ PULSANTI DISABILITATI: 
-       Forza uno stile visibile per i pulsanti disabilitati (come Load/Send all'inizio). */
-    QPushButton:disabled {
-        background-color: #E0E0E0; /* Grigio chiaro forzato */
-        color: #A0A0A0; /* Testo grigio scuro forzato */
-    }
-    /* Sovrascrivi gli stili di connessione disabilitati per mantenerli grigi */
-    QPushButton#btn_disconnect:disabled {
-        background-color: #AAAAAA;
-    }
-"""
-
-# ====================================================================
-# MOCK CLASS (Solo per testing)
-# ====================================================================
-try:
-    from LLRF import LLRFConnection
-except ImportError:
-    class LLRFConnection:
-        def __init__(self, ip, user, pwd):
-            pass
-        def connect(self):
-            import time; time.sleep(1.0) # Simulate connection time
-            pass
-        def close(self):
-            pass
-        def FF_Change_MaxAmp(self, max_amp):
-            import time; time.sleep(0.3)
-            pass
-        def FF_Change_Interval(self, offset, duration):
-            import time; time.sleep(0.5)
-            pass
-        def FF_Change_Phase(self, phase, update):
-            import time; time.sleep(0.3)
-            pass
-        def Restore(self):
-            import time; time.sleep(1.5)
-            pass
-        def Set_Arbitrary_Shape(self, wave, max_amp, init_t):
-            import time; time.sleep(0.7)
-            return "Waveform amplitude uploaded (1D)"
-        def Set_Arbitrary_Shape_AndTime(self, amplitude, max_amp, t_start, t_end):
-            import time; time.sleep(0.7)
-            return "Waveform amplitude uploaded (2D)"
-        def Set_Arbitrary_Phase(self, wave_phase, cent_phase, init_t):
-            import time; time.sleep(0.7)
-            return "Waveform phase uploaded (1D)"
-        def Set_Arbitrary_Phase_AndTime(self, amplitude, cent_phase, t_start, t_end):
-            import time; time.sleep(0.7)
-            return "Waveform phase uploaded (2D)"
-
-class LLRFWorker(QThread):
-    """Esegue una funzione in un QThread e riporta via segnali."""
-    finished = pyqtSignal(object)
-    error = pyqtSignal(Exception)
-    log = pyqtSignal(str)
-
-    def __init__(self, func, *args, **kwargs):
-        super().__init__()
-        self.func = func
-        self.args = args
-        self.kwargs = kwargs
-
-    def run(self):
-        try:
-            res = self.func(*self.args, **self.kwargs)
-            self.finished.emit(res)
-        except Exception as e:
-            self.error.emit(e)
-            self.log.emit(f"Worker error: {e}")
-
-
-class LLRF_GUI(QWidget):
-    log_signal = pyqtSignal(str)
-
-    def __init__(self):
-        super().__init__()
-        # --- State ---
-        self.conn = None
-        self.online = False
-        self.original_wave = None
-        self.loaded_wave = None
-        self.original_wave_phase = None
-        self.loaded_wave_phase = None
-        self._slider_active = None
-        self._active_workers = [] # Traccia i worker attivi
-        
-        # --- Setup ---
-        self._setup_ui()
-        self._connect_signals()
-        self._update_global_state() # Chiama la funzione di stato globale
-
-    # ====================================================================
-    # UI CONSTRUCTION & STATE MANAGEMENT
-    # ====================================================================
-
-    def _set_working_state(self, is_working: bool):
-        """Gestisce il cursore e i messaggi di log per l'attività in corso."""
-        if is_working:
-            app = QApplication.instance()
-            if app:
-                app.setOverrideCursor(Qt.WaitCursor)
-            self.log(">>> Operation in progress. Please wait...")
-        else:
-            app = QApplication.instance()
-            if app:
-                app.restoreOverrideCursor()
-            if len(self._active_workers) == 0:
-                 self.log("<<< Operation finished.")
-        
-        # Chiama l'aggiornamento UI per riflettere lo stato (disabilitazione/abilitazione)
-        self._update_ui_state()
-
-    def _update_global_state(self):
-        """Aggiorna lo stato globale in base al conteggio dei worker attivi."""
-        is_working = len(self._active_workers) > 0
-        self._set_working_state(is_working)
-
-    def _update_ui_state(self):
-        """Abilita/disabilita i widget in base a connessione e attività del worker."""
-        is_working = len(self._active_workers) > 0
-        
-        # Widgets che richiedono una connessione E un'azione (Send, Set Amp/Phase/Interval, Restore)
-        requires_conn_and_action = [
-            self.btn_disconnect, self.btn_set_amp, self.btn_set_interval,
-            self.btn_restore,  self.btn_send_wave,
-            self.btn_send_wavephase, self.max_amp, self.offset,
-            self.duration
-        ]
-        
-        # Widgets che non richiedono connessione ma devono essere disabilitati da is_working
-        # (Load/Refresh sono sempre attivi, a meno che non ci sia un worker in corso)
-        non_conn_widgets_disabled_by_working = [
-             self.btn_load_wave, self.btn_load_wavephase,
-             self.btn_force_update_amp, self.btn_force_update_phase,
-             self.tabs
-        ]
-        
-        # 1. Gestione pulsanti di connessione
-        self.btn_connect.setEnabled(not self.online and not is_working)
-        self.btn_disconnect.setEnabled(self.online and not is_working)
-        
-        # 2. Aggiornamento estetico del pulsante e dello stato
-        if self.online:
-            self.btn_connect.setStyleSheet("background-color: #AAAAAA;")
-            self.btn_disconnect.setStyleSheet("background-color: #FF5555; color: white; font-weight: bold;")
-            self.status_label.setText("STATUS: CONNECTED")
-            self.status_label.setStyleSheet("QLabel#StatusLabel {background-color: #00AA00;}")
-        else:
-            self.btn_connect.setStyleSheet("background-color: #00AA00; color: white; font-weight: bold;")
-            self.btn_disconnect.setStyleSheet("background-color: #AAAAAA;")
-            self.status_label.setText("STATUS: DISCONNECTED")
-            self.status_label.setStyleSheet("QLabel#StatusLabel {background-color: #FF5555;}")
-
-        # 3. Disabilita/Abilita i widget che richiedono connessione
-        enabled_conn_action = self.online and not is_working
-        for widget in requires_conn_and_action:
-            widget.setEnabled(enabled_conn_action)
-            
-        # 4. Disabilita/Abilita i widget che non richiedono connessione
-        enabled_non_conn = not is_working
-        for widget in non_conn_widgets_disabled_by_working:
-             widget.setEnabled(enabled_non_conn)
-
-
-    def _setup_ui(self):
-        self.setWindowTitle("LLRF Control Console")
-        self.resize(1000, 750)
-        self.setStyleSheet(GUI_STYLE)
-
-        # Log Area (CREATO SUBITO)
-        self.log_display = QPlainTextEdit()
-        self.log_display.setReadOnly(True)
-        # Correzione font per macOS/Compatibilità
-        self.log_display.setStyleSheet("background:black; color:#0f0; padding:5px; font-family:'Menlo', 'Monaco', monospace, sans-serif;")
-        self.log_display.setMaximumBlockCount(5000)
-        self.log_display.setPlainText("LLRF GUI Ready")
-
-        # Validators
-        double_validator = QDoubleValidator()
-        double_validator.setNotation(QDoubleValidator.StandardNotation)
-
-        # --- Connection tab ---
-        tab_conn = QWidget()
-        l_conn = QVBoxLayout(tab_conn)
-        
-        # Connection Parameters Group
-        conn_group = QGroupBox("1. Connection Parameters")
-        l_conn_group = QVBoxLayout(conn_group)
-        self.ip = QLineEdit(DEFAULT_IP)
-        self.user = QLineEdit(DEFAULT_USER)
-        self.pwd = QLineEdit(DEFAULT_PWD)
-        
-        for lbl, widget in [("IP Address", self.ip), ("Username", self.user), ("Password", self.pwd)]:
-            h = QHBoxLayout()
-            h.addWidget(QLabel(lbl))
-            widget.setEchoMode(QLineEdit.Password) if lbl == "Password" else None
-            h.addWidget(widget)
-            l_conn_group.addLayout(h)
-        
-        # Connection Control Group
-        btn_group = QGroupBox("2. Connection Control")
-        h_btn = QHBoxLayout(btn_group)
-        self.btn_connect = QPushButton("CONNECT")
-        self.btn_disconnect = QPushButton("DISCONNECT")
-        self.status_label = QLabel(alignment=Qt.AlignCenter) # CREATO QUI
-        self.status_label.setObjectName("StatusLabel")
-        
-        h_btn.addWidget(self.btn_connect)
-        h_btn.addWidget(self.btn_disconnect)
-        
-        l_conn.addWidget(conn_group)
-        l_conn.addWidget(self.status_label)
-        l_conn.addWidget(btn_group)
-        l_conn.addStretch(1)
-
-        # --- Pulse Window tab (Amplitude + Interval) ---
-        tab_amp = QWidget()
-        l_amp = QVBoxLayout(tab_amp)
-        
-        # Max Amplitude Group
-        amp_group = QGroupBox("1. Maximum Amplitude Setting")
-        h_amp_group = QHBoxLayout(amp_group)
-        self.max_amp = QLineEdit(DEFAULT_MAX_AMP); self.max_amp.setValidator(double_validator)
-        self.btn_set_amp = QPushButton("Set Max Amp")
-        h_amp_group.addWidget(QLabel("Max Amplitude [arb.]"))
-        h_amp_group.addWidget(self.max_amp)
-        h_amp_group.addWidget(self.btn_set_amp)
-        l_amp.addWidget(amp_group)
-
-        # Interval Group
-        interval_group = QGroupBox(f"2. Feed-Forward Pulse Window [µs] (Max {MAX_PULSE_TIME_US} µs)")
-        l_int_group = QVBoxLayout(interval_group)
-        
-        h_offset = QHBoxLayout()
-        self.offset = QLineEdit("0"); self.offset.setValidator(double_validator); self.offset.setFixedWidth(100)
-        h_offset.addWidget(QLabel("Offset (Start Time)"))
-        h_offset.addWidget(self.offset)
-        h_offset.addStretch(1)
-        
-        h_duration = QHBoxLayout()
-        self.duration = QLineEdit("5"); self.duration.setValidator(double_validator); self.duration.setFixedWidth(100)
-        h_duration.addWidget(QLabel("Duration"))
-        h_duration.addWidget(self.duration)
-        h_duration.addStretch(1)
-        
-        self.btn_set_interval = QPushButton("Apply Offset & Duration")
-        
-        l_int_group.addLayout(h_offset)
-        l_int_group.addLayout(h_duration)
-        l_int_group.addWidget(self.btn_set_interval)
-        l_amp.addWidget(interval_group)
-        
-        # Phase Group
-        #phase_group = QGroupBox("3. Constant Phase Setting [deg]")
-        #h_phase_group = QHBoxLayout(phase_group)
-        #self.phase = QLineEdit("0"); self.phase.setValidator(double_validator)
-        #self.btn_set_phase = QPushButton("Set Constant Phase")
-        #h_phase_group.addWidget(QLabel("Phase Value [deg]"))
-        #h_phase_group.addWidget(self.phase)
-        #h_phase_group.addWidget(self.btn_set_phase)
-       # l_amp.addWidget(phase_group)
-
-        l_amp.addStretch(1)
-        
-        # --- Amplitude Waveform tab ---
-        tab_ampWave = QWidget()
-        l_ampW = QVBoxLayout(tab_ampWave)
-        
-        self.btn_load_wave = QPushButton("1. Load Waveform (*.npy, *.txt)")
-        self.btn_send_wave = QPushButton("2. Send to LLRF")
-        self.btn_force_update_amp = QPushButton("3. Refresh Preview")
-        
-        # Control Bar (Load, Send, Update)
-        wave_control_group = QGroupBox("Waveform Control & Shift (Amplitude)")
-        h_wave_control = QHBoxLayout(wave_control_group)
-        
-        # *** CORREZIONE LAYOUT: Pulsanti Waveform Amplitude ***
-        # Uso del fattore di stretch per garantire la visibilità
-        h_wave_control.addWidget(self.btn_load_wave, 1)
-        h_wave_control.addWidget(self.btn_send_wave, 1)
-        h_wave_control.addWidget(self.btn_force_update_amp, 1)
-        # *******************************************************
-        
-        l_ampW.addWidget(wave_control_group)
-
-        # Plot Amplitude
-        l_ampW.addWidget(QLabel("Live Preview - Amplitude [arb.] (Yellow line)"))
-        self.wave_preview = pg.PlotWidget()
-        self.wave_preview.setLabel('left', 'Amplitude', units='[arb.]')
-        self.wave_preview.setLabel('bottom', 'Time', units='µs')
-        self.wave_preview.setYRange(0, 1)
-        self.wave_preview.setXRange(0, MAX_PULSE_TIME_US)
-        
-        # Slider
-        slider_group = QGroupBox("Time Shift Preview [µs]")
-        h_slider = QVBoxLayout(slider_group)
-        self.wave_value_label = QLabel("Shift Amp = 0 µs", alignment=Qt.AlignCenter)
-        self.wave_slider = QSlider(Qt.Horizontal)
-        self.wave_slider.setMinimum(int(-MAX_PULSE_TIME_US))
-        self.wave_slider.setMaximum(int(MAX_PULSE_TIME_US))
-        self.wave_slider.setValue(0)
-        self.wave_slider.setTickInterval(5)
-        self.wave_slider.setTickPosition(QSlider.TicksBelow)
-        
-        h_slider.addWidget(self.wave_value_label)
-        h_slider.addWidget(self.wave_slider)
-        
-        l_ampW.addWidget(self.wave_preview)
-        l_ampW.addWidget(slider_group)
-        l_ampW.addStretch(1)
-
-        # --- Phase Waveform tab ---
-        tab_phase = QWidget()
-        l_phase = QVBoxLayout(tab_phase)
-        
-        self.btn_load_wavephase = QPushButton("1. Load Waveform (*.npy, *.txt)")
-        self.btn_send_wavephase = QPushButton("2. Send to LLRF")
-        self.btn_force_update_phase = QPushButton("3. Refresh Preview")
-        
-        # Control Bar (Load, Send, Update)
-        phase_wave_control_group = QGroupBox("Waveform Control & Shift (Phase)")
-        h_phase_wave_control = QHBoxLayout(phase_wave_control_group)
-        
-        # *** CORREZIONE LAYOUT: Pulsanti Waveform Phase ***
-        # Uso del fattore di stretch per garantire la visibilità
-        h_phase_wave_control.addWidget(self.btn_load_wavephase, 1)
-        h_phase_wave_control.addWidget(self.btn_send_wavephase, 1)
-        h_phase_wave_control.addWidget(self.btn_force_update_phase, 1)
-        # *******************************************************
-        
-        l_phase.addWidget(phase_wave_control_group)
-
-        # Plot Phase
-        l_phase.addWidget(QLabel("Live Preview - Phase [deg.] (Yellow line)"))
-        self.wave_preview_phase = pg.PlotWidget()
-        self.wave_preview_phase.setLabel('left', 'Phase', units='[deg]')
-        self.wave_preview_phase.setLabel('bottom', 'Time', units='µs')
-        self.wave_preview_phase.setYRange(-180, 180)
-        self.wave_preview_phase.setXRange(0, MAX_PULSE_TIME_US)
-        
-        # Slider Phase
-        slider_group_phase = QGroupBox("Time Shift Preview [µs]")
-        h_slider_phase = QVBoxLayout(slider_group_phase)
-        self.wave_value_label_phase = QLabel("Shift Phase = 0 µs", alignment=Qt.AlignCenter)
-        self.wave_slider_phase = QSlider(Qt.Horizontal)
-        self.wave_slider_phase.setMinimum(int(-MAX_PULSE_TIME_US))
-        self.wave_slider_phase.setMaximum(int(MAX_PULSE_TIME_US))
-        self.wave_slider_phase.setValue(0)
-        self.wave_slider_phase.setTickInterval(5)
-        self.wave_slider_phase.setTickPosition(QSlider.TicksBelow)
-        
-        h_slider_phase.addWidget(self.wave_value_label_phase)
-        h_slider_phase.addWidget(self.wave_slider_phase)
-        
-        l_phase.addWidget(self.wave_preview_phase)
-        l_phase.addWidget(slider_group_phase)
-        l_phase.addStretch(1)
-
-
-        # --- Restore tab ---
-        tab_reset = QWidget()
-        l_reset = QVBoxLayout(tab_reset)
-        reset_group = QGroupBox("System Reset & Diagnostics")
-        l_reset_group = QVBoxLayout(reset_group)
-        
-        self.btn_restore = QPushButton("RESTORE FACTORY DEFAULTS")
-        self.btn_restore.setStyleSheet("background-color: orange; color: black; font-weight: bold;")
-        
-        l_reset_group.addWidget(self.btn_restore)
-        l_reset_group.addWidget(QLabel(" **ATTENZIONE:** Questo comando resetterà tutti i parametri del dispositivo ai valori predefiniti."))
-        
-        l_reset.addWidget(reset_group)
-        l_reset.addStretch(1)
-
-        # Tabs
-        self.tabs = QTabWidget()
-        for name, tab in [
-            ("1. Connection", tab_conn),
-            ("2. Pulse Parameters", tab_amp),
-            ("3. Amplitude Waveform", tab_ampWave),
-            ("4. Phase Waveform" , tab_phase),
-            ("5. Diagnostics / Reset", tab_reset)
-        ]:
-            self.tabs.addTab(tab, name)
-
-        # Main layout
-        main = QVBoxLayout(self)
-        main.addWidget(self.tabs)
-        main.addWidget(QLabel("### System Log:"))
-        main.addWidget(self.log_display, 2)
-        self.tabs.setMinimumHeight(400)
-
-    def _connect_signals(self):
-        # Buttons
-        self.btn_connect.clicked.connect(self.on_connect_clicked)
-        self.btn_disconnect.clicked.connect(self.on_disconnect_clicked)
-        self.btn_set_amp.clicked.connect(self.on_set_amp_clicked)
-        self.btn_set_interval.clicked.connect(self.on_set_interval_clicked)
-        self.btn_restore.clicked.connect(self.on_restore_clicked)
-        #self.btn_set_phase.clicked.connect(self.on_set_phase_clicked)
-        
-        # Waveform Load/Send
-        self.btn_load_wave.clicked.connect(self.on_load_wave_clicked)
-        self.btn_load_wavephase.clicked.connect(self.on_load_wave_phase_clicked)
-        self.btn_send_wave.clicked.connect(self.on_send_wave_clicked)
-        self.btn_send_wavephase.clicked.connect(self.on_send_wavephase_clicked)
-        
-        # Forced Manual Update
-        self.btn_force_update_amp.clicked.connect(lambda: self.update_wave_preview(self.wave_slider.value()))
-        self.btn_force_update_phase.clicked.connect(lambda: self.update_wave_preview_phase(self.wave_slider_phase.value()))
-        
-        # Sliders (Automatic Update)
-        self.wave_slider.valueChanged.connect(self.on_wave_slider_changed)
-        self.wave_slider_phase.valueChanged.connect(self.on_wave_slider_changed_phase)
-
-        # Logging
-        self.log_signal.connect(self._append_log)
-
-    # ====================================================================
-    # HELPER METHODS (Logging, Workers, Validation)
-    # ====================================================================
-
-    def _append_log(self, text: str):
-        """Append text to the QPlainTextEdit (main thread)."""
-        self.log_display.appendPlainText(text)
-        sb = self.log_display.verticalScrollBar()
-        sb.setValue(sb.maximum())
-
-    def log(self, text: str):
-        """Thread-safe call to append log."""
-        self.log_signal.emit(text)
-
-    def _run_worker(self, func, *args, on_finished=None, on_error=None):
-        worker = LLRFWorker(func, *args)
-        worker.log.connect(self.log)
-        
-        # Funzione per pulire e aggiornare lo stato UI
-        def _cleanup(_):
-            try:
-                self._active_workers.remove(worker)
-            except ValueError:
-                pass
-            self._update_global_state() # Aggiorna lo stato UI
-
-        # Connessione ai callback originali e al cleanup
-        if on_finished:
-            worker.finished.connect(on_finished)
-        worker.finished.connect(_cleanup)
-        
-        if on_error:
-            worker.error.connect(on_error)
-        worker.error.connect(_cleanup)
-
-        self._active_workers.append(worker)
-        self._update_global_state() # Aggiorna lo stato UI prima di iniziare (disabilita)
-        worker.start()
-        return worker
-    
-    def _validate_float_input(self, line_edit, error_msg):
-        """Tenta di convertire il testo in float e gestisce l'errore."""
-        try:
-            return float(line_edit.text())
-        except ValueError:
-            QMessageBox.warning(self, "Invalid input", error_msg)
-            return None
-
-    # ====================================================================
-    # ACTION METHODS (LLRF Interaction)
-    # ====================================================================
-
-    def on_connect_clicked(self):
-        def connect_task():
-            conn = LLRFConnection(self.ip.text(), self.user.text(), self.pwd.text())
-            conn.connect()
-            return conn
-
-        def on_connected(conn):
-            self.conn = conn
-            self.online = True
-            self.log(f"Connected to {self.ip.text()} as {self.user.text()}")
-
-        def on_connect_error(e):
-            self.online = False
-            QMessageBox.warning(self, "Connection error", f"Could not connect:\n{e}")
-
-        self._run_worker(connect_task, on_finished=on_connected, on_error=on_connect_error)
-
-    def on_disconnect_clicked(self):
-        if self.conn:
-            try:
-                self.conn.close()
-            except Exception as e:
-                self.log(f"Disconnect error: {e}")
-        self.conn = None
-        self.online = False
-        self.log("Disconnected")
-        self._update_global_state() # CHIAMATA DIRETTA, NON C'È THREAD
-
-    def update_timing_fields(self, new_offset, new_duration):
-        self.offset.setText(str(new_offset))
-        self.duration.setText(str(new_duration))
-        self.log_signal.emit(f"Aggiornati campi: Offset={new_offset}, Duration={new_duration}")
-
-    def on_set_amp_clicked(self):
-        max_amp = self._validate_float_input(self.max_amp, "Max amplitude must be a number.")
-        if max_amp is None or not self.conn:
-            return
-
-        self._run_worker(lambda: self.conn.FF_Change_MaxAmp(max_amp),
-                             on_finished=lambda _: self.log("Max Amp set"),
-                             on_error=lambda e: self.log(f"Error setting max amp: {e}"))
-
-    def on_set_interval_clicked(self):
-        offset = self._validate_float_input(self.offset, "Offset must be a number.")
-        duration = self._validate_float_input(self.duration, "Duration must be a number.")
-        
-        wave = self.loaded_wave
-        phase = self.loaded_wave_phase
-        
-        # Logica di correzione del tempo per 2D waveforms (Eseguita nel Main Thread)
-        if wave is not None:
-            dim_amp = wave.ndim
-            if dim_amp == 2:
-                # Modifica la wave in place (OK perché nel main thread prima del worker)
-                diff = wave[0,1] - offset
-                wave[:,1] -= diff
-                self.loaded_wave[:,1] = wave[:,1]
-
-        if phase is not None:
-            dim_phase = phase.ndim
-            if dim_phase == 2:
-                # Modifica la wave in place (OK perché nel main thread prima del worker)
-                diff_p = phase[0,1] - offset
-                phase[:,1] += diff_p
-
-        def update_ui_after_interval_set(_):
-            self.log("FF Interval set")
-            # Queste chiamate devono essere nel main thread!
-            self.update_wave_preview(self.wave_slider.value())
-            self.update_wave_preview_phase(self.wave_slider_phase.value())
-            self.log("Waveform previews updated")
-
-
-        if offset is None or duration is None or not self.conn:
-            return
-        
-        self._run_worker(lambda: self.conn.FF_Change_Interval(offset, duration),
-                        on_finished=update_ui_after_interval_set,
-                        on_error=lambda e: self.log(f"Error setting interval: {e}"))
-
-  #  def on_set_phase_clicked(self):
-  #      phase = self._validate_float_input(self.phase, "Phase must be a number.")
-  #      if phase is None or not self.conn:
-  #          return
-
-  #      self._run_worker(lambda: self.conn.FF_Change_Phase(phase, True),
-  #                           on_finished=lambda _: self.log("Constant Phase set"),
-  #                           on_error=lambda e: self.log(f"Error setting phase: {e}"))
-
-    def on_restore_clicked(self):
-        if not self.conn:
-            QMessageBox.warning(self, "Not connected", "Please connect first.")
-            return
-        self._run_worker(lambda: self.conn.Restore(),
-                             on_finished=lambda _: self.log("Defaults restored"),
-                             on_error=lambda e: self.log(f"Error restoring defaults: {e}"))
-
-    # ====================================================================
-    # WAVEFORM LOGIC
-    # ====================================================================
-
-    def _load_waveform_data(self, fname):
-        """Helper per caricare i dati e gestire 1D/2D, aggiornando la UI se 2D."""
-        try:
-            wave = np.load(fname) if fname.endswith(".npy") else np.loadtxt(fname)
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Could not load file:\n{e}")
-            self.log(f"ERROR loading waveform: {e}")
-            return None
-        
-        wave = np.asarray(wave)
-        if wave.ndim not in (1, 2):
-            QMessageBox.critical(self, "Error", f"Unsupported waveform ndim: {wave.ndim}")
-            return None
-        
-        # Aggiorna UI se è un file 2D (Valore, Tempo)
-        if wave.ndim == 2:
-            time_us = wave[:, 1]
-            t_start = time_us[0]
-            t_end = time_us[-1]
-            pulse_duration = t_end - t_start
-            
-            self.update_timing_fields(t_start,pulse_duration) # CHIAMATA AL MAIN THREAD
-        
-        return wave
-
-    def on_load_wave_clicked(self):
-        fname, _ = QFileDialog.getOpenFileName(self, "Load waveform", "", "Waveforms (*.npy *.txt)")
-        if not fname:
-            return
-
-        wave = self._load_waveform_data(fname)
-        if wave is None:
-            return
-
-        ndim = wave.ndim
-        if ndim == 1:
-            self.original_wave = wave.copy()/np.max(wave.copy())
-            self.loaded_wave = wave.copy()/np.max(wave.copy())
-        if ndim == 2:
-            self.original_wave = wave.copy()
-            self.loaded_wave = wave.copy()
-            self.original_wave[:,0]/=np.max(self.original_wave[:,0])
-            
-        self.log(f"Loaded waveform Amplitude ({wave.ndim}D): {os.path.basename(fname)}")
-        self.wave_slider.setValue(0)
-        self.update_wave_preview(shift_us=0.0)
-
-    def on_load_wave_phase_clicked(self):
-        fname, _ = QFileDialog.getOpenFileName(self, "Load waveform", "", "Waveforms (*.npy *.txt)")
-        if not fname:
-            return
-
-        wave = self._load_waveform_data(fname)
-        if wave is None:
-            return
-
-        self.original_wave_phase = wave.copy()
-        self.loaded_wave_phase = wave.copy()
-        
-        self.log(f"Loaded waveform Phase ({wave.ndim}D): {os.path.basename(fname)}")
-        self.wave_slider_phase.setValue(0)
-        self.update_wave_preview_phase(shift_us_phase=0.0)
-
-    def on_wave_slider_changed(self, value: int):
-        if self._slider_active == "phase":
-            return
-        self._slider_active = "amp"
-        try:
-            self.wave_value_label.setText(f"Shift Amp = {value} µs")
-            self.update_wave_preview(shift_us=float(value))
-        finally:
-            self._slider_active = None
-
-    def on_wave_slider_changed_phase(self, value: int):
-        if self._slider_active == "amp":
-            return
-        self._slider_active = "phase"
-        try:
-            self.wave_value_label_phase.setText(f"Shift Phase = {value} µs")
-            self.update_wave_preview_phase(shift_us_phase=float(value))
-        finally:
-            self._slider_active = None
-
-    def _get_waveform_params(self, original_wave):
-        """Estrae i parametri per il calcolo e il plot, gestendo 1D e 2D."""
-        N = original_wave.shape[0]
-        dimension = original_wave.ndim
-        signal = original_wave[:, 0].copy() if dimension == 2 else original_wave.copy()
-
-        try:
-            init_offset = float(self.offset.text())
-            pulse_duration = float(self.duration.text())
-        except ValueError:
-            init_offset = 0.0
-            pulse_duration = MAX_PULSE_TIME_US
-            
-        if dimension == 2:
-            Time_us_orig = original_wave[:, 1]
-            pulse_length_for_roll = Time_us_orig[-1] - Time_us_orig[0]
-        else:
-            Time_us_orig = np.linspace(0, MAX_PULSE_TIME_US, N)
-            pulse_length_for_roll = MAX_PULSE_TIME_US
-
-        # Calcola l'indice di cut-off basato sulla durata UI
-        index_null = int(N * ( pulse_duration) / MAX_PULSE_TIME_US)
-        
-        return N, dimension, signal, Time_us_orig, pulse_length_for_roll, index_null
-
-    def update_wave_preview(self, shift_us: float = 0.0):
-        if self.original_wave is None: return
-
-        self.setUpdatesEnabled(False)
-        try:
-            N, dimension, signal, Time_us_orig, pulse_length_for_roll, index_null = \
-                self._get_waveform_params(self.original_wave)
-
-            rolled_ind = int(shift_us * N / pulse_length_for_roll)
-            active = np.roll(signal, rolled_ind)
-
-            # Riempimento dei vuoti (Amplitude -> Riempie con 1)
-            if rolled_ind > 0:
-                active[:rolled_ind] = 1
-            elif rolled_ind < 0:
-                active[rolled_ind:] = 1
-            
-            signal_to_plot = active.copy()
-            if (index_null < N) and (dimension == 1):
-                signal_to_plot[index_null:] = 0
-            
-            # Aggiornamento dello stato per l'invio
-            if dimension == 2:
-                # Copia il tempo attuale dal loaded_wave (potrebbe essere stato shiftato dall'UI)
-                Time_us_current = self.loaded_wave[:,1].copy()
-                self.loaded_wave = np.transpose(np.array([signal_to_plot, Time_us_current]))
-            else:
-                self.loaded_wave = signal_to_plot
-            
-            # Aggiornamento del Plot
-            plot_item = self.wave_preview.getPlotItem()
-            plot_item.clearPlots()
-            
-            current_offset = float(self.offset.text())
-            
-            if dimension == 1:
-                plot_item.plot(Time_us_orig + current_offset, signal_to_plot, pen='y')
-            elif dimension == 2:
-                # Usa il tempo da loaded_wave che è quello attuale
-                plot_item.plot(self.loaded_wave[:,1], signal_to_plot, pen='y')
-
-            self.wave_preview.repaint()
-            self.wave_preview.setYRange(0, 1)
-            self.wave_preview.setXRange(0, MAX_PULSE_TIME_US)
-
-        finally:
-            self.setUpdatesEnabled(True)
-
-    def update_wave_preview_phase(self, shift_us_phase: float = 0.0):
-        if self.original_wave_phase is None: return
-
-        self.setUpdatesEnabled(False)
-        try:
-            N, dimension, signal, Time_us_orig, pulse_length_for_roll, index_null = \
-                self._get_waveform_params(self.original_wave_phase)
-            
-            rolled_ind = int(shift_us_phase * N / pulse_length_for_roll)
-            active = np.roll(signal, rolled_ind)
-
-            # Riempimento dei vuoti (Phase -> Riempie con 0)
-            if rolled_ind > 0:
-                active[:rolled_ind] = 0
-            elif rolled_ind < 0:
-                active[rolled_ind:] = 0
-                
-            signal_to_plot = active.copy()
-            if (index_null < N) and (dimension == 1):
-                signal_to_plot[index_null:] = 0
-            
-            # Aggiornamento dello stato per l'invio
-            if dimension == 2:
-                Time_us_current = self.loaded_wave_phase[:,1].copy()
-                self.loaded_wave_phase = np.transpose(np.array([signal_to_plot, Time_us_current]))
-            else:
-                self.loaded_wave_phase = signal_to_plot
-            
-            # Aggiornamento del Plot
-            plot_item = self.wave_preview_phase.getPlotItem()
-            plot_item.clearPlots()
-            
-            current_offset = float(self.offset.text())
-            
-            if dimension == 1:
-                plot_item.plot(Time_us_orig + current_offset, signal_to_plot, pen='y')
-            elif dimension == 2:
-                plot_item.plot(self.loaded_wave_phase[:,1], signal_to_plot, pen='y')
-
-            self.wave_preview_phase.repaint()
-            self.wave_preview_phase.setYRange(-180, 180)
-            self.wave_preview_phase.setXRange(0, MAX_PULSE_TIME_US)
-
-        finally:
-            self.setUpdatesEnabled(True)
-            
-    # --- Sending waveform methods ---
-
-    def on_send_wave_clicked(self):
-        if self.loaded_wave is None:
-            QMessageBox.warning(self, "Error", "No amplitude waveform loaded!")
-            return
-        if not self.conn:
-            QMessageBox.warning(self, "Not connected", "Please connect first.")
-            return
-
-        self._run_worker(self.send_wave_task,
-                             on_finished=lambda r: self.log(str(r)),
-                             on_error=lambda e: self.log(f"Error uploading amplitude waveform: {e}"))
-
-    def on_send_wavephase_clicked(self):
-        if self.loaded_wave_phase is None:
-            QMessageBox.warning(self, "Error", "No phase waveform loaded!")
-            return
-        if not self.conn:
-            QMessageBox.warning(self, "Not connected", "Please connect first.")
-            return
-
-        self._run_worker(self.send_wave_phase_task,
-                             on_finished=lambda r: self.log(str(r)),
-                             on_error=lambda e: self.log(f"Error uploading phase waveform: {e}"))
-
-
-    def send_wave_task(self):
-        wave = self.loaded_wave
-        ndim = wave.ndim
-        max_amp = self._validate_float_input(self.max_amp, "Max amp must be number.") or 1.0
-        init_t = self._validate_float_input(self.offset, "Offset must be number.") or 0.0
-
-        if ndim == 1:
-            if hasattr(self.conn, "Set_Arbitrary_Shape"):
-                self.conn.Set_Arbitrary_Shape(wave.copy(), max_amp, init_t=init_t)
-            else:
-                raise RuntimeError("LLRFConnection has no Set_Arbitrary_Shape method")
-            return "Waveform amplitude uploaded (1D)"
-        else:
-            amplitude = wave[:, 0].copy()
-            time = wave[:, 1].copy()
-            t_start = float(time[0])
-            t_end = float(time[-1])
-            
-            if hasattr(self.conn, "Set_Arbitrary_Shape_AndTime"):
-                self.conn.Set_Arbitrary_Shape_AndTime(amplitude, max_amp, t_start, t_end)
-            else:
-                self.conn.Set_Arbitrary_Shape(t_end - t_start, amplitude, max_amp, init_t=t_start)
-            return "Waveform amplitude uploaded (2D)"
-            
-    def send_wave_phase_task(self):
-        wave_phase = self.loaded_wave_phase
-        ndim_phase = wave_phase.ndim
-        cent_phase = self._validate_float_input(self.phase, "Phase must be number.") or 0.0
-        init_t = self._validate_float_input(self.offset, "Offset must be number.") or 0.0
-        
-        if ndim_phase == 1:
-            if hasattr(self.conn, "Set_Arbitrary_Phase"):
-                self.conn.Set_Arbitrary_Phase(wave_phase.copy(), cent_phase, init_t=init_t)
-            else:
-                raise RuntimeError("LLRFConnection has no Set_Arbitrary_Phase method")
-            return "Waveform phase uploaded (1D)"
-        else:
-            amplitude = wave_phase[:, 0].copy()
-            time = wave_phase[:, 1].copy()
-            t_start = float(time[0])
-            t_end = float(time[-1])
-            
-            if hasattr(self.conn, "Set_Arbitrary_Phase_AndTime"):
-                self.conn.Set_Arbitrary_Phase_AndTime(amplitude, cent_phase, t_start, t_end)
-            else:
-                self.conn.Set_Arbitrary_Phase(t_end - t_start, amplitude, cent_phase, init_t=t_start)
-            return "Waveform phase uploaded (2D)"
-
-    # --- Utility: secret pixmap ---
-
-    def show_secret_pixmap(self):
-        if getattr(sys, 'frozen', False):
-            script_dir = os.path.dirname(sys.executable)
-        else:
-            script_dir = os.path.dirname(os.path.abspath(sys.argv[0]))
-
-        script_dir = 'C:\\Users\\Stefano Farina\\Desktop'
-        original = os.path.join(script_dir, "test.png")
-        converted = os.path.join(script_dir, "Segreto_temp.png")
-
-        try:
-            img = Image.open(original)
-            img.save(converted, "PNG")
-        except Exception as e:
-            QMessageBox.warning(self, "Errore", f"Impossibile aprire/convetire immagine:\n{e}")
-            self.log(f"PIL error: {e}")
-            return
-
-        pixmap = QPixmap(converted)
-        if pixmap.isNull():
-            QMessageBox.warning(self, "Errore", f"Qt non riesce a caricare l'immagine convertita")
-            self.log("QPixmap NULL")
-            return
-
-        dlg = QDialog(self)
-        dlg.setWindowTitle(" Segreto ")
-        lbl = QLabel()
-        lbl.setPixmap(pixmap)
-        lbl.setScaledContents(True)
-        layout = QVBoxLayout()
-        layout.addWidget(lbl)
-        dlg.setLayout(layout)
-        dlg.resize(600, 400)
-        dlg.exec_()
-
-
-if __name__ == "__main__":
-    app = QApplication.instance() or QApplication(sys.argv)
-    gui = LLRF_GUI()
-    gui.show()
-    sys.exit(app.exec_())
+# llrfgui_threadsafe.py
+import sys
+import os
+import numpy as np
+from PIL import Image
+
+from PyQt5.QtCore import Qt, QThread, QTimer, QSize, QPointF, pyqtSignal
+from PyQt5.QtGui import QPixmap, QDoubleValidator, QFontDatabase, QPainter, QPen, QColor, QIcon, QPolygonF
+from PyQt5.QtWidgets import (
+    QApplication, QWidget, QPushButton, QLineEdit, QLabel,
+    QVBoxLayout, QHBoxLayout, QTabWidget, QFileDialog, QMessageBox,
+    QSlider, QDialog, QPlainTextEdit, QGroupBox, QSizePolicy, QSpacerItem, QCheckBox,
+    QListWidget, QListWidgetItem, QComboBox, QInputDialog, QProgressDialog
+)
+
+import pyqtgraph as pg
+
+from LLRF_executor import LLRFExecutor, PRIORITY_CONTROL, PRIORITY_UPLOAD
+from LLRF_metrics import Metrics
+from LLRF_waveforms import ShiftBank
+from LLRF_library import WaveformLibrary
+from LLRF_loaders import load_waveform_file, LoadCancelled
+
+# --- CONSTANTS ---
+MAX_PULSE_TIME_US = 34.0
+DEFAULT_IP = "192.168.0.109"
+DEFAULT_USER = "root"
+DEFAULT_PWD = "Jungle"
+DEFAULT_MAX_AMP = "1000"
+METRICS_REFRESH_MS = 1000
+PREVIEW_REFRESH_MS = 16     # ~60 Hz: gli eventi dello slider vengono accorpati a questo ritmo
+SHIFT_STEP_US = 0.01        # risoluzione degli slider di shift (10 ns)
+SHIFT_FRACTIONAL = "linear" # shift sotto il campione: "linear" o "fft" (vedi ShiftBank)
+WAVEFORM_FILE_FILTER = ("Waveforms (*.npy *.txt *.csv *.dat *.trc *.isf *.wfm *.bin);;"
+                        "Scope captures (*.trc *.isf *.wfm *.bin);;All files (*)")
+LOAD_MAX_POINTS = 65536     # catture piu' lunghe vengono ricampionate durante la lettura
+LIBRARY_THUMB_WIDTH = 120
+LIBRARY_THUMB_HEIGHT = 36
+LIVE_DEBOUNCE_MS = 200      # modo live: attesa dopo l'ultima modifica prima di scrivere sul dispositivo
+
+# --- STYLES (Estetica Migliorata) ---
+GUI_STYLE = """
+    QGroupBox {
+        font-weight: bold;
+        margin-top: 10px;
+        border: 2px solid #555555;
+        border-radius: 5px;
+        padding-top: 15px;
+    }
+    QPushButton {
+        padding: 5px;
+        border-radius: 3px;
+        /* Imposta uno sfondo predefinito per i pulsanti abilitati */
+        background-color: #007BFF; 
+        color: white;
+    }
+    QTabWidget::pane { 
+        border: 1px solid #C4C4C3;
+        background: white;
+    }
+    QLabel#StatusLabel {
+        font-size: 14px;
+        font-weight: bold;
+        padding: 5px;
+        border-radius: 3px;
+        background-color: #222222;
+        color: white; 
+    }
+    /* CORREZIONE VISIBILITÀ: Rende i widget non-input visibili. */
+    QLineEdit {
+        background-color: #F0F0F0;
+        border: 1px solid #AAAAAA;
+        padding: 3px;
+        color: black; 
+    }
+    QLabel {
+        color: black;
+    }
+    /* SOLUZIONE DEFINITIVA VISIBILITÀ PULSANTI DISABILITATI: 
+       Forza uno stile visibile per i pulsanti disabilitati (come Load/Send all'inizio). */
+    QPushButton:disabled {
+        background-color: #E0E0E0; /* Grigio chiaro forzato */
+        color: #A0A0A0; /* Testo grigio scuro forzato */
+    }
+    /* Sovrascrivi gli stili di connessione disabilitati per mantenerli grigi */
+    QPushButton#btn_disconnect:disabled {
+        background-color: #AAAAAA;
+    }
+"""
+
+# ====================================================================
+# MOCK CLASS (Solo per testing)
+# ====================================================================
+try:
+    from LLRF import LLRFConnection
+except ImportError:
+    class LLRFConnection:
+        def __init__(self, ip, user, pwd):
+            pass
+        def connect(self):
+            import time; time.sleep(1.0) # Simulate connection time
+            pass
+        def close(self):
+            pass
+        def FF_Change_MaxAmp(self, max_amp):
+            import time; time.sleep(0.3)
+            pass
+        def FF_Change_Interval(self, offset, duration):
+            import time; time.sleep(0.5)
+            pass
+        def FF_Change_Phase(self, phase, update):
+            import time; time.sleep(0.3)
+            pass
+        def Restore(self):
+            import time; time.sleep(1.5)
+            pass
+        def Set_Arbitrary_Shape(self, wave, max_amp, init_t):
+            import time; time.sleep(0.7)
+            return "Waveform amplitude uploaded (1D)"
+        def Set_Arbitrary_Shape_AndTime(self, amplitude, max_amp, t_start, t_end):
+            import time; time.sleep(0.7)
+            return "Waveform amplitude uploaded (2D)"
+        def Set_Arbitrary_Phase(self, wave_phase, cent_phase, init_t):
+            import time; time.sleep(0.7)
+            return "Waveform phase uploaded (1D)"
+        def Set_Arbitrary_Phase_AndTime(self, amplitude, cent_phase, t_start, t_end):
+            import time; time.sleep(0.7)
+            return "Waveform phase uploaded (2D)"
+
+class WaveformLoadWorker(QThread):
+    """Carica una forma d'onda (anche enorme) fuori dal thread della GUI, con progresso e annullamento."""
+    progress = pyqtSignal(int)
+    loaded = pyqtSignal(object)
+    error = pyqtSignal(Exception)
+    cancelled = pyqtSignal()
+
+    def __init__(self, fname, max_points=LOAD_MAX_POINTS):
+        super().__init__()
+        self.fname = fname
+        self.max_points = max_points
+        self._cancel = False
+
+    def cancel(self):
+        self._cancel = True
+
+    def run(self):
+        try:
+            wave = load_waveform_file(self.fname, self.max_points,
+                                      progress=lambda f: self.progress.emit(int(f * 100)),
+                                      cancel=lambda: self._cancel)
+            self.loaded.emit(wave)
+        except LoadCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.error.emit(e)
+
+
+class LLRF_GUI(QWidget):
+    log_signal = pyqtSignal(str)
+
+    def __init__(self):
+        super().__init__()
+        # --- State ---
+        self.conn = None
+        self.online = False
+        self.original_wave = None
+        self.loaded_wave = None
+        self.original_wave_phase = None
+        self.loaded_wave_phase = None
+        self._slider_active = None
+        self._pending_shift = {}  # ultimo valore dello slider non ancora disegnato, per preview
+        # Per 'amp'/'phase': ShiftBank della sorgente, geometria del plot (tempi, cut) e shift corrente
+        self._shift_banks = {}
+        self._preview_geom = {}
+        self._preview_shift = {}
+        try:
+            self.library = WaveformLibrary()
+        except OSError as e:
+            self.library = None
+            print(f"Waveform library not available: {e}")
+        self._load_workers = []   # Caricamenti di file in corso
+        # Un solo thread possiede la connessione ed esegue i comandi in coda
+        self.executor = LLRFExecutor(parent=self)
+        self._connecting = False
+        self._live_dirty = set()  # modo live: gruppi modificati non ancora scritti
+        # Metriche condivise da tutte le connessioni della sessione (tab 5)
+        self.metrics = Metrics()
+        
+        # --- Setup ---
+        self._setup_ui()
+        self._connect_signals()
+        self.executor.start()
+        self._update_ui_state()
+
+    # ====================================================================
+    # UI CONSTRUCTION & STATE MANAGEMENT
+    # ====================================================================
+
+    def _on_queue_changed(self, pending: int):
+        """Aggiorna l'indicatore della coda dei comandi (nessun blocco della finestra)."""
+        self.queue_label.setText(f"Queue: {pending} pending" if pending else "Queue: idle")
+        self.btn_cancel_queue.setEnabled(pending > 0)
+        if pending == 0:
+            self.log("<<< Operation finished.")
+
+    def _update_ui_state(self):
+        """Abilita/disabilita i widget in base alla connessione (i comandi si accodano)."""
+        # Widgets che richiedono una connessione (Send, Set Amp/Phase/Interval, Restore)
+        requires_conn = [
+            self.btn_disconnect, self.btn_set_amp, self.btn_set_interval,
+            self.btn_restore,  self.btn_send_wave,
+            self.btn_send_wavephase, self.max_amp, self.offset,
+            self.duration
+        ]
+        
+        # 1. Gestione pulsanti di connessione
+        self.btn_connect.setEnabled(not self.online and not self._connecting)
+        self.btn_disconnect.setEnabled(self.online)
+        
+        # 2. Aggiornamento estetico del pulsante e dello stato
+        if self.online:
+            self.btn_connect.setStyleSheet("background-color: #AAAAAA;")
+            self.btn_disconnect.setStyleSheet("background-color: #FF5555; color: white; font-weight: bold;")
+            self.status_label.setText("STATUS: CONNECTED")
+            self.status_label.setStyleSheet("QLabel#StatusLabel {background-color: #00AA00;}")
+        else:
+            self.btn_connect.setStyleSheet("background-color: #00AA00; color: white; font-weight: bold;")
+            self.btn_disconnect.setStyleSheet("background-color: #AAAAAA;")
+            self.status_label.setText("STATUS: CONNECTING..." if self._connecting else "STATUS: DISCONNECTED")
+            self.status_label.setStyleSheet("QLabel#StatusLabel {background-color: #FF5555;}")
+
+        # 3. Disabilita/Abilita i widget che richiedono connessione
+        for widget in requires_conn:
+            widget.setEnabled(self.online)
+
+
+    def _setup_ui(self):
+        self.setWindowTitle("LLRF Control Console")
+        self.resize(1000, 750)
+        self.setStyleSheet(GUI_STYLE)
+
+        # Log Area (CREATO SUBITO)
+        self.log_display = QPlainTextEdit()
+        self.log_display.setReadOnly(True)
+        # Correzione font per macOS/Compatibilità
+        self.log_display.setStyleSheet("background:black; color:#0f0; padding:5px; font-family:'Menlo', 'Monaco', monospace, sans-serif;")
+        self.log_display.setMaximumBlockCount(5000)
+        self.log_display.setPlainText("LLRF GUI Ready")
+
+        # Validators
+        double_validator = QDoubleValidator()
+        double_validator.setNotation(QDoubleValidator.StandardNotation)
+
+        # --- Connection tab ---
+        tab_conn = QWidget()
+        l_conn = QVBoxLayout(tab_conn)
+        
+        # Connection Parameters Group
+        conn_group = QGroupBox("1. Connection Parameters")
+        l_conn_group = QVBoxLayout(conn_group)
+        self.ip = QLineEdit(DEFAULT_IP)
+        self.user = QLineEdit(DEFAULT_USER)
+        self.pwd = QLineEdit(DEFAULT_PWD)
+        
+        for lbl, widget in [("IP Address", self.ip), ("Username", self.user), ("Password", self.pwd)]:
+            h = QHBoxLayout()
+            h.addWidget(QLabel(lbl))
+            widget.setEchoMode(QLineEdit.Password) if lbl == "Password" else None
+            h.addWidget(widget)
+            l_conn_group.addLayout(h)
+        
+        # Connection Control Group
+        btn_group = QGroupBox("2. Connection Control")
+        h_btn = QHBoxLayout(btn_group)
+        self.btn_connect = QPushButton("CONNECT")
+        self.btn_disconnect = QPushButton("DISCONNECT")
+        self.status_label = QLabel(alignment=Qt.AlignCenter) # CREATO QUI
+        self.status_label.setObjectName("StatusLabel")
+        
+        h_btn.addWidget(self.btn_connect)
+        h_btn.addWidget(self.btn_disconnect)
+        
+        l_conn.addWidget(conn_group)
+        l_conn.addWidget(self.status_label)
+        l_conn.addWidget(btn_group)
+        l_conn.addStretch(1)
+
+        # --- Pulse Window tab (Amplitude + Interval) ---
+        tab_amp = QWidget()
+        l_amp = QVBoxLayout(tab_amp)
+        
+        # Max Amplitude Group
+        amp_group = QGroupBox("1. Maximum Amplitude Setting")
+        h_amp_group = QHBoxLayout(amp_group)
+        self.max_amp = QLineEdit(DEFAULT_MAX_AMP); self.max_amp.setValidator(double_validator)
+        self.btn_set_amp = QPushButton("Set Max Amp")
+        h_amp_group.addWidget(QLabel("Max Amplitude [arb.]"))
+        h_amp_group.addWidget(self.max_amp)
+        h_amp_group.addWidget(self.btn_set_amp)
+        l_amp.addWidget(amp_group)
+
+        # Interval Group
+        interval_group = QGroupBox(f"2. Feed-Forward Pulse Window [µs] (Max {MAX_PULSE_TIME_US} µs)")
+        l_int_group = QVBoxLayout(interval_group)
+        
+        h_offset = QHBoxLayout()
+        self.offset = QLineEdit("0"); self.offset.setValidator(double_validator); self.offset.setFixedWidth(100)
+        h_offset.addWidget(QLabel("Offset (Start Time)"))
+        h_offset.addWidget(self.offset)
+        h_offset.addStretch(1)
+        
+        h_duration = QHBoxLayout()
+        self.duration = QLineEdit("5"); self.duration.setValidator(double_validator); self.duration.setFixedWidth(100)
+        h_duration.addWidget(QLabel("Duration"))
+        h_duration.addWidget(self.duration)
+        h_duration.addStretch(1)
+        
+        self.btn_set_interval = QPushButton("Apply Offset & Duration")
+        
+        l_int_group.addLayout(h_offset)
+        l_int_group.addLayout(h_duration)
+        l_int_group.addWidget(self.btn_set_interval)
+        l_amp.addWidget(interval_group)
+
+        # Live mode: campi e slider scritti sul dispositivo dopo LIVE_DEBOUNCE_MS
+        self.chk_live = QCheckBox(f"Live mode: write parameter and shift changes automatically "
+                                  f"({LIVE_DEBOUNCE_MS} ms debounce, last value wins)")
+        l_amp.addWidget(self.chk_live)
+        self.live_timer = QTimer(self)
+        self.live_timer.setSingleShot(True)
+        self.live_timer.setInterval(LIVE_DEBOUNCE_MS)
+        
+        # Phase Group
+        #phase_group = QGroupBox("3. Constant Phase Setting [deg]")
+        #h_phase_group = QHBoxLayout(phase_group)
+        #self.phase = QLineEdit("0"); self.phase.setValidator(double_validator)
+        #self.btn_set_phase = QPushButton("Set Constant Phase")
+        #h_phase_group.addWidget(QLabel("Phase Value [deg]"))
+        #h_phase_group.addWidget(self.phase)
+        #h_phase_group.addWidget(self.btn_set_phase)
+       # l_amp.addWidget(phase_group)
+
+        l_amp.addStretch(1)
+        
+        # --- Amplitude Waveform tab ---
+        tab_ampWave = QWidget()
+        l_ampW = QVBoxLayout(tab_ampWave)
+        
+        self.btn_load_wave = QPushButton("1. Load Waveform (*.npy, *.txt)")
+        self.btn_send_wave = QPushButton("2. Send to LLRF")
+        self.btn_force_update_amp = QPushButton("3. Refresh Preview")
+        
+        # Control Bar (Load, Send, Update)
+        wave_control_group = QGroupBox("Waveform Control & Shift (Amplitude)")
+        h_wave_control = QHBoxLayout(wave_control_group)
+        
+        # *** CORREZIONE LAYOUT: Pulsanti Waveform Amplitude ***
+        # Uso del fattore di stretch per garantire la visibilità
+        h_wave_control.addWidget(self.btn_load_wave, 1)
+        h_wave_control.addWidget(self.btn_send_wave, 1)
+        h_wave_control.addWidget(self.btn_force_update_amp, 1)
+        # *******************************************************
+        
+        l_ampW.addWidget(wave_control_group)
+
+        # Plot Amplitude
+        l_ampW.addWidget(QLabel("Live Preview - Amplitude [arb.] (Yellow line)"))
+        self.wave_preview = pg.PlotWidget()
+        self.wave_preview.setLabel('left', 'Amplitude', units='[arb.]')
+        self.wave_preview.setLabel('bottom', 'Time', units='µs')
+        self.wave_preview.setYRange(0, 1)
+        self.wave_preview.setXRange(0, MAX_PULSE_TIME_US)
+        self.wave_curve = self._make_preview_curve(self.wave_preview)
+        self.wave_curve_tail = self.wave_preview.plot(pen='y')
+        
+        # Slider
+        slider_group = QGroupBox("Time Shift Preview [µs]")
+        h_slider = QVBoxLayout(slider_group)
+        self.wave_value_label = QLabel("Shift Amp = 0 µs", alignment=Qt.AlignCenter)
+        self.wave_slider = QSlider(Qt.Horizontal)
+        self.wave_slider.setMinimum(int(round(-MAX_PULSE_TIME_US / SHIFT_STEP_US)))
+        self.wave_slider.setMaximum(int(round(MAX_PULSE_TIME_US / SHIFT_STEP_US)))
+        self.wave_slider.setValue(0)
+        self.wave_slider.setSingleStep(1)
+        self.wave_slider.setPageStep(int(round(1 / SHIFT_STEP_US)))
+        self.wave_slider.setTickInterval(int(round(5 / SHIFT_STEP_US)))
+        self.wave_slider.setTickPosition(QSlider.TicksBelow)
+        
+        h_slider.addWidget(self.wave_value_label)
+        h_slider.addWidget(self.wave_slider)
+        
+        l_ampW.addWidget(self.wave_preview)
+        l_ampW.addWidget(slider_group)
+        l_ampW.addStretch(1)
+
+        # --- Phase Waveform tab ---
+        tab_phase = QWidget()
+        l_phase = QVBoxLayout(tab_phase)
+        
+        self.btn_load_wavephase = QPushButton("1. Load Waveform (*.npy, *.txt)")
+        self.btn_send_wavephase = QPushButton("2. Send to LLRF")
+        self.btn_force_update_phase = QPushButton("3. Refresh Preview")
+        
+        # Control Bar (Load, Send, Update)
+        phase_wave_control_group = QGroupBox("Waveform Control & Shift (Phase)")
+        h_phase_wave_control = QHBoxLayout(phase_wave_control_group)
+        
+        # *** CORREZIONE LAYOUT: Pulsanti Waveform Phase ***
+        # Uso del fattore di stretch per garantire la visibilità
+        h_phase_wave_control.addWidget(self.btn_load_wavephase, 1)
+        h_phase_wave_control.addWidget(self.btn_send_wavephase, 1)
+        h_phase_wave_control.addWidget(self.btn_force_update_phase, 1)
+        # *******************************************************
+        
+        l_phase.addWidget(phase_wave_control_group)
+
+        # Plot Phase
+        l_phase.addWidget(QLabel("Live Preview - Phase [deg.] (Yellow line)"))
+        self.wave_preview_phase = pg.PlotWidget()
+        self.wave_preview_phase.setLabel('left', 'Phase', units='[deg]')
+        self.wave_preview_phase.setLabel('bottom', 'Time', units='µs')
+        self.wave_preview_phase.setYRange(-180, 180)
+        self.wave_preview_phase.setXRange(0, MAX_PULSE_TIME_US)
+        self.wave_curve_phase = self._make_preview_curve(self.wave_preview_phase)
+        self.wave_curve_phase_tail = self.wave_preview_phase.plot(pen='y')
+        
+        # Slider Phase
+        slider_group_phase = QGroupBox("Time Shift Preview [µs]")
+        h_slider_phase = QVBoxLayout(slider_group_phase)
+        self.wave_value_label_phase = QLabel("Shift Phase = 0 µs", alignment=Qt.AlignCenter)
+        self.wave_slider_phase = QSlider(Qt.Horizontal)
+        self.wave_slider_phase.setMinimum(int(round(-MAX_PULSE_TIME_US / SHIFT_STEP_US)))
+        self.wave_slider_phase.setMaximum(int(round(MAX_PULSE_TIME_US / SHIFT_STEP_US)))
+        self.wave_slider_phase.setValue(0)
+        self.wave_slider_phase.setSingleStep(1)
+        self.wave_slider_phase.setPageStep(int(round(1 / SHIFT_STEP_US)))
+        self.wave_slider_phase.setTickInterval(int(round(5 / SHIFT_STEP_US)))
+        self.wave_slider_phase.setTickPosition(QSlider.TicksBelow)
+        
+        h_slider_phase.addWidget(self.wave_value_label_phase)
+        h_slider_phase.addWidget(self.wave_slider_phase)
+        
+        l_phase.addWidget(self.wave_preview_phase)
+        l_phase.addWidget(slider_group_phase)
+        l_phase.addStretch(1)
+
+
+        # --- Restore tab ---
+        tab_reset = QWidget()
+        self._tab_diagnostics = tab_reset
+        l_reset = QVBoxLayout(tab_reset)
+        reset_group = QGroupBox("System Reset & Diagnostics")
+        l_reset_group = QVBoxLayout(reset_group)
+        
+        self.btn_restore = QPushButton("RESTORE FACTORY DEFAULTS")
+        self.btn_restore.setStyleSheet("background-color: orange; color: black; font-weight: bold;")
+        
+        l_reset_group.addWidget(self.btn_restore)
+        l_reset_group.addWidget(QLabel(" **ATTENZIONE:** Questo comando resetterà tutti i parametri del dispositivo ai valori predefiniti."))
+        
+        l_reset.addWidget(reset_group)
+
+        metrics_group = QGroupBox("Connection Metrics")
+        l_metrics = QVBoxLayout(metrics_group)
+        h_metrics = QHBoxLayout()
+        self.chk_metrics = QCheckBox("Enable instrumentation")
+        self.btn_metrics_reset = QPushButton("Reset")
+        self.btn_metrics_json = QPushButton("Export JSON")
+        self.btn_metrics_prom = QPushButton("Export Prometheus")
+        h_metrics.addWidget(self.chk_metrics)
+        h_metrics.addStretch(1)
+        h_metrics.addWidget(self.btn_metrics_reset)
+        h_metrics.addWidget(self.btn_metrics_json)
+        h_metrics.addWidget(self.btn_metrics_prom)
+        self.metrics_display = QPlainTextEdit()
+        self.metrics_display.setReadOnly(True)
+        self.metrics_display.setLineWrapMode(QPlainTextEdit.NoWrap)
+        self.metrics_display.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        l_metrics.addLayout(h_metrics)
+        l_metrics.addWidget(self.metrics_display)
+        l_reset.addWidget(metrics_group, 1)
+
+        # Aggiornamento del pannello solo con la tab 5 visibile e le metriche attive
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.setInterval(METRICS_REFRESH_MS)
+        self.metrics_timer.timeout.connect(self._refresh_metrics)
+
+        # Un solo ridisegno per frame anche se lo slider emette molti valueChanged
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(PREVIEW_REFRESH_MS)
+        self.preview_timer.timeout.connect(self._flush_previews)
+
+        # --- Library tab ---
+        tab_library = QWidget()
+        l_library = QVBoxLayout(tab_library)
+        h_search = QHBoxLayout()
+        self.library_search = QLineEdit()
+        self.library_search.setPlaceholderText("Search name, tag or source…")
+        self.library_kind = QComboBox()
+        self.library_kind.addItems(["all", "amp", "phase"])
+        h_search.addWidget(self.library_search, 1)
+        h_search.addWidget(self.library_kind)
+        l_library.addLayout(h_search)
+
+        self.library_list = QListWidget()
+        self.library_list.setIconSize(QSize(LIBRARY_THUMB_WIDTH, LIBRARY_THUMB_HEIGHT))
+        self.library_list.setUniformItemSizes(True)
+        l_library.addWidget(self.library_list, 1)
+
+        h_library = QHBoxLayout()
+        self.btn_library_import = QPushButton("Import File…")
+        self.btn_library_add_amp = QPushButton("Store Current Amplitude")
+        self.btn_library_add_phase = QPushButton("Store Current Phase")
+        self.btn_library_load = QPushButton("Load Selected")
+        self.btn_library_delete = QPushButton("Delete")
+        for btn in (self.btn_library_import, self.btn_library_add_amp, self.btn_library_add_phase,
+                    self.btn_library_load, self.btn_library_delete):
+            h_library.addWidget(btn, 1)
+        l_library.addLayout(h_library)
+        if self.library is None:
+            tab_library.setEnabled(False)
+
+        # Tabs
+        self.tabs = QTabWidget()
+        for name, tab in [
+            ("1. Connection", tab_conn),
+            ("2. Pulse Parameters", tab_amp),
+            ("3. Amplitude Waveform", tab_ampWave),
+            ("4. Phase Waveform" , tab_phase),
+            ("5. Diagnostics / Reset", tab_reset),
+            ("6. Waveform Library", tab_library)
+        ]:
+            self.tabs.addTab(tab, name)
+
+        # Main layout
+        main = QVBoxLayout(self)
+        main.addWidget(self.tabs)
+        h_log = QHBoxLayout()
+        h_log.addWidget(QLabel("### System Log:"))
+        h_log.addStretch(1)
+        self.queue_label = QLabel("Queue: idle")
+        self.btn_cancel_queue = QPushButton("Cancel queued")
+        self.btn_cancel_queue.setEnabled(False)
+        h_log.addWidget(self.queue_label)
+        h_log.addWidget(self.btn_cancel_queue)
+        main.addLayout(h_log)
+        main.addWidget(self.log_display, 2)
+        self.tabs.setMinimumHeight(400)
+
+    def _connect_signals(self):
+        # Buttons
+        self.btn_connect.clicked.connect(self.on_connect_clicked)
+        self.btn_disconnect.clicked.connect(self.on_disconnect_clicked)
+        self.btn_set_amp.clicked.connect(self.on_set_amp_clicked)
+        self.btn_set_interval.clicked.connect(self.on_set_interval_clicked)
+        self.btn_restore.clicked.connect(self.on_restore_clicked)
+
+        # Metrics panel
+        self.chk_metrics.toggled.connect(self.on_metrics_toggled)
+        self.btn_metrics_reset.clicked.connect(self.on_metrics_reset_clicked)
+        self.btn_metrics_json.clicked.connect(lambda: self.on_metrics_export_clicked("json"))
+        self.btn_metrics_prom.clicked.connect(lambda: self.on_metrics_export_clicked("prom"))
+        self.tabs.currentChanged.connect(lambda _: self._update_metrics_timer())
+
+        # Library
+        self.library_search.textChanged.connect(lambda _: self._refresh_library())
+        self.library_kind.currentIndexChanged.connect(lambda _: self._refresh_library())
+        self.library_list.verticalScrollBar().valueChanged.connect(lambda _: self._render_visible_thumbnails())
+        self.library_list.itemDoubleClicked.connect(lambda _: self.on_library_load_clicked())
+        self.btn_library_import.clicked.connect(self.on_library_import_clicked)
+        self.btn_library_add_amp.clicked.connect(lambda: self.on_library_store_clicked("amp"))
+        self.btn_library_add_phase.clicked.connect(lambda: self.on_library_store_clicked("phase"))
+        self.btn_library_load.clicked.connect(self.on_library_load_clicked)
+        self.btn_library_delete.clicked.connect(self.on_library_delete_clicked)
+        self.tabs.currentChanged.connect(lambda _: self._render_visible_thumbnails())
+        self._refresh_library()
+        #self.btn_set_phase.clicked.connect(self.on_set_phase_clicked)
+        
+        # Waveform Load/Send
+        self.btn_load_wave.clicked.connect(self.on_load_wave_clicked)
+        self.btn_load_wavephase.clicked.connect(self.on_load_wave_phase_clicked)
+        self.btn_send_wave.clicked.connect(self.on_send_wave_clicked)
+        self.btn_send_wavephase.clicked.connect(self.on_send_wavephase_clicked)
+        
+        # Forced Manual Update
+        self.btn_force_update_amp.clicked.connect(lambda: self.update_wave_preview(self.wave_slider.value() * SHIFT_STEP_US))
+        self.btn_force_update_phase.clicked.connect(lambda: self.update_wave_preview_phase(self.wave_slider_phase.value() * SHIFT_STEP_US))
+
+        # Offset e durata cambiano asse dei tempi e cut della preview
+        self.offset.textChanged.connect(lambda _: self._preview_geom.clear())
+        self.duration.textChanged.connect(lambda _: self._preview_geom.clear())
+        
+        # Sliders (Automatic Update)
+        self.wave_slider.valueChanged.connect(self.on_wave_slider_changed)
+        self.wave_slider_phase.valueChanged.connect(self.on_wave_slider_changed_phase)
+
+        # Live mode: solo modifiche dell'operatore (campi confermati, slider rilasciati);
+        # i setText/setValue del programma hanno i segnali bloccati
+        self.max_amp.editingFinished.connect(lambda: self._live_edited(self.max_amp, "max_amp"))
+        self.offset.editingFinished.connect(lambda: self._live_edited(self.offset, "interval"))
+        self.duration.editingFinished.connect(lambda: self._live_edited(self.duration, "interval"))
+        for slider, group in ((self.wave_slider, "amp_shift"), (self.wave_slider_phase, "phase_shift")):
+            slider.sliderReleased.connect(lambda group=group: self._schedule_live(group))
+            # tastiera, rotella, click sulla barra; durante il trascinamento decide sliderReleased
+            slider.valueChanged.connect(
+                lambda _, slider=slider, group=group: None if slider.isSliderDown() else self._schedule_live(group))
+        self.live_timer.timeout.connect(self._flush_live)
+        self.chk_live.toggled.connect(lambda on: self.log("Live mode " + ("on" if on else "off")))
+
+        # Command queue
+        self.executor.pending_changed.connect(self._on_queue_changed)
+        self.btn_cancel_queue.clicked.connect(self.on_cancel_queue_clicked)
+
+        # Logging
+        self.log_signal.connect(self._append_log)
+
+    # ====================================================================
+    # HELPER METHODS (Logging, Workers, Validation)
+    # ====================================================================
+
+    def _append_log(self, text: str):
+        """Append text to the QPlainTextEdit (main thread)."""
+        self.log_display.appendPlainText(text)
+        sb = self.log_display.verticalScrollBar()
+        sb.setValue(sb.maximum())
+
+    def log(self, text: str):
+        """Thread-safe call to append log."""
+        self.log_signal.emit(text)
+
+    def _submit(self, name, func, *args, priority=PRIORITY_CONTROL, on_finished=None, on_error=None,
+                coalesce_key=None):
+        """
+        Accoda ``func(conn, *args)`` sull'executor; le callback girano nel thread della GUI.
+        Un comando con la stessa ``coalesce_key`` ancora in coda viene sostituito.
+        """
+        cmd = self.executor.submit(name, func, *args, priority=priority,
+                                   on_finished=on_finished, on_error=on_error,
+                                   coalesce_key=coalesce_key)
+        self.log(f">>> {name} queued ({self.executor.pending()} pending)")
+        return cmd
+
+    def on_cancel_queue_clicked(self):
+        cancelled = self.executor.cancel_all()
+        self.log(f"Cancelled {cancelled} queued command(s)")
+
+    def closeEvent(self, event):
+        self.executor.stop()
+        super().closeEvent(event)
+    
+    def _schedule_live(self, group):
+        """Modo live: segna ``group`` come modificato e (ri)avvia il debounce."""
+        if not self.chk_live.isChecked() or not self.online:
+            return
+        self._live_dirty.add(group)
+        self.live_timer.start()
+
+    def _live_edited(self, field, group):
+        """editingFinished: solo se il testo e' stato modificato dall'operatore dall'ultima conferma."""
+        if field.isModified():
+            field.setModified(False)
+            self._schedule_live(group)
+
+    def _flush_live(self):
+        """Scrive i gruppi modificati; i valori non (ancora) numerici vengono ignorati."""
+        dirty, self._live_dirty = self._live_dirty, set()
+        if not self.online:
+            return
+        def is_number(*fields):
+            try:
+                [float(f.text()) for f in fields]
+                return True
+            except ValueError:
+                return False
+        if "max_amp" in dirty and is_number(self.max_amp):
+            self.on_set_amp_clicked()
+        if "interval" in dirty and is_number(self.offset, self.duration):
+            self.on_set_interval_clicked()
+        if "amp_shift" in dirty and self.loaded_wave is not None:
+            self.on_send_wave_clicked()
+        if "phase_shift" in dirty and self.loaded_wave_phase is not None:
+            self.on_send_wavephase_clicked()
+
+    def _validate_float_input(self, line_edit, error_msg):
+        """Tenta di convertire il testo in float e gestisce l'errore."""
+        try:
+            return float(line_edit.text())
+        except ValueError:
+            QMessageBox.warning(self, "Invalid input", error_msg)
+            return None
+
+    # ====================================================================
+    # ACTION METHODS (LLRF Interaction)
+    # ====================================================================
+
+    def on_connect_clicked(self):
+        ip, user, pwd = self.ip.text(), self.user.text(), self.pwd.text()
+
+        def make_connection():
+            conn = LLRFConnection(ip, user, pwd)
+            conn.metrics = self.metrics
+            return conn
+
+        def on_connected(conn):
+            self.conn = conn
+            self.online = True
+            self._connecting = False
+            self.log(f"Connected to {ip} as {user}")
+            self._update_ui_state()
+
+        def on_connect_error(e):
+            self.online = False
+            self._connecting = False
+            self._update_ui_state()
+            QMessageBox.warning(self, "Connection error", f"Could not connect:\n{e}")
+
+        self._connecting = True
+        self._update_ui_state()
+        self.log(">>> connect queued")
+        self.executor.connect_with(make_connection, on_finished=on_connected, on_error=on_connect_error)
+
+    def on_disconnect_clicked(self):
+        # i comandi ancora in coda vengono annullati, la chiusura avviene nel thread dell'executor
+        self.executor.disconnect(on_finished=lambda _: self.log("Disconnected"),
+                                 on_error=lambda e: self.log(f"Disconnect error: {e}"))
+        self.conn = None
+        self.online = False
+        self._update_ui_state()
+
+    def update_timing_fields(self, new_offset, new_duration):
+        # aggiornamento dal file caricato: nessuna scrittura in modo live
+        for field, value in ((self.offset, new_offset), (self.duration, new_duration)):
+            field.blockSignals(True)
+            field.setText(str(value))
+            field.blockSignals(False)
+        self._preview_geom.clear()
+        self.log_signal.emit(f"Aggiornati campi: Offset={new_offset}, Duration={new_duration}")
+
+    def on_set_amp_clicked(self):
+        max_amp = self._validate_float_input(self.max_amp, "Max amplitude must be a number.")
+        if max_amp is None or not self.conn:
+            return
+
+        self._submit("set_max_amp", lambda conn: conn.FF_Change_MaxAmp(max_amp),
+                             on_finished=lambda _: self.log("Max Amp set"),
+                             on_error=lambda e: self.log(f"Error setting max amp: {e}"),
+                             coalesce_key="max_amp")
+
+    def on_set_interval_clicked(self):
+        offset = self._validate_float_input(self.offset, "Offset must be a number.")
+        duration = self._validate_float_input(self.duration, "Duration must be a number.")
+        
+        wave = self.loaded_wave
+        phase = self.loaded_wave_phase
+        
+        # Logica di correzione del tempo per 2D waveforms: il primo campione va all'offset.
+        # starting_at crea un nuovo Waveform (i valori sono condivisi), niente modifiche in place.
+        if offset is not None:
+            if wave is not None and wave.ndim == 2:
+                self.loaded_wave = wave.starting_at(offset)
+                self._preview_geom.pop("amp", None)
+            if phase is not None and phase.ndim == 2:
+                self.loaded_wave_phase = phase.starting_at(offset)
+                self._preview_geom.pop("phase", None)
+
+        def update_ui_after_interval_set(_):
+            self.log("FF Interval set")
+            # Queste chiamate devono essere nel main thread!
+            self.update_wave_preview(self.wave_slider.value() * SHIFT_STEP_US)
+            self.update_wave_preview_phase(self.wave_slider_phase.value() * SHIFT_STEP_US)
+            self.log("Waveform previews updated")
+
+
+        if offset is None or duration is None or not self.conn:
+            return
+        
+        self._submit("set_interval", lambda conn: conn.FF_Change_Interval(offset, duration),
+                        on_finished=update_ui_after_interval_set,
+                        on_error=lambda e: self.log(f"Error setting interval: {e}"),
+                        coalesce_key="interval")
+
+  #  def on_set_phase_clicked(self):
+  #      phase = self._validate_float_input(self.phase, "Phase must be a number.")
+  #      if phase is None or not self.conn:
+  #          return
+
+  #      self._submit("set_phase", lambda conn: conn.FF_Change_Phase(phase, True),
+  #                           on_finished=lambda _: self.log("Constant Phase set"),
+  #                           on_error=lambda e: self.log(f"Error setting phase: {e}"))
+
+    def on_restore_clicked(self):
+        if not self.conn:
+            QMessageBox.warning(self, "Not connected", "Please connect first.")
+            return
+        self._submit("restore", lambda conn: conn.Restore(),
+                             on_finished=lambda _: self.log("Defaults restored"),
+                             on_error=lambda e: self.log(f"Error restoring defaults: {e}"))
+
+    # ====================================================================
+    # METRICS PANEL
+    # ====================================================================
+
+    def on_metrics_toggled(self, enabled):
+        self.metrics.enabled = enabled
+        self.log(f"Instrumentation {'enabled' if enabled else 'disabled'}")
+        self._update_metrics_timer()
+        self._refresh_metrics()
+
+    def _update_metrics_timer(self):
+        visible = self.tabs.currentWidget() is self._tab_diagnostics
+        if visible and self.metrics.enabled:
+            self.metrics_timer.start()
+        else:
+            self.metrics_timer.stop()
+
+    def _refresh_metrics(self):
+        self.metrics_display.setPlainText(self.metrics.format_text())
+
+    def on_metrics_reset_clicked(self):
+        self.metrics.reset()
+        self._refresh_metrics()
+
+    def on_metrics_export_clicked(self, kind):
+        if kind == "json":
+            fname, _ = QFileDialog.getSaveFileName(self, "Export metrics", "llrf_metrics.json", "JSON (*.json)")
+        else:
+            fname, _ = QFileDialog.getSaveFileName(self, "Export metrics", "llrf_metrics.prom", "Prometheus (*.prom *.txt)")
+        if not fname:
+            return
+        try:
+            if kind == "json":
+                with open(fname, "w") as f:
+                    f.write(self.metrics.to_json())
+            else:
+                self.metrics.write_prometheus(fname)
+            self.log(f"Metrics exported to {fname}")
+        except OSError as e:
+            QMessageBox.warning(self, "Export error", f"Could not write {fname}:\n{e}")
+
+    # ====================================================================
+    # WAVEFORM LIBRARY
+    # ====================================================================
+
+    def _refresh_library(self):
+        if self.library is None:
+            return
+        kind = self.library_kind.currentText()
+        entries = self.library.search(self.library_search.text(), kind=None if kind == "all" else kind)
+        self.library_list.clear()
+        for entry in entries:
+            tags = f"  [{', '.join(entry['tags'])}]" if entry["tags"] else ""
+            item = QListWidgetItem(f"{entry['name']}  ({entry['kind']}, {entry['samples']} pts, "
+                                   f"{entry['duration_us']:.2f} µs, peak {entry['peak']:.3g}){tags}")
+            item.setData(Qt.UserRole, entry["hash"])
+            item.setSizeHint(QSize(LIBRARY_THUMB_WIDTH, LIBRARY_THUMB_HEIGHT + 6))
+            self.library_list.addItem(item)
+        self._render_visible_thumbnails()
+
+    def _render_visible_thumbnails(self):
+        """Disegna le anteprime solo per le righe visibili che non ne hanno ancora una."""
+        if self.library is None or not self.library_list.isVisible():
+            return
+        viewport = self.library_list.viewport().rect()
+        for row in range(self.library_list.count()):
+            item = self.library_list.item(row)
+            if item.data(Qt.UserRole + 1) or not self.library_list.visualItemRect(item).intersects(viewport):
+                continue
+            item.setIcon(QIcon(self._thumbnail_pixmap(item.data(Qt.UserRole))))
+            item.setData(Qt.UserRole + 1, True)
+
+    def _thumbnail_pixmap(self, key):
+        lo, hi = self.library.thumbnail(key, LIBRARY_THUMB_WIDTH)
+        pixmap = QPixmap(LIBRARY_THUMB_WIDTH, LIBRARY_THUMB_HEIGHT)
+        pixmap.fill(QColor("#222222"))
+        span = float(np.max(hi) - np.min(lo)) or 1.0
+        scale = (LIBRARY_THUMB_HEIGHT - 4) / span
+        base = float(np.min(lo))
+        xs = np.linspace(0, LIBRARY_THUMB_WIDTH - 1, len(lo))
+        top = LIBRARY_THUMB_HEIGHT - 2 - (hi - base) * scale
+        bottom = LIBRARY_THUMB_HEIGHT - 2 - (lo - base) * scale
+        # Inviluppo min/max: i picchi restano visibili anche con 10^6 campioni
+        polygon = QPolygonF([QPointF(x, y) for x, y in zip(xs, top)] +
+                            [QPointF(x, y) for x, y in zip(xs[::-1], bottom[::-1])])
+        painter = QPainter(pixmap)
+        painter.setPen(QPen(QColor("yellow")))
+        painter.setBrush(QColor("yellow"))
+        painter.drawPolygon(polygon)
+        painter.end()
+        return pixmap
+
+    def _selected_library_key(self):
+        item = self.library_list.currentItem()
+        return item.data(Qt.UserRole) if item else None
+
+    def on_library_import_clicked(self):
+        fname, _ = QFileDialog.getOpenFileName(self, "Import waveform", "", WAVEFORM_FILE_FILTER)
+        if not fname:
+            return
+        kind, ok = QInputDialog.getItem(self, "Import waveform", "Type:", ["amp", "phase"], 0, False)
+        if not ok:
+            return
+        tags, ok = QInputDialog.getText(self, "Import waveform", "Tags (comma separated):")
+        if not ok:
+            return
+
+        def store(wave):
+            name = os.path.splitext(os.path.basename(fname))[0]
+            self.library.add(wave, name, kind=kind, tags=tags.split(","), source=os.path.abspath(fname))
+            self.log(f"Imported {os.path.basename(fname)} into the waveform library")
+            self._refresh_library()
+
+        self._load_waveform_data(fname, store)
+
+    def on_library_store_clicked(self, kind):
+        wave = self.loaded_wave if kind == "amp" else self.loaded_wave_phase
+        if wave is None:
+            QMessageBox.warning(self, "Error", f"No {kind} waveform loaded!")
+            return
+        self._materialize_wave(kind)
+        wave = self.loaded_wave if kind == "amp" else self.loaded_wave_phase
+        name, ok = QInputDialog.getText(self, "Store waveform", "Name:")
+        if not ok or not name.strip():
+            return
+        tags, ok = QInputDialog.getText(self, "Store waveform", "Tags (comma separated):")
+        if not ok:
+            return
+        self.library.add(wave, name.strip(), kind=kind, tags=tags.split(","), source="LLRF_GUI")
+        self.log(f"Stored {kind} waveform '{name.strip()}' in the library")
+        self._refresh_library()
+
+    def on_library_load_clicked(self):
+        key = self._selected_library_key()
+        if key is None:
+            return
+        entry = self.library.entries[key]
+        wave = self.library.load(key)
+        if wave.has_time:
+            self.update_timing_fields(wave.t_start, wave.t_end - wave.t_start)
+        if entry["kind"] == "amp":
+            self._apply_amp_wave(wave, f"library:{entry['name']}")
+        else:
+            self._apply_phase_wave(wave, f"library:{entry['name']}")
+
+    def on_library_delete_clicked(self):
+        key = self._selected_library_key()
+        if key is None:
+            return
+        name = self.library.entries[key]["name"]
+        if QMessageBox.question(self, "Delete waveform", f"Delete '{name}' from the library?") != QMessageBox.Yes:
+            return
+        self.library.remove(key)
+        self.log(f"Deleted '{name}' from the library")
+        self._refresh_library()
+
+    # ====================================================================
+    # WAVEFORM LOGIC
+    # ====================================================================
+
+    def _load_waveform_data(self, fname, on_loaded):
+        """
+        Carica il file in background (WaveformLoadWorker) e chiama ``on_loaded(wave)``
+        nel thread della GUI. Se il file e' 2D aggiorna i campi offset/durata.
+        """
+        worker = WaveformLoadWorker(fname)
+        dialog = QProgressDialog(f"Loading {os.path.basename(fname)}…", "Cancel", 0, 100, self)
+        dialog.setWindowModality(Qt.WindowModal)
+        dialog.setMinimumDuration(300)   # nessun dialogo per i file piccoli
+        dialog.setAutoClose(False)
+        dialog.setAutoReset(False)
+        worker.progress.connect(dialog.setValue)
+        dialog.canceled.connect(worker.cancel)
+
+        def done():
+            dialog.close()
+            if worker in self._load_workers:
+                self._load_workers.remove(worker)
+
+        def loaded(wave):
+            done()
+            # Aggiorna UI se è un file 2D (Valore, Tempo)
+            if wave.ndim == 2:
+                self.update_timing_fields(wave.t_start, wave.t_end - wave.t_start)
+            on_loaded(wave)
+
+        def failed(e):
+            done()
+            QMessageBox.critical(self, "Error", f"Could not load file:\n{e}")
+            self.log(f"ERROR loading waveform: {e}")
+
+        def cancelled():
+            done()
+            self.log(f"Loading of {os.path.basename(fname)} cancelled")
+
+        worker.loaded.connect(loaded)
+        worker.error.connect(failed)
+        worker.cancelled.connect(cancelled)
+        self._load_workers.append(worker)
+        worker.start()
+        return worker
+
+    def on_load_wave_clicked(self):
+        fname, _ = QFileDialog.getOpenFileName(self, "Load waveform", "", WAVEFORM_FILE_FILTER)
+        if not fname:
+            return
+        self._load_waveform_data(fname, lambda wave: self._apply_amp_wave(wave, os.path.basename(fname)))
+
+    def _apply_amp_wave(self, wave, label):
+        # Waveform immutabili: original e loaded condividono il buffer normalizzato
+        self.original_wave = wave.normalized()
+        self.loaded_wave = self.original_wave
+            
+        self._invalidate_preview("amp")
+        self.log(f"Loaded waveform Amplitude ({wave.ndim}D): {label}")
+        self._reset_slider(self.wave_slider, self.wave_value_label, "Amp")
+        self.update_wave_preview(shift_us=0.0)
+
+    def on_load_wave_phase_clicked(self):
+        fname, _ = QFileDialog.getOpenFileName(self, "Load waveform", "", WAVEFORM_FILE_FILTER)
+        if not fname:
+            return
+        self._load_waveform_data(fname, lambda wave: self._apply_phase_wave(wave, os.path.basename(fname)))
+
+    def _apply_phase_wave(self, wave, label):
+        self.original_wave_phase = wave
+        self.loaded_wave_phase = wave
+        
+        self._invalidate_preview("phase")
+        self.log(f"Loaded waveform Phase ({wave.ndim}D): {label}")
+        self._reset_slider(self.wave_slider_phase, self.wave_value_label_phase, "Phase")
+        self.update_wave_preview_phase(shift_us_phase=0.0)
+
+    def _reset_slider(self, slider, label, name):
+        """Shift a zero per una nuova forma d'onda, senza segnali (niente upload in modo live)."""
+        slider.blockSignals(True)
+        slider.setValue(0)
+        slider.blockSignals(False)
+        label.setText(f"Shift {name} = {0:.2f} µs")
+
+    def on_wave_slider_changed(self, value: int):
+        if self._slider_active == "phase":
+            return
+        self._slider_active = "amp"
+        try:
+            self.wave_value_label.setText(f"Shift Amp = {value * SHIFT_STEP_US:.2f} µs")
+            self._schedule_preview("amp", value * SHIFT_STEP_US)
+        finally:
+            self._slider_active = None
+
+    def on_wave_slider_changed_phase(self, value: int):
+        if self._slider_active == "amp":
+            return
+        self._slider_active = "phase"
+        try:
+            self.wave_value_label_phase.setText(f"Shift Phase = {value * SHIFT_STEP_US:.2f} µs")
+            self._schedule_preview("phase", value * SHIFT_STEP_US)
+        finally:
+            self._slider_active = None
+
+    def _get_waveform_params(self, original_wave):
+        """Estrae i parametri per il calcolo e il plot, gestendo 1D e 2D."""
+        N = len(original_wave)
+        dimension = original_wave.ndim
+        signal = original_wave.values
+
+        try:
+            init_offset = float(self.offset.text())
+            pulse_duration = float(self.duration.text())
+        except ValueError:
+            init_offset = 0.0
+            pulse_duration = MAX_PULSE_TIME_US
+            
+        Time_us_orig = original_wave.timebase()
+        if dimension == 2:
+            pulse_length_for_roll = Time_us_orig[-1] - Time_us_orig[0]
+        else:
+            pulse_length_for_roll = MAX_PULSE_TIME_US
+
+        # Calcola l'indice di cut-off basato sulla durata UI
+        index_null = int(N * ( pulse_duration) / MAX_PULSE_TIME_US)
+        
+        return N, dimension, signal, Time_us_orig, pulse_length_for_roll, index_null
+
+    @staticmethod
+    def _make_preview_curve(plot_widget):
+        """Crea una volta la curva della preview: poi solo setData."""
+        curve = plot_widget.plot(pen='y')
+        curve.setClipToView(True)
+        curve.setDownsampling(auto=True, method='peak')
+        return curve
+
+    def _schedule_preview(self, kind, shift_us):
+        self._pending_shift[kind] = shift_us
+        if not self.preview_timer.isActive():
+            self.preview_timer.start()
+
+    def _flush_previews(self):
+        pending, self._pending_shift = self._pending_shift, {}
+        if "amp" in pending:
+            self.update_wave_preview(shift_us=pending["amp"])
+        if "phase" in pending:
+            self.update_wave_preview_phase(shift_us_phase=pending["phase"])
+
+    def _invalidate_preview(self, kind):
+        """Da chiamare quando cambia la sorgente: il ShiftBank viene ricostruito al prossimo uso."""
+        self._shift_banks.pop(kind, None)
+        self._preview_geom.pop(kind, None)
+        self._preview_shift[kind] = 0.0
+
+    def _preview_state(self, kind):
+        """(bank, geometria) per 'amp'/'phase', ricalcolati solo se invalidati."""
+        original = self.original_wave if kind == "amp" else self.original_wave_phase
+        geom = self._preview_geom.get(kind)
+        if geom is None:
+            N, dimension, signal, Time_us_orig, pulse_length_for_roll, index_null = \
+                self._get_waveform_params(original)
+            if dimension == 2:
+                # Usa il tempo da loaded_wave che è quello attuale (on_set_interval_clicked lo trasla)
+                loaded = self.loaded_wave if kind == "amp" else self.loaded_wave_phase
+                x = loaded.time
+            else:
+                try:
+                    x = Time_us_orig + float(self.offset.text())
+                except ValueError:
+                    x = Time_us_orig
+            cut = index_null if (index_null < N) and (dimension == 1) else None
+            geom = self._preview_geom[kind] = {"x": x, "cut": cut, "dimension": dimension,
+                                               "samples_per_us": N / pulse_length_for_roll}
+        bank = self._shift_banks.get(kind)
+        if bank is None:
+            signal = original.values
+            # Riempimento dei vuoti: Amplitude -> 1, Phase -> 0
+            bank = self._shift_banks[kind] = ShiftBank(
+                signal, geom["samples_per_us"], MAX_PULSE_TIME_US,
+                fill=1.0 if kind == "amp" else 0.0, fractional=SHIFT_FRACTIONAL)
+        return bank, geom
+
+    def _update_preview(self, kind, shift_us):
+        bank, geom = self._preview_state(kind)
+        self._preview_shift[kind] = shift_us
+        signal = bank.shifted(shift_us)
+        x, cut = geom["x"], geom["cut"]
+        curve, tail = ((self.wave_curve, self.wave_curve_tail) if kind == "amp"
+                       else (self.wave_curve_phase, self.wave_curve_phase_tail))
+        if cut is None:
+            curve.setData(x, signal)
+            tail.setData([], [])
+        else:
+            # Oltre la durata la forma d'onda e' nulla: basta un tratto a 0
+            curve.setData(x[:cut], signal[:cut])
+            start = max(cut - 1, 0)
+            tail.setData([x[start], x[cut], x[-1]], [signal[start], 0.0, 0.0])
+
+    def _materialize_wave(self, kind):
+        """Scrive in loaded_wave* la forma d'onda shiftata corrente (prima dell'invio)."""
+        if (self.original_wave if kind == "amp" else self.original_wave_phase) is None:
+            return
+        bank, geom = self._preview_state(kind)
+        signal = bank.shifted(self._preview_shift.get(kind, 0.0))
+        if geom["cut"] is not None:
+            signal = np.array(signal)
+            signal[geom["cut"]:] = 0
+        loaded = self.loaded_wave if kind == "amp" else self.loaded_wave_phase
+        # Nuovo Waveform: quello eventualmente in uso da un worker resta intatto
+        wave = loaded.with_values(signal)
+        if kind == "amp":
+            self.loaded_wave = wave
+        else:
+            self.loaded_wave_phase = wave
+
+    def update_wave_preview(self, shift_us: float = 0.0):
+        if self.original_wave is None: return
+        self._update_preview("amp", shift_us)
+
+    def update_wave_preview_phase(self, shift_us_phase: float = 0.0):
+        if self.original_wave_phase is None: return
+        self._update_preview("phase", shift_us_phase)
+            
+    # --- Sending waveform methods ---
+
+    def on_send_wave_clicked(self):
+        if self.loaded_wave is None:
+            QMessageBox.warning(self, "Error", "No amplitude waveform loaded!")
+            return
+        if not self.conn:
+            QMessageBox.warning(self, "Not connected", "Please connect first.")
+            return
+
+        self._materialize_wave("amp")
+        # parametri letti qui (thread della GUI); il Waveform e' immutabile
+        max_amp = self._validate_float_input(self.max_amp, "Max amp must be number.") or 1.0
+        init_t = self._validate_float_input(self.offset, "Offset must be number.") or 0.0
+        self._submit("send_amp", self.send_wave_task, self.loaded_wave, max_amp, init_t,
+                     priority=PRIORITY_UPLOAD, coalesce_key="table_amp",
+                             on_finished=lambda r: self.log(str(r)),
+                             on_error=lambda e: self.log(f"Error uploading amplitude waveform: {e}"))
+
+    def on_send_wavephase_clicked(self):
+        if self.loaded_wave_phase is None:
+            QMessageBox.warning(self, "Error", "No phase waveform loaded!")
+            return
+        if not self.conn:
+            QMessageBox.warning(self, "Not connected", "Please connect first.")
+            return
+
+        self._materialize_wave("phase")
+        phase_field = getattr(self, "phase", None)   # campo della fase costante (se presente)
+        cent_phase = (self._validate_float_input(phase_field, "Phase must be number.") or 0.0) if phase_field else 0.0
+        init_t = self._validate_float_input(self.offset, "Offset must be number.") or 0.0
+        self._submit("send_phase", self.send_wave_phase_task, self.loaded_wave_phase, cent_phase, init_t,
+                     priority=PRIORITY_UPLOAD, coalesce_key="table_phase",
+                             on_finished=lambda r: self.log(str(r)),
+                             on_error=lambda e: self.log(f"Error uploading phase waveform: {e}"))
+
+
+    def send_wave_task(self, conn, wave, max_amp, init_t):
+        ndim = wave.ndim
+
+        if ndim == 1:
+            if hasattr(conn, "Set_Arbitrary_Shape"):
+                conn.Set_Arbitrary_Shape(wave, max_amp, init_t=init_t)
+            else:
+                raise RuntimeError("LLRFConnection has no Set_Arbitrary_Shape method")
+            return "Waveform amplitude uploaded (1D)" + self._upload_summary(conn)
+        else:
+            amplitude = wave.values
+            t_start = wave.t_start
+            t_end = wave.t_end
+            
+            if hasattr(conn, "Set_Arbitrary_Shape_AndTime"):
+                conn.Set_Arbitrary_Shape_AndTime(amplitude, max_amp, t_start, t_end)
+            else:
+                conn.Set_Arbitrary_Shape(t_end - t_start, amplitude, max_amp, init_t=t_start)
+            return "Waveform amplitude uploaded (2D)" + self._upload_summary(conn)
+            
+    def send_wave_phase_task(self, conn, wave_phase, cent_phase, init_t):
+        ndim_phase = wave_phase.ndim
+        
+        if ndim_phase == 1:
+            if hasattr(conn, "Set_Arbitrary_Phase"):
+                conn.Set_Arbitrary_Phase(wave_phase, cent_phase, init_t=init_t)
+            else:
+                raise RuntimeError("LLRFConnection has no Set_Arbitrary_Phase method")
+            return "Waveform phase uploaded (1D)" + self._upload_summary(conn)
+        else:
+            amplitude = wave_phase.values
+            t_start = wave_phase.t_start
+            t_end = wave_phase.t_end
+            
+            if hasattr(conn, "Set_Arbitrary_Phase_AndTime"):
+                conn.Set_Arbitrary_Phase_AndTime(amplitude, cent_phase, t_start, t_end)
+            else:
+                conn.Set_Arbitrary_Phase(t_end - t_start, amplitude, cent_phase, init_t=t_start)
+            return "Waveform phase uploaded (2D)" + self._upload_summary(conn)
+
+    def _upload_summary(self, conn):
+        """Descrive l'ultimo upload di tabella (saltato / intervalli cambiati)."""
+        report = getattr(conn, "last_upload", None)
+        if not report:
+            return ""
+        if report["skipped"]:
+            return f" - table unchanged, upload skipped ({report['bytes_skipped']} bytes)"
+        if report.get("error"):
+            return f" - UPLOAD FAILED: {report['error']}"
+        ranges = report["changed_ranges"]
+        changed = "" if ranges is None else f", {sum(b - a for a, b in ranges)} samples changed"
+        verify = report.get("verify")
+        if verify is not None:
+            changed += (", verified" if verify["ok"]
+                        else f", VERIFY FAILED ({verify['mismatches']} values differ)")
+        return f" - {report['bytes_sent']} bytes sent{changed}"
+
+    # --- Utility: secret pixmap ---
+
+    def show_secret_pixmap(self):
+        if getattr(sys, 'frozen', False):
+            script_dir = os.path.dirname(sys.executable)
+        else:
+            script_dir = os.path.dirname(os.path.abspath(sys.argv[0]))
+
+        script_dir = 'C:\\Users\\Stefano Farina\\Desktop'
+        original = os.path.join(script_dir, "test.png")
+        converted = os.path.join(script_dir, "Segreto_temp.png")
+
+        try:
+            img = Image.open(original)
+            img.save(converted, "PNG")
+        except Exception as e:
+            QMessageBox.warning(self, "Errore", f"Impossibile aprire/convetire immagine:\n{e}")
+            self.log(f"PIL error: {e}")
+            return
+
+        pixmap = QPixmap(converted)
+        if pixmap.isNull():
+            QMessageBox.warning(self, "Errore", f"Qt non riesce a caricare l'immagine convertita")
+            self.log("QPixmap NULL")
+            return
+
+        dlg = QDialog(self)
+        dlg.setWindowTitle(" Segreto ")
+        lbl = QLabel()
+        lbl.setPixmap(pixmap)
+        lbl.setScaledContents(True)
+        layout = QVBoxLayout()
+        layout.addWidget(lbl)
+        dlg.setLayout(layout)
+        dlg.resize(600, 400)
+        dlg.exec_()
+
+
+if __name__ == "__main__":
+    app = QApplication.instance() or QApplication(sys.argv)
+    gui = LLRF_GUI()
+    gui.show()
+    sys.exit(app.exec_())
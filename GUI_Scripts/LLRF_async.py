@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Controparte asyncio di LLRFConnection.
+
+AsyncLLRFConnection espone gli stessi metodi FF_* / Set_Arbitrary_* /
+Single_ramp / Set_Shape come coroutine. Ogni chiamata gira su un thread pool
+e condivide un solo trasporto SSH: i comandi sul canale interattivo (letture
+e scritture scalari) sono serializzati da LLRFConnection, mentre gli upload
+delle tabelle usano exec channel separati sullo stesso trasporto e quindi
+procedono in parallelo. Esempio:
+
+    async with AsyncLLRFConnection('192.168.0.109', 'root', 'Jungle') as llrf:
+        amp, interval, _ = await asyncio.gather(
+            llrf.FF_Get_MaxAmp(),
+            llrf.FF_Get_Interval(),
+            llrf.Set_Arbitrary_Phase(phase, 0.0, 0.0),
+        )
+
+``call_timeout=`` (secondi, default ``timeout`` del costruttore) limita
+l'attesa di una chiamata; ``timeout=`` resta l'argomento del metodo, es.
+``await llrf.Send(cmd, timeout=2, call_timeout=10)``.
+
+Timeout e cancellazione agiscono sull'attesa: un comando gia' inviato al
+dispositivo viene comunque completato dal suo thread, ma il chiamante
+riprende subito il controllo.
+
+Per usarla dal loop Qt di LLRF_GUI: install_qt_event_loop(app) (richiede qasync).
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from LLRF import LLRFConnection
+
+DEFAULT_TIMEOUT = 30.0
+
+
+class AsyncLLRFConnection:
+    def __init__(self, ip_address, username, password=None,
+                 max_workers=4, timeout=DEFAULT_TIMEOUT, **kwargs):
+        self.conn = LLRFConnection(ip_address, username, password, **kwargs)
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="llrf")
+
+    async def call(self, func, *args, call_timeout=None, **kwargs):
+        """
+        Esegue ``func(*args, **kwargs)`` sul thread pool, attendendo al massimo
+        ``call_timeout`` secondi (default self.timeout); gli altri keyword,
+        ``timeout`` compreso, vanno a ``func``.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+        return await asyncio.wait_for(future, self.timeout if call_timeout is None else call_timeout)
+
+    async def connect(self, call_timeout=None, **kwargs):
+        return await self.call(self.conn.connect, call_timeout=call_timeout, **kwargs)
+
+    async def close(self):
+        try:
+            await self.call(self.conn.close)
+        finally:
+            self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+        return False
+
+
+def _async_method(name):
+    method = getattr(LLRFConnection, name)
+
+    async def wrapper(self, *args, call_timeout=None, **kwargs):
+        return await self.call(getattr(self.conn, name), *args, call_timeout=call_timeout, **kwargs)
+
+    wrapper.__name__ = name
+    wrapper.__qualname__ = f"AsyncLLRFConnection.{name}"
+    wrapper.__doc__ = (f"Coroutine version of LLRFConnection.{name} "
+                       f"(extra keyword: call_timeout).\n\n{method.__doc__ or ''}")
+    return wrapper
+
+
+for _name in ("Send", "run_command", "upload_table", "refresh",
+              "FF_Get_MaxAmp", "FF_Change_MaxAmp", "FF_Get_Interval",
+              "FF_Change_Interval", "FF_Change_Phase", "Restore",
+              "Set_Arbitrary_Shape", "Set_Arbitrary_Shape_AndTime",
+              "Set_Arbitrary_Phase", "Set_Arbitrary_Phase_AndTime",
+              "Single_ramp", "Set_Shape"):
+    setattr(AsyncLLRFConnection, _name, _async_method(_name))
+del _name
+
+
+def install_qt_event_loop(app):
+    """
+    Installa un event loop asyncio basato sul loop Qt di ``app`` (via qasync),
+    cosi' LLRF_GUI puo' fare ``asyncio.ensure_future(llrf.FF_Get_MaxAmp())``
+    dai suoi slot senza bloccare la finestra.
+    """
+    try:
+        import qasync
+    except ImportError as e:
+        raise ImportError("install_qt_event_loop requires qasync (pip install qasync)") from e
+    loop = qasync.QEventLoop(app)
+    asyncio.set_event_loop(loop)
+    return loop
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark end-to-end di LLRFConnection contro il server mock (LLRF_mockserver).
+
+Misura ogni operazione pubblica di LLRFConnection e i flussi completi della
+GUI (invio di una forma d'onda 1D/2D, iterazione di tuning) su un link con
+latenza, jitter e banda configurabili, senza hardware:
+
+    python LLRF_benchmark.py --latency 0.005 --bandwidth 1e6 --repeat 20
+    python LLRF_benchmark.py --json results.json
+
+Di default la cache dei registri e' disattivata, cosi' ogni operazione
+attraversa davvero il trasporto; --cache la riattiva per misurare i
+percorsi con shadow register e digest delle tabelle.
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+import numpy as np
+
+from LLRF import LLRFConnection
+from LLRF_mockserver import MockLiberaServer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _sample_waves():
+    """Forme d'onda di esempio del repository (con fallback sintetico)."""
+    try:
+        amp = np.loadtxt(os.path.join(HERE, "Lintext_amp.txt"))
+        phase = np.loadtxt(os.path.join(HERE, "Lintext_phase.txt"))
+        two_col = np.loadtxt(os.path.join(HERE, "dueCollonneTest.txt"))
+    except OSError:
+        amp = np.linspace(0, 1, 2000)
+        phase = np.linspace(-180, 180, 2000)
+        two_col = np.column_stack([amp, np.linspace(4, 20, 2000)])
+    return amp, phase, two_col
+
+
+def _time(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _summary(samples):
+    samples = sorted(samples)
+    return {
+        "n": len(samples),
+        "min_ms": samples[0] * 1e3,
+        "median_ms": statistics.median(samples) * 1e3,
+        "p90_ms": samples[min(len(samples) - 1, int(0.9 * len(samples)))] * 1e3,
+        "max_ms": samples[-1] * 1e3,
+    }
+
+
+def operations(conn):
+    """(nome, callable) di ogni operazione pubblica e dei flussi della GUI."""
+    amp, phase, two_col = _sample_waves()
+    rng = np.random.default_rng(0)
+
+    def send_wave_1d():
+        # LLRF_GUI.send_wave_task con forma d'onda 1D
+        conn.Set_Arbitrary_Shape(amp.copy(), 1000.0, init_t=0.0)
+
+    def send_wave_2d():
+        # LLRF_GUI.send_wave_task con forma d'onda 2D (valore, tempo)
+        conn.Set_Arbitrary_Shape_AndTime(two_col[:, 0].copy(), 1000.0,
+                                         float(two_col[0, 1]), float(two_col[-1, 1]))
+
+    def set_interval_and_preview():
+        # LLRF_GUI.on_set_interval_clicked
+        conn.FF_Change_Interval(1.0, 5.0)
+
+    def tuning_iteration():
+        # modifica locale della forma d'onda + upload, come in un ciclo di tuning
+        wave = amp.copy()
+        start = rng.integers(0, len(wave) - 50)
+        wave[start:start + 50] *= 0.98
+        conn.Set_Arbitrary_Shape(wave, 1000.0, init_t=0.0)
+
+    return [
+        ("FF_Get_MaxAmp", conn.FF_Get_MaxAmp),
+        ("FF_Change_MaxAmp", lambda: conn.FF_Change_MaxAmp(900, False)),
+        ("FF_Get_Interval", conn.FF_Get_Interval),
+        ("FF_Change_Interval", lambda: conn.FF_Change_Interval(1.0, 5.0, False)),
+        ("FF_Change_Phase", lambda: conn.FF_Change_Phase(10.0, False)),
+        ("refresh", conn.refresh),
+        ("Restore", conn.Restore),
+        ("Set_Arbitrary_Shape", lambda: conn.Set_Arbitrary_Shape(amp.copy(), 1000.0, 0.0)),
+        ("Set_Arbitrary_Shape_AndTime", send_wave_2d),
+        ("Set_Arbitrary_Phase", lambda: conn.Set_Arbitrary_Phase(phase.copy(), 0.0, 0.0)),
+        ("Set_Arbitrary_Phase_AndTime",
+         lambda: conn.Set_Arbitrary_Phase_AndTime(phase.copy(), 0.0, 4.0, 20.0)),
+        ("Single_ramp", lambda: conn.Single_ramp(1.0, 5.0, 100.0, 500.0, 1000.0)),
+        ("GUI: send amplitude (1D)", send_wave_1d),
+        ("GUI: send amplitude (2D)", send_wave_2d),
+        ("GUI: apply offset & duration", set_interval_and_preview),
+        ("GUI: tuning iteration", tuning_iteration),
+    ]
+
+
+def _without_table_digests(conn, func):
+    """Dimentica i digest delle tabelle prima di ogni chiamata: ogni upload va sul link."""
+    def wrapped():
+        conn.uploaded_tables.clear()
+        return func()
+    return wrapped
+
+
+def run(latency=0.0, jitter=0.0, bandwidth=None, repeat=10, cache=False, quiet=False):
+    """Avvia il mock, misura tutte le operazioni e restituisce un dict di statistiche."""
+    results = {}
+    with MockLiberaServer(latency=latency, jitter=jitter, bandwidth=bandwidth) as server:
+        conn = LLRFConnection(server.host, "root", server.password, port=server.port,
+                              cache_ttl=30.0 if cache else 0)
+        results["connect"] = _summary(_time(conn.connect, 1))
+        try:
+            for name, func in operations(conn):
+                if not cache:
+                    func = _without_table_digests(conn, func)
+                results[name] = _summary(_time(func, repeat))
+            results["_channel_metrics"] = dict(conn.channel_metrics)
+            results["_upload_stats"] = dict(conn.upload_stats)
+        finally:
+            conn.close()
+    if not quiet:
+        print_results(results, latency, jitter, bandwidth)
+    return results
+
+
+def print_results(results, latency=0.0, jitter=0.0, bandwidth=None):
+    print("=" * 72)
+    link = f"latency {latency * 1e3:.1f} ms ± {jitter * 1e3:.1f} ms, "
+    link += f"bandwidth {bandwidth / 1e3:.0f} kB/s" if bandwidth else "bandwidth unlimited"
+    print(f" LLRFConnection benchmark ({link})")
+    print("=" * 72)
+    print(f"  {'operation':<32}{'median':>10}{'p90':>10}{'min':>10}{'max':>10}  [ms]")
+    for name, stats in results.items():
+        if name.startswith("_"):
+            continue
+        print(f"  {name:<32}{stats['median_ms']:>10.2f}{stats['p90_ms']:>10.2f}"
+              f"{stats['min_ms']:>10.2f}{stats['max_ms']:>10.2f}")
+    for name, stats in results.items():
+        if name.startswith("_"):
+            print(f"  {name[1:]}: {stats}")
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--latency", type=float, default=0.0, help="per-command latency [s]")
+    parser.add_argument("--jitter", type=float, default=0.0, help="latency jitter [s]")
+    parser.add_argument("--bandwidth", type=float, default=None, help="link bandwidth [byte/s]")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--cache", action="store_true", help="enable register cache and table digests")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+    stats = run(args.latency, args.jitter, args.bandwidth, args.repeat, args.cache)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(stats, f, indent=2)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Pool di canali SSH per LLRFConnection.run_command.
+
+In SSH un exec channel esegue un solo comando, quindi il pool non puo'
+rieseguire lo stesso canale: tiene invece ``size`` sessioni gia' aperte sul
+trasporto esistente e le riapre in background dopo ogni uso, togliendo
+l'apertura del canale dal percorso critico di ogni upload.
+
+Metriche (dict condiviso con la connessione, sopravvive ai reconnect):
+    opens       canali aperti sul trasporto
+    reuses      comandi serviti da un canale gia' pronto nel pool
+    misses      comandi che hanno dovuto aprire un canale al momento
+    reconnects  riconnessioni automatiche riuscite
+"""
+import threading
+
+import paramiko
+
+
+def new_channel_metrics():
+    return {"opens": 0, "reuses": 0, "misses": 0, "reconnects": 0}
+
+
+class ChannelPool:
+    def __init__(self, transport, size=2, metrics=None):
+        self.transport = transport
+        self.size = size
+        self.metrics = metrics if metrics is not None else new_channel_metrics()
+        self._idle = []
+        self._lock = threading.Lock()
+        self._refilling = False
+
+    def _open(self):
+        chan = self.transport.open_session()
+        with self._lock:
+            self.metrics["opens"] += 1
+        return chan
+
+    def fill(self):
+        """Apre sessioni finche' il pool non contiene ``size`` canali pronti."""
+        try:
+            while True:
+                with self._lock:
+                    if len(self._idle) >= self.size or not self.transport.is_active():
+                        return
+                chan = self._open()
+                with self._lock:
+                    self._idle.append(chan)
+        except (paramiko.SSHException, EOFError, OSError):
+            pass  # il trasporto e' caduto: se ne accorgera' il prossimo comando
+        finally:
+            with self._lock:
+                self._refilling = False
+
+    def _refill_async(self):
+        with self._lock:
+            if self._refilling:
+                return
+            self._refilling = True
+        threading.Thread(target=self.fill, name="llrf-channel-pool", daemon=True).start()
+
+    def acquire(self):
+        """Restituisce un canale aperto, preso dal pool se possibile."""
+        chan = None
+        with self._lock:
+            while self._idle and chan is None:
+                candidate = self._idle.pop()
+                if not candidate.closed:
+                    chan = candidate
+            if chan is not None:
+                self.metrics["reuses"] += 1
+            else:
+                self.metrics["misses"] += 1
+        if chan is None:
+            chan = self._open()
+        self._refill_async()
+        return chan
+
+    def exec_command(self, command, timeout=None):
+        """Come SSHClient.exec_command, ma su un canale del pool."""
+        chan = self.acquire()
+        chan.settimeout(timeout)
+        chan.exec_command(command)
+        stdin = chan.makefile_stdin("wb", -1)
+        stdout = chan.makefile("r", -1)
+        stderr = chan.makefile_stderr("r", -1)
+        return stdin, stdout, stderr
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for chan in idle:
+            chan.close()
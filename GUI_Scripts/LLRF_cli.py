@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+Esecuzione da riga di comando (senza GUI) di sequenze dichiarative.
+
+Una sequenza e' un file JSON (o YAML, se PyYAML e' installato) con la
+connessione, impostazioni opzionali di LLRFConnection e una lista di passi
+``op`` + ``args`` (lista o dizionario di argomenti del metodo):
+
+    {"connection": {"ip": "192.168.0.109", "user": "root", "board": "boards.kupvm1"},
+     "settings": {"resample_mode": "sinc", "quantize_tables": true, "verify_uploads": true},
+     "steps": [
+        {"op": "FF_Change_MaxAmp", "args": [1000]},
+        {"op": "FF_Change_Interval", "args": {"Offset": 1.0, "Duration": 20.0}},
+        {"op": "Single_ramp", "args": [1, 10, 100, 800, 1000]},
+        {"op": "Set_Arbitrary_Shape", "file": "Lintext_amp.txt", "args": {"Max_amp": 1000, "init_t": 0}},
+        {"op": "Set_Shape", "args": {"kind": "raised_cosine", "t_start": 2, "t_end": 20,
+                                     "level": 0.9, "rise": 1.5, "offset": 1.0, "duration": 20.0}},
+        {"op": "sleep", "seconds": 0.5},
+        {"op": "FF_Get_Interval"}
+     ]}
+
+Nei passi Set_Arbitrary_* la forma d'onda arriva da ``file`` (percorso
+relativo alla sequenza, qualsiasi formato di LLRF_loaders) o da ``values``
+(lista, o lista di coppie valore/tempo) ed e' il primo argomento del metodo.
+
+    python LLRF_cli.py sequence.json                      # password da LLRF_PASSWORD o richiesta
+    python LLRF_cli.py sequence.yaml --ip 10.0.0.5 --json results.json --quiet
+    python LLRF_cli.py sequence.json --inventory stations.json   # tutte le schede in parallelo
+    python LLRF_cli.py --check-imports                    # nessun modulo Qt/PIL, tempo di import
+    python -m pytest test_cli_imports.py                  # lo stesso controllo come test
+
+Per ogni passo vengono stampati esito, durata e valore restituito; il codice
+di uscita e' 1 se un passo fallisce (la sequenza si ferma, salvo
+--keep-going). Questo modulo non importa mai PyQt5, pyqtgraph o PIL.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Moduli che il percorso headless non deve caricare, e budget del tempo di import
+FORBIDDEN_MODULES = ("PyQt5", "pyqtgraph", "PIL")
+IMPORT_BUDGET_S = 1.5
+
+OPERATIONS = (
+    "FF_Change_MaxAmp", "FF_Change_Interval", "FF_Change_Phase",
+    "FF_Get_MaxAmp", "FF_Get_Interval", "Restore", "refresh", "Single_ramp",
+    "Set_Arbitrary_Shape", "Set_Arbitrary_Shape_AndTime",
+    "Set_Arbitrary_Phase", "Set_Arbitrary_Phase_AndTime", "Set_Shape",
+)
+WAVEFORM_OPERATIONS = tuple(op for op in OPERATIONS if op.startswith("Set_Arbitrary_"))
+SETTINGS = ("resample_mode", "quantize_tables", "partial_table_command", "verify_uploads",
+            "channel_pool_size", "keepalive", "reconnect_attempts")
+CONNECTION_KEYS = ("keyfile", "port", "cache_ttl", "board")
+
+
+def load_sequence(path):
+    """Legge la sequenza (JSON, o YAML per estensione .yaml/.yml) e la valida."""
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    steps = data.get("steps") if isinstance(data, dict) else data
+    if not isinstance(steps, list):
+        raise ValueError(f"{path}: expected a list of steps")
+    for i, step in enumerate(steps, 1):
+        op = step.get("op")
+        if op != "sleep" and op not in OPERATIONS:
+            raise ValueError(f"{path}: step {i}: unknown op {op!r}")
+        if op in WAVEFORM_OPERATIONS and "file" not in step and "values" not in step:
+            raise ValueError(f"{path}: step {i}: {op} needs 'file' or 'values'")
+    unknown = set((data.get("settings") or {}) if isinstance(data, dict) else ()) - set(SETTINGS)
+    if unknown:
+        raise ValueError(f"{path}: unknown settings {sorted(unknown)}")
+    return data if isinstance(data, dict) else {"steps": steps}
+
+
+def _step_call(step, base_dir):
+    """(args, kwargs) del passo, con la forma d'onda come primo argomento."""
+    args = step.get("args", [])
+    args, kwargs = ([], dict(args)) if isinstance(args, dict) else (list(args), {})
+    if step["op"] in WAVEFORM_OPERATIONS:
+        from LLRF_waveforms import Waveform
+        if "file" in step:
+            from LLRF_loaders import load_waveform_file
+            wave = load_waveform_file(os.path.join(base_dir, step["file"]))
+        else:
+            wave = Waveform.from_array(step["values"])
+        args.insert(0, wave)
+    return args, kwargs
+
+
+def _summary(value):
+    """Valore restituito in forma stampabile/JSON (gli array vengono riassunti)."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    shape = getattr(value, "shape", None)
+    if shape is not None and shape != ():
+        if len(value) <= 8:
+            return [float(v) for v in value]
+        return {"shape": list(shape), "min": float(value.min()), "max": float(value.max())}
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+class SequenceRunner:
+    """Esegue i passi di una sequenza su una LLRFConnection (o su un LLRFFleet)."""
+
+    def __init__(self, target, base_dir=".", quiet=False, keep_going=False, log=print):
+        self.target = target
+        self.base_dir = base_dir
+        self.quiet = quiet
+        self.keep_going = keep_going
+        self.log = log
+
+    def _invoke(self, op, args, kwargs):
+        if hasattr(self.target, "broadcast"):   # LLRFFleet: stesso passo su tutte le schede
+            results = self.target.broadcast(op, *args, **kwargs)
+            failed = {name: r.error for name, r in results.items() if not r.ok}
+            if failed:
+                raise RuntimeError(f"failed on {sorted(failed)}: {next(iter(failed.values()))}")
+            return {name: _summary(r.value) for name, r in results.items()}
+        return getattr(self.target, op)(*args, **kwargs)
+
+    def run(self, steps):
+        results = []
+        for i, step in enumerate(steps, 1):
+            op = step["op"]
+            entry = {"step": i, "op": op, "ok": True, "value": None, "error": None}
+            start = time.perf_counter()
+            try:
+                if op == "sleep":
+                    time.sleep(float(step.get("seconds", 0)))
+                else:
+                    args, kwargs = _step_call(step, self.base_dir)
+                    output = io.StringIO()
+                    with contextlib.redirect_stdout(output) if self.quiet else contextlib.nullcontext():
+                        entry["value"] = _summary(self._invoke(op, args, kwargs))
+            except Exception as e:
+                entry.update(ok=False, error=f"{type(e).__name__}: {e}")
+            entry["elapsed_ms"] = (time.perf_counter() - start) * 1e3
+            results.append(entry)
+            status = "OK " if entry["ok"] else "ERR"
+            detail = entry["value"] if entry["ok"] else entry["error"]
+            self.log(f"  [{i:3d}] {status} {op:<28} {entry['elapsed_ms']:9.1f} ms  {'' if detail is None else detail}")
+            if not entry["ok"] and not self.keep_going:
+                break
+        return results
+
+
+def check_imports(budget=IMPORT_BUDGET_S):
+    """
+    Importa LLRF_cli e LLRF in un interprete pulito: fallisce se vengono caricati
+    moduli della GUI o se l'import supera ``budget`` secondi.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    probe = ("import sys, time; t = time.perf_counter(); import LLRF_cli, LLRF; "
+             "print(time.perf_counter() - t); "
+             f"print(','.join(m for m in {FORBIDDEN_MODULES!r} if m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", probe], cwd=here, capture_output=True,
+                         text=True, check=True).stdout.split("\n")
+    elapsed, loaded = float(out[0]), [m for m in out[1].split(",") if m]
+    print(f"import LLRF_cli, LLRF: {elapsed * 1e3:.0f} ms (budget {budget * 1e3:.0f} ms)")
+    if loaded:
+        print(f"FAIL: GUI modules imported: {loaded}")
+    if elapsed > budget:
+        print("FAIL: import time over budget")
+    return not loaded and elapsed <= budget
+
+
+def _apply_settings(connections, settings):
+    """Imposta i ``settings`` della sequenza; va fatto prima di connect() (channel_pool_size, keepalive)."""
+    for conn in connections:
+        for key, value in settings.items():
+            setattr(conn, key, value)
+
+
+def _open_target(sequence, args):
+    settings = sequence.get("settings") or {}
+    if args.inventory:
+        from LLRF_fleet import LLRFFleet
+        fleet = LLRFFleet.from_file(args.inventory)
+        _apply_settings(fleet.connections.values(), settings)
+        results = fleet.connect()
+        offline = sorted(name for name, r in results.items() if not r.ok)
+        if offline:
+            print(f"Offline boards: {offline}")
+        return fleet
+    from LLRF import LLRFConnection
+    conn_cfg = dict(sequence.get("connection") or {})
+    ip = args.ip or conn_cfg.get("ip")
+    if not ip:
+        raise SystemExit("No device address: set connection.ip in the sequence or use --ip")
+    user = args.user or conn_cfg.get("user", "root")
+    password = args.password or os.environ.get("LLRF_PASSWORD") or conn_cfg.get("password")
+    if password is None and not conn_cfg.get("keyfile"):
+        from getpass import getpass
+        password = getpass(f"Password for {user}@{ip}: ")
+    extra = {key: conn_cfg[key] for key in CONNECTION_KEYS if key in conn_cfg}
+    if args.port:
+        extra["port"] = args.port
+    conn = LLRFConnection(ip, user, password, **extra)
+    _apply_settings([conn], settings)
+    conn.connect()
+    return conn
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("sequence", nargs="?", help="sequence file (.json/.yaml)")
+    parser.add_argument("--ip", help="device address (overrides connection.ip)")
+    parser.add_argument("--user", help="SSH user (overrides connection.user)")
+    parser.add_argument("--password", help="SSH password (default: $LLRF_PASSWORD or connection.password)")
+    parser.add_argument("--port", type=int, help="SSH port")
+    parser.add_argument("--inventory", help="run every step on all boards of this LLRF_fleet inventory")
+    parser.add_argument("--json", help="write the step results to this file")
+    parser.add_argument("--quiet", action="store_true", help="hide the output printed by LLRFConnection")
+    parser.add_argument("--keep-going", action="store_true", help="continue after a failed step")
+    parser.add_argument("--check-imports", action="store_true",
+                        help="verify that no GUI module is imported and the import time budget")
+    args = parser.parse_args(argv)
+
+    if args.check_imports:
+        return 0 if check_imports() else 1
+    if not args.sequence:
+        parser.error("a sequence file is required")
+
+    sequence = load_sequence(args.sequence)
+    started = time.strftime("%Y-%m-%d %H:%M:%S")
+    start = time.perf_counter()
+    target = _open_target(sequence, args)
+    try:
+        connected_ms = (time.perf_counter() - start) * 1e3
+        print(f"{args.sequence}: {len(sequence['steps'])} steps (connected in {connected_ms:.0f} ms)")
+        runner = SequenceRunner(target, os.path.dirname(os.path.abspath(args.sequence)),
+                                quiet=args.quiet, keep_going=args.keep_going)
+        results = runner.run(sequence["steps"])
+    finally:
+        target.close()
+    total_ms = (time.perf_counter() - start) * 1e3
+    ok = len(results) == len(sequence["steps"]) and all(r["ok"] for r in results)
+    print(f"{'done' if ok else 'FAILED'} in {total_ms:.0f} ms")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"sequence": os.path.abspath(args.sequence), "started": started,
+                       "ok": ok, "total_ms": total_ms, "steps": results}, f, indent=2)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Scritture accorpate (last-write-wins) per la regolazione interattiva.
+
+CoalescingWriter tiene, per ogni registro, solo l'ultimo valore richiesto e
+non ancora inviato: un thread di invio raccoglie tutte le scritture in
+attesa in una sola transazione (un round trip, con readback) e carica solo
+l'ultima tabella richiesta per ogni registro, scartando quelle superate
+prima che arrivino sulla rete. Con un link da centinaia di ms, dieci
+ritocchi dell'ampiezza diventano uno o due invii invece di dieci:
+
+    with conn.coalescing(delay=0.05) as writer:
+        for amp in (900, 950, 1000):
+            writer.set_max_amp(amp)           # solo l'ultimo valore parte
+        writer.set_interval(1.0, 20.0)
+        writer.upload('table_amp', table)     # sostituisce un upload ancora in attesa
+    print(writer.readbacks, writer.stats)     # flush() e chiusura all'uscita
+
+``delay`` (s) e' il debounce: dopo la prima richiesta il thread attende che
+ne arrivino altre prima di inviare. Gli errori di invio vengono rilanciati
+da flush().
+"""
+import threading
+import time
+
+
+class CoalescingWriter:
+    def __init__(self, conn, delay=0.0, readback=True):
+        self.conn = conn
+        self.delay = delay
+        self.readback = readback
+        self.readbacks = {}          # path -> ultimo readback (stringa)
+        self.stats = {'writes': 0, 'merged': 0, 'tables': 0, 'dropped_tables': 0, 'flushes': 0}
+        self.error = None
+        self._writes = {}            # path -> valore in attesa (ordine di arrivo)
+        self._tables = {}            # register -> valori in attesa
+        self._cond = threading.Condition()
+        self._busy = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="llrf-coalesce", daemon=True)
+        self._thread.start()
+
+    # --- richieste ---
+
+    def write(self, path, value):
+        """Scrive ``path``; sostituisce un valore ancora in attesa per lo stesso registro."""
+        with self._cond:
+            self._check_open()
+            self.stats['writes'] += 1
+            if path in self._writes:
+                self.stats['merged'] += 1
+                del self._writes[path]       # l'ordine segue l'ultima richiesta
+            self._writes[path] = value
+            self._cond.notify_all()
+        return self
+
+    def upload(self, register, values):
+        """Carica una tabella (``table_amp`` / ``table_phase``); quella in attesa viene scartata."""
+        with self._cond:
+            self._check_open()
+            self.stats['tables'] += 1
+            if register in self._tables:
+                self.stats['dropped_tables'] += 1
+            self._tables[register] = values
+            self._cond.notify_all()
+        return self
+
+    def set_max_amp(self, value):
+        return self.write(f'{self.conn.board}.dsp.ff_amp.amplitude', value)
+
+    def set_phase(self, value):
+        if value < -400 or value > 400:
+            raise ValueError("The new phase must be between -400 and 400")
+        return self.write(f'{self.conn.board}.dsp.ff_phase.phase', value)
+
+    def set_interval(self, offset, duration):
+        if offset == 0:
+            offset = 0.03        # come FF_Change_Interval
+        self.write(f'{self.conn.board}.feed_forward.duration', duration)
+        return self.write(f'{self.conn.board}.feed_forward.offset', offset)
+
+    def pending(self):
+        with self._cond:
+            return len(self._writes) + len(self._tables) + self._busy
+
+    def flush(self, timeout=None):
+        """Attende l'invio di tutte le richieste; rilancia l'ultimo errore di invio."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._writes or self._tables or self._busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("CoalescingWriter.flush timed out")
+                self._cond.wait(remaining)
+            error, self.error = self.error, None
+        if error is not None:
+            raise error
+
+    def close(self, timeout=None):
+        try:
+            self.flush(timeout)
+        finally:
+            with self._cond:
+                self._closed = True
+                self._cond.notify_all()
+            self._thread.join(timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def _check_open(self):
+        if self._closed:
+            raise RuntimeError("CoalescingWriter is closed")
+
+    # --- thread di invio ---
+
+    def _take(self):
+        with self._cond:
+            while not (self._writes or self._tables or self._closed):
+                self._cond.wait()
+            if self.delay:
+                # debounce: si riparte finche' arrivano nuove richieste entro ``delay``
+                while not self._closed:
+                    before = self.stats['writes'] + self.stats['tables']
+                    self._cond.wait(self.delay)
+                    if self.stats['writes'] + self.stats['tables'] == before:
+                        break
+            writes, self._writes = self._writes, {}
+            tables, self._tables = self._tables, {}
+            self._busy = bool(writes or tables)
+            return writes, tables
+
+    def _run(self):
+        while True:
+            writes, tables = self._take()
+            if not (writes or tables):
+                return           # chiuso e senza richieste
+            try:
+                if writes:
+                    with self.conn.transaction() as tx:
+                        for path, value in writes.items():
+                            tx.write(path, value)
+                            if self.readback:
+                                tx.read(path)
+                    self.readbacks.update(tx.results)
+                for register, values in tables.items():
+                    table_string = self.conn._format_table(values, register)
+                    self.conn.upload_table(register, table_string, values)
+            except Exception as e:
+                self.error = e
+                print(f"CoalescingWriter: send failed: {e}")
+            with self._cond:
+                self.stats['flushes'] += 1
+                self._busy = False
+                self._cond.notify_all()
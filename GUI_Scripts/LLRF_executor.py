@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+Esecutore dei comandi della GUI: un solo thread, una sola connessione.
+
+LLRFExecutor e' un QThread che vive quanto la GUI, possiede l'LLRFConnection
+e serve una coda a priorita' di Command. I comandi vengono eseguiti uno alla
+volta in ordine di (priorita', arrivo), quindi due click ravvicinati non
+possono intrecciarsi sullo stesso canale paramiko, e non si paga l'avvio di
+un thread per ogni azione. I risultati arrivano nel thread della GUI tramite
+segnali (e le callback del comando); i comandi ancora in coda si possono
+annullare, e con ``coalesce_key`` un nuovo comando sostituisce quello con la
+stessa chiave ancora in attesa (last-write-wins: dieci ritocchi
+dell'ampiezza durante un upload diventano una sola scrittura):
+
+    executor = LLRFExecutor()
+    executor.command_finished.connect(lambda cmd, result: print(cmd.name, result))
+    executor.start()
+    executor.connect_with(lambda: LLRFConnection(ip, user, pwd))
+    cmd = executor.submit("set_amp", lambda conn: conn.FF_Change_MaxAmp(800),
+                          on_finished=lambda r: print("done"))
+    executor.cancel(cmd)          # False se e' gia' partito
+    executor.submit("set_amp", ..., coalesce_key="max_amp")
+    executor.stop()               # annulla la coda, chiude la connessione
+
+Ogni comando riceve la connessione come primo argomento: ``func(conn, *args)``.
+"""
+import heapq
+import itertools
+import threading
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+PRIORITY_CONNECTION = 0     # connessione/disconnessione
+PRIORITY_CONTROL = 10       # scritture scalari (ampiezza, intervallo, restore)
+PRIORITY_UPLOAD = 20        # upload delle tabelle
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+
+class Command:
+    """Comando in coda: ``func(conn, *args, **kwargs)`` eseguito dall'executor."""
+    __slots__ = ("id", "name", "func", "args", "kwargs", "priority", "needs_connection",
+                 "on_finished", "on_error", "coalesce_key", "state", "result", "error")
+
+    def __init__(self, id, name, func, args=(), kwargs=None, priority=PRIORITY_CONTROL,
+                 needs_connection=True, on_finished=None, on_error=None, coalesce_key=None):
+        self.id = id
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.priority = priority
+        self.needs_connection = needs_connection
+        self.on_finished = on_finished
+        self.on_error = on_error
+        self.coalesce_key = coalesce_key
+        self.state = QUEUED
+        self.result = None
+        self.error = None
+
+    def __lt__(self, other):
+        return (self.priority, self.id) < (other.priority, other.id)
+
+    def __repr__(self):
+        return f"<Command #{self.id} {self.name} p={self.priority} {self.state}>"
+
+
+class LLRFExecutor(QThread):
+    command_queued = pyqtSignal(object)
+    command_started = pyqtSignal(object)
+    command_finished = pyqtSignal(object, object)   # (Command, risultato)
+    command_failed = pyqtSignal(object, object)     # (Command, eccezione)
+    command_cancelled = pyqtSignal(object)
+    pending_changed = pyqtSignal(int)               # comandi in coda + in esecuzione
+    _completed = pyqtSignal(object)
+
+    def __init__(self, conn=None, parent=None):
+        super().__init__(parent)
+        self.conn = conn
+        self._heap = []
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._running = None
+        self._stopping = False
+        self.coalesced = 0          # comandi sostituiti da uno piu' recente
+        # connesso nel thread che crea l'executor (la GUI): le callback dei
+        # comandi girano li', non nel thread dell'executor
+        self._completed.connect(self._dispatch)
+
+    # --- coda ---
+
+    def submit(self, name, func, *args, priority=PRIORITY_CONTROL, needs_connection=True,
+               on_finished=None, on_error=None, coalesce_key=None, **kwargs):
+        """
+        Accoda ``func(conn, *args, **kwargs)`` e restituisce il Command. Con
+        ``coalesce_key`` i comandi in coda con la stessa chiave vengono annullati.
+        """
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError("LLRFExecutor is stopped")
+            superseded = []
+            if coalesce_key is not None:
+                superseded = [c for c in self._heap if c.state == QUEUED and c.coalesce_key == coalesce_key]
+                for old in superseded:
+                    old.state = CANCELLED
+                self._pending -= len(superseded)
+                self.coalesced += len(superseded)
+            cmd = Command(next(self._ids), name, func, args, kwargs, priority,
+                          needs_connection, on_finished, on_error, coalesce_key)
+            heapq.heappush(self._heap, cmd)
+            self._pending += 1
+            pending = self._pending
+            self._cond.notify()
+        for old in superseded:
+            self.command_cancelled.emit(old)
+        self.command_queued.emit(cmd)
+        self.pending_changed.emit(pending)
+        return cmd
+
+    def cancel(self, cmd):
+        """Annulla un comando ancora in coda; False se e' gia' partito o concluso."""
+        with self._cond:
+            if cmd.state != QUEUED:
+                return False
+            cmd.state = CANCELLED     # rimosso dallo heap quando arriva in cima
+            self._pending -= 1
+            pending = self._pending
+        self.command_cancelled.emit(cmd)
+        self.pending_changed.emit(pending)
+        return True
+
+    def cancel_all(self, name=None):
+        """Annulla i comandi in coda (tutti, o solo quelli con questo nome); restituisce quanti."""
+        with self._cond:
+            queued = [cmd for cmd in self._heap if cmd.state == QUEUED and (name is None or cmd.name == name)]
+        return sum(self.cancel(cmd) for cmd in queued)
+
+    def pending(self):
+        with self._cond:
+            return self._pending
+
+    def queued(self):
+        """Comandi in attesa, nell'ordine in cui verranno eseguiti."""
+        with self._cond:
+            return sorted(cmd for cmd in self._heap if cmd.state == QUEUED)
+
+    @property
+    def running(self):
+        return self._running
+
+    # --- connessione ---
+
+    def connect_with(self, factory, on_finished=None, on_error=None):
+        """Crea (``factory()``) e connette la connessione posseduta dall'executor."""
+        def task(old):
+            if old is not None:
+                old.close()
+                self.conn = None
+            conn = factory()
+            conn.connect()
+            self.conn = conn
+            return conn
+        return self.submit("connect", task, priority=PRIORITY_CONNECTION, needs_connection=False,
+                           on_finished=on_finished, on_error=on_error)
+
+    def disconnect(self, on_finished=None, on_error=None):
+        """Annulla i comandi in coda e chiude la connessione."""
+        self.cancel_all()
+
+        def task(conn):
+            self.conn = None
+            if conn is not None:
+                conn.close()
+        return self.submit("disconnect", task, priority=PRIORITY_CONNECTION, needs_connection=False,
+                           on_finished=on_finished, on_error=on_error)
+
+    def stop(self, timeout_ms=5000):
+        """Annulla la coda, attende il comando in corso e chiude la connessione."""
+        self.cancel_all()
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self.isRunning():
+            self.wait(timeout_ms)
+
+    # --- thread ---
+
+    def _next(self):
+        with self._cond:
+            while True:
+                while self._heap and self._heap[0].state == CANCELLED:
+                    heapq.heappop(self._heap)
+                if self._heap:
+                    cmd = heapq.heappop(self._heap)
+                    cmd.state = RUNNING
+                    self._running = cmd
+                    return cmd
+                if self._stopping:
+                    return None
+                self._cond.wait()
+
+    def run(self):
+        while True:
+            cmd = self._next()
+            if cmd is None:
+                break
+            self.command_started.emit(cmd)
+            try:
+                if cmd.needs_connection and self.conn is None:
+                    raise RuntimeError("Not connected")
+                cmd.result = cmd.func(self.conn, *cmd.args, **cmd.kwargs)
+                cmd.state = DONE
+            except Exception as e:
+                cmd.error = e
+                cmd.state = FAILED
+            with self._cond:
+                self._running = None
+                self._pending -= 1
+                pending = self._pending
+            self._completed.emit(cmd)
+            self.pending_changed.emit(pending)
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception as e:
+                print(f"LLRFExecutor: error closing connection: {e}")
+            self.conn = None
+
+    def _dispatch(self, cmd):
+        if cmd.state == DONE:
+            if cmd.on_finished:
+                cmd.on_finished(cmd.result)
+            self.command_finished.emit(cmd, cmd.result)
+        else:
+            if cmd.on_error:
+                cmd.on_error(cmd.error)
+            self.command_failed.emit(cmd, cmd.error)
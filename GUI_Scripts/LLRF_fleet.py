@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Gestione parallela di piu' unita' Libera LLRF.
+
+L'inventario e' un file JSON (o YAML, se PyYAML e' installato):
+
+    {"boards": [
+        {"name": "ST1", "ip": "192.168.0.109", "user": "root", "password": "...",
+         "board": "boards.kupvm1"},
+        {"name": "ST2", "ip": "192.168.0.110", "user": "root", "password": "..."}
+    ]}
+
+``board`` e' il prefisso dei registri della scheda (default boards.kupvm1);
+le altre chiavi opzionali (keyfile, port, cache_ttl) vengono passate a
+LLRFConnection. Esempio:
+
+    with LLRFFleet.from_file('stations.json') as fleet:
+        results = fleet.FF_Change_MaxAmp(1000)
+        fleet.print_results(results)
+
+Ogni broadcast gira su un thread pool, quindi dura circa quanto la scheda
+piu' lenta, e restituisce un BoardResult per scheda con valore, errore e
+latenza.
+"""
+import json
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from LLRF import LLRFConnection, DEFAULT_BOARD
+from LLRF_waveforms import as_waveform
+
+BoardResult = namedtuple("BoardResult", "name ok value error elapsed")
+
+_CONNECTION_KEYS = ("keyfile", "port", "cache_ttl")
+
+
+def load_inventory(path):
+    """Legge l'inventario (JSON, o YAML per estensione .yaml/.yml)."""
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    boards = data["boards"] if isinstance(data, dict) else data
+    names = [entry["name"] for entry in boards]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate board names in inventory {path}")
+    return boards
+
+
+class LLRFFleet:
+    def __init__(self, inventory, max_workers=None, connection_factory=LLRFConnection):
+        self.inventory = list(inventory)
+        self.max_workers = max_workers or max(1, len(self.inventory))
+        self.connections = {}
+        for entry in self.inventory:
+            extra = {key: entry[key] for key in _CONNECTION_KEYS if key in entry}
+            self.connections[entry["name"]] = connection_factory(
+                entry["ip"], entry.get("user", "root"), entry.get("password"),
+                board=entry.get("board", DEFAULT_BOARD), **extra)
+        self.online = set()
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        return cls(load_inventory(path), **kwargs)
+
+    def _run(self, names, func):
+        """Esegue ``func(name, conn)`` su ``names`` in parallelo."""
+        def task(name):
+            start = time.perf_counter()
+            try:
+                value = func(name, self.connections[name])
+                return BoardResult(name, True, value, None, time.perf_counter() - start)
+            except Exception as e:
+                return BoardResult(name, False, None, e, time.perf_counter() - start)
+
+        with ThreadPoolExecutor(self.max_workers, thread_name_prefix="llrf-fleet") as pool:
+            return {result.name: result for result in pool.map(task, names)}
+
+    def _targets(self, boards):
+        names = list(self.online) if boards is None else list(boards)
+        unknown = [name for name in names if name not in self.connections]
+        if unknown:
+            raise KeyError(f"Unknown boards: {unknown}")
+        return names
+
+    def connect(self, boards=None):
+        """Connette tutte le schede (o ``boards``); le schede fallite restano offline."""
+        names = list(self.connections) if boards is None else list(boards)
+        results = self._run(names, lambda name, conn: conn.connect())
+        self.online.update(name for name, result in results.items() if result.ok)
+        return results
+
+    def close(self):
+        """Chiude tutte le schede online, anche se alcune falliscono; restituisce i BoardResult."""
+        results = self._run(list(self.online), lambda name, conn: conn.close())
+        self.online.difference_update(results)
+        for name, result in results.items():
+            if not result.ok:
+                print(f"Close {name} failed: {result.error}")
+        return results
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def broadcast(self, method, *args, boards=None, **kwargs):
+        """
+        Chiama ``LLRFConnection.<method>(*args, **kwargs)`` su tutte le schede
+        online (o ``boards``). Le forme d'onda sono Waveform immutabili, quindi
+        tutte le schede condividono lo stesso buffer e la stessa tabella
+        ricampionata (calcolata una volta sola).
+        """
+        def call(name, conn):
+            return getattr(conn, method)(*args, **kwargs)
+        return self._run(self._targets(boards), call)
+
+    def broadcast_each(self, per_board_args, method):
+        """Come broadcast, ma con argomenti diversi per scheda: {name: (args...)}."""
+        def call(name, conn):
+            return getattr(conn, method)(*per_board_args[name])
+        return self._run(self._targets(per_board_args), call)
+
+    def FF_Change_MaxAmp(self, New_amp, boards=None):
+        return self.broadcast("FF_Change_MaxAmp", New_amp, False, boards=boards)
+
+    def FF_Change_Interval(self, Offset, Duration, boards=None):
+        return self.broadcast("FF_Change_Interval", Offset, Duration, False, boards=boards)
+
+    def FF_Change_Phase(self, New_phase, boards=None):
+        return self.broadcast("FF_Change_Phase", New_phase, False, boards=boards)
+
+    def Set_Arbitrary_Shape(self, Arb, Max_amp, init_t, boards=None):
+        return self.broadcast("Set_Arbitrary_Shape", as_waveform(Arb), Max_amp, init_t, boards=boards)
+
+    def Set_Arbitrary_Phase(self, Arb, Cent_phase, init_t, boards=None):
+        return self.broadcast("Set_Arbitrary_Phase", as_waveform(Arb), Cent_phase, init_t, boards=boards)
+
+    @staticmethod
+    def print_results(results):
+        """Stampa una tabella con esito e latenza per scheda."""
+        print("=" * 60)
+        for name, result in sorted(results.items()):
+            status = "OK " if result.ok else "ERR"
+            detail = result.value if result.ok else result.error
+            print(f"  {status} {name:<12} {result.elapsed * 1e3:8.1f} ms  {detail}")
+        slowest = max((r.elapsed for r in results.values()), default=0.0)
+        print(f"  slowest board: {slowest * 1e3:.1f} ms")
+        print("=" * 60)
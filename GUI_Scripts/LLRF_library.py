@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Libreria su disco delle forme d'onda candidate.
+
+Ogni forma d'onda e' un file .npy (nome = hash del contenuto, quindi niente
+duplicati) aperto in memory map: caricarla non richiede parsing ed e'
+immediato anche per catture lunghe. I file 2D sono salvati come righe
+(valori, tempi), cosi' entrambe sono viste contigue del memmap e diventano
+un Waveform in sola lettura senza copie. ``index.json`` contiene i metadati
+(nome, tipo amp/phase, campioni, durata, picco, tag, sorgente, data):
+
+    lib = WaveformLibrary()                      # ~/.llrf_library o $LLRF_LIBRARY
+    key = lib.import_file('Lintext_amp.txt', kind='amp', tags=['linac', 'test'])
+    for entry in lib.search('lin', kind='amp'):
+        print(entry['name'], entry['peak'])
+    wave = lib.load(key)                         # Waveform su memmap
+    thumb = lib.thumbnail(key)                   # min/max per la preview
+"""
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from LLRF_loaders import load_waveform_file
+from LLRF_waveforms import Waveform
+
+INDEX_FILE = "index.json"
+KINDS = ("amp", "phase")
+THUMBNAIL_POINTS = 96
+
+
+def default_library_path():
+    return os.environ.get("LLRF_LIBRARY") or os.path.join(os.path.expanduser("~"), ".llrf_library")
+
+
+def content_hash(wave):
+    """Hash dei valori e della base dei tempi (se esplicita)."""
+    h = hashlib.blake2b(digest_size=12)
+    h.update(np.ascontiguousarray(wave.values).tobytes())
+    if wave.time is not None:
+        h.update(np.ascontiguousarray(wave.time).tobytes())
+    return h.hexdigest()
+
+
+class WaveformLibrary:
+    def __init__(self, root=None):
+        self.root = root or default_library_path()
+        os.makedirs(self.root, exist_ok=True)
+        self.entries = {}
+        self._thumbnails = {}
+        index = os.path.join(self.root, INDEX_FILE)
+        if os.path.exists(index):
+            with open(index) as f:
+                self.entries = json.load(f)
+
+    def _save_index(self):
+        tmp = os.path.join(self.root, INDEX_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f, indent=1)
+        os.replace(tmp, os.path.join(self.root, INDEX_FILE))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def add(self, wave, name, kind="amp", tags=(), source=None):
+        """Aggiunge un Waveform (o array 1D/2D) e restituisce la chiave (hash del contenuto)."""
+        if kind not in KINDS:
+            raise ValueError(f"kind must be one of {KINDS}, not {kind!r}")
+        if not isinstance(wave, Waveform):
+            wave = Waveform.from_array(wave)
+        key = content_hash(wave)
+        if key not in self.entries:
+            data = wave.values if wave.time is None else np.vstack([wave.values, wave.time])
+            np.save(os.path.join(self.root, key + ".npy"), data)
+        self.entries[key] = {
+            "name": name, "kind": kind, "samples": len(wave),
+            "duration_us": wave.t_end - wave.t_start, "peak": float(np.max(np.abs(wave.values))),
+            "tags": sorted({t.strip() for t in tags if t.strip()}),
+            "source": source, "added": time.strftime("%Y-%m-%d %H:%M:%S"), "hash": key,
+        }
+        self._save_index()
+        return key
+
+    def import_file(self, path, kind="amp", tags=(), name=None):
+        """Importa un file .npy/.txt/.csv (1D o 2D valore, tempo) nella libreria."""
+        name = name or os.path.splitext(os.path.basename(path))[0]
+        return self.add(load_waveform_file(path), name, kind, tags, source=os.path.abspath(path))
+
+    def remove(self, key):
+        entry = self.entries.pop(key)
+        for cached in [k for k in self._thumbnails if k[0] == key]:   # chiavi (key, points)
+            del self._thumbnails[cached]
+        self._save_index()
+        try:
+            os.remove(os.path.join(self.root, key + ".npy"))
+        except OSError:
+            pass
+        return entry
+
+    def update(self, key, **fields):
+        """Modifica nome, tipo o tag di una voce."""
+        entry = self.entries[key]
+        if "tags" in fields:
+            fields["tags"] = sorted({t.strip() for t in fields["tags"] if t.strip()})
+        entry.update({k: v for k, v in fields.items() if k in ("name", "kind", "tags")})
+        self._save_index()
+
+    def search(self, text="", kind=None, tags=()):
+        """Voci che contengono ``text`` (nome, tag, sorgente), filtrate per tipo e tag."""
+        text = text.lower().strip()
+        wanted = set(tags)
+        result = []
+        for entry in self.entries.values():
+            if kind and entry["kind"] != kind:
+                continue
+            if wanted and not wanted.issubset(entry["tags"]):
+                continue
+            haystack = " ".join([entry["name"], " ".join(entry["tags"]), entry.get("source") or ""]).lower()
+            if text and text not in haystack:
+                continue
+            result.append(entry)
+        return sorted(result, key=lambda e: e["name"].lower())
+
+    def load(self, key):
+        """Waveform in sola lettura sul memmap del file (nessun parsing, nessuna copia)."""
+        data = np.load(os.path.join(self.root, key + ".npy"), mmap_mode="r")
+        if data.ndim == 2:
+            return Waveform(data[0], data[1])
+        return Waveform(data)
+
+    def thumbnail(self, key, points=THUMBNAIL_POINTS):
+        """(min, max) per ``points`` intervalli: la preview conserva i picchi. In cache."""
+        cached = self._thumbnails.get((key, points))
+        if cached is None:
+            values = self.load(key).values
+            n = len(values)
+            if n <= points:
+                cached = (np.array(values), np.array(values))
+            else:
+                edges = np.linspace(0, n, points + 1).astype(int)
+                cached = (np.minimum.reduceat(values, edges[:-1]), np.maximum.reduceat(values, edges[:-1]))
+            self._thumbnails[(key, points)] = cached
+        return cached
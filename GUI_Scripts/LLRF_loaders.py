@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Caricamento delle forme d'onda da file, anche molto grandi.
+
+I file di testo/CSV (export degli oscilloscopi con milioni di righe) vengono
+letti a blocchi di righe con np.loadtxt, saltando l'eventuale intestazione
+non numerica; separatori: spazi, ',' oppure ';' (con virgola decimale).
+Convenzioni come in LLRF_GUI: una colonna = valori, due o piu' colonne =
+(valore, tempo in µs); le colonne oltre la seconda sono ignorate.
+
+I formati binari degli oscilloscopi sono letti da LLRF_scopes via memmap.
+
+Con ``max_points`` la forma d'onda viene ricampionata durante la lettura
+(interpolazione lineare sull'indice, come Waveform.resampled), quindi
+l'array completo non viene mai tenuto in memoria:
+
+    wave = load_waveform_file('capture.csv', max_points=4096,
+                              progress=lambda f: print(f'{f:.0%}'),
+                              cancel=lambda: stop_requested)
+
+``progress`` riceve la frazione letta (0..1); se ``cancel`` restituisce True
+il caricamento si interrompe con LoadCancelled.
+"""
+import os
+import warnings
+
+import numpy as np
+
+from LLRF_resample import resample
+from LLRF_scopes import is_scope_file, read_scope
+from LLRF_waveforms import Waveform
+
+CHUNK_ROWS = 500_000
+CHUNK_BYTES = 8 << 20       # solo per il conteggio delle righe
+MAX_HEADER_LINES = 1000
+
+
+class LoadCancelled(Exception):
+    pass
+
+
+def _sniff(f):
+    """Salta l'intestazione: restituisce (offset dei dati, delimitatore, virgola decimale, colonne)."""
+    for _ in range(MAX_HEADER_LINES):
+        offset = f.tell()
+        line = f.readline().decode("ascii", "replace").strip()
+        if not line and offset == f.tell():
+            break
+        # CSV europeo: ';' separa le colonne, ',' e' il separatore decimale
+        delimiter = ";" if ";" in line else ("," if "," in line else None)
+        decimal_comma = delimiter == ";" and "," in line
+        fields = (line.replace(",", ".") if decimal_comma else line).split(delimiter)
+        try:
+            values = [float(v) for v in fields if v.strip()]
+        except ValueError:
+            continue
+        if values:
+            return offset, delimiter, decimal_comma, len(values)
+    raise ValueError("No numeric data found")
+
+
+def _count_lines(f, start, cancel):
+    """Righe di dati a partire da ``start`` (per dimensionare output e ricampionamento)."""
+    f.seek(start)
+    lines = 0
+    last = b"\n"
+    while True:
+        block = f.read(CHUNK_BYTES)
+        if not block:
+            break
+        if cancel and cancel():
+            raise LoadCancelled()
+        lines += block.count(b"\n") - block.count(b"\n\n") - block.count(b"\n\r\n")
+        last = block[-1:]
+    return lines + (last != b"\n")
+
+
+class _StreamResampler:
+    """np.interp(linspace(0, 1, m), linspace(0, 1, n), x) calcolato blocco per blocco."""
+
+    def __init__(self, n, m, ncols):
+        self.positions = np.linspace(0, n - 1, m)
+        self.out = np.empty((m, ncols))
+        self.filled = 0
+        self.offset = 0          # indice della prima riga del prossimo blocco
+        self.last = None         # ultima riga del blocco precedente
+
+    def feed(self, rows):
+        if self.last is not None:
+            block, base = np.vstack([self.last, rows]), self.offset - 1
+        else:
+            block, base = rows, self.offset
+        self.offset += len(rows)
+        self.last = rows[-1:]
+        stop = np.searchsorted(self.positions, base + len(block) - 1, side="right")
+        if stop > self.filled:
+            t = self.positions[self.filled:stop] - base
+            i0 = np.minimum(np.floor(t).astype(int), max(len(block) - 2, 0))
+            i1 = np.minimum(i0 + 1, len(block) - 1)
+            frac = (t - i0)[:, None]
+            self.out[self.filled:stop] = block[i0] * (1 - frac) + block[i1] * frac
+            self.filled = stop
+
+    def finish(self):
+        if self.filled < len(self.out) and self.last is not None:
+            self.out[self.filled:] = self.last   # meno righe del previsto (righe vuote)
+        return self.out
+
+
+def load_text_waveform(path, max_points=None, progress=None, cancel=None):
+    """Testo/CSV letto a blocchi di CHUNK_ROWS righe (np.loadtxt riprende dal punto raggiunto)."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        start, delimiter, decimal_comma, width = _sniff(f)
+        n = _count_lines(f, start, cancel)
+    ncols = min(width, 2)
+    if max_points and n > max_points:
+        sink, out = _StreamResampler(n, max_points, ncols), None
+    else:
+        sink, out = None, np.empty((n, ncols))
+    filled = 0
+    with open(path, errors="replace") as f:
+        f.seek(start)
+        lines = (line.replace(",", ".") for line in f) if decimal_comma else f
+        while True:
+            if cancel and cancel():
+                raise LoadCancelled()
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", UserWarning)   # "input contained no data" a fine file
+                rows = np.loadtxt(lines, delimiter=delimiter, max_rows=CHUNK_ROWS, ndmin=2)[:, :ncols]
+            if not len(rows):
+                break
+            if sink is not None:
+                sink.feed(rows)
+            else:
+                if filled + len(rows) > len(out):
+                    out = np.resize(out, (filled + len(rows), ncols))
+                out[filled:filled + len(rows)] = rows
+                filled += len(rows)
+            if progress:
+                progress(min(1.0, f.buffer.tell() / size) if size else 1.0)
+    if progress:
+        progress(1.0)
+    result = sink.finish() if sink is not None else out[:filled]
+    return Waveform.from_array(result if ncols == 2 else result[:, 0])
+
+
+def load_waveform_file(path, max_points=None, progress=None, cancel=None):
+    """
+    Waveform da .npy (memmap, nessun parsing), da file binari degli oscilloscopi
+    (.trc/.isf/.wfm/.bin, vedi LLRF_scopes) o da testo/CSV (a blocchi).
+    """
+    if is_scope_file(path):
+        wave = read_scope(path).waveform(max_points)
+        if progress:
+            progress(1.0)
+        return wave
+    if path.endswith(".npy"):
+        data = np.load(path, mmap_mode="r")
+        if data.ndim not in (1, 2):
+            raise ValueError(f"Unsupported waveform ndim: {data.ndim}")
+        wave = Waveform.from_array(data)
+        if progress:
+            progress(1.0)
+        if max_points and len(wave) > max_points:
+            values = wave.resampled(max_points)
+            wave = Waveform(values, None if wave.time is None else resample(wave.time, max_points))
+        return wave
+    return load_text_waveform(path, max_points, progress, cancel)
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Strumentazione dei comandi di LLRFConnection.
+
+Ogni LLRFConnection ha un oggetto ``metrics`` (disattivato di default: il
+costo e' un solo test di ``enabled`` per comando). Una volta attivato:
+
+    conn.metrics.enabled = True
+    ...
+    conn.metrics.snapshot()                  # dict
+    conn.metrics.to_json()                   # stringa JSON
+    conn.metrics.write_prometheus('llrf.prom')   # textfile per node_exporter
+
+Le serie sono indicizzate per (operazione, registro):
+    send    comando sul canale interattivo (transazioni, letture scalari)
+    exec    comando su exec channel (run_command)
+    upload  upload completo di una tabella (formattazione esclusa)
+    verify  rilettura e confronto di una tabella (errore = fuori tolleranza)
+    format  serializzazione di una tabella
+    parse   parsing dell'output di una transazione
+Per ciascuna: istogramma delle latenze, byte inviati/ricevuti, errori e
+tentativi ripetuti dopo una riconnessione.
+"""
+import json
+import re
+import threading
+import time
+
+# Limiti superiori (ms) dei bucket dell'istogramma delle latenze
+BUCKETS_MS = (0.1, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+_PATH_RE = re.compile(r"libera-ireg\s+(?:access|dump)\s+([\w.\-]+)")
+_PATH_SCAN_LIMIT = 4096
+
+
+def command_paths(command):
+    """Registri citati da un comando libera-ireg (solo l'inizio delle righe lunghe)."""
+    paths = sorted(set(_PATH_RE.findall(command[:_PATH_SCAN_LIMIT])))
+    return ",".join(paths) if paths else "-"
+
+
+class _Series:
+    __slots__ = ("count", "errors", "retries", "bytes_out", "bytes_in", "total_s", "max_s", "buckets")
+
+    def __init__(self):
+        self.count = self.errors = self.retries = self.bytes_out = self.bytes_in = 0
+        self.total_s = self.max_s = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def quantile_ms(self, q):
+        """Stima del quantile ``q`` dal limite superiore del bucket."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS_MS, self.buckets):
+            seen += n
+            if seen >= target:
+                return min(float(bound), self.max_s * 1e3)
+        return self.max_s * 1e3
+
+    def as_dict(self):
+        return {
+            "count": self.count, "errors": self.errors, "retries": self.retries,
+            "bytes_out": self.bytes_out, "bytes_in": self.bytes_in,
+            "mean_ms": self.total_s / self.count * 1e3 if self.count else 0.0,
+            "p50_ms": self.quantile_ms(0.5), "p90_ms": self.quantile_ms(0.9),
+            "max_ms": self.max_s * 1e3,
+            "buckets_ms": dict(zip([str(b) for b in BUCKETS_MS] + ["+Inf"], self.buckets)),
+        }
+
+
+class Metrics:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.started = time.time()
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _get(self, op, path):
+        series = self._series.get((op, path))
+        if series is None:
+            series = self._series[(op, path)] = _Series()
+        return series
+
+    def record(self, op, path, elapsed, bytes_out=0, bytes_in=0, error=False):
+        if not self.enabled:
+            return
+        ms = elapsed * 1e3
+        index = next((i for i, bound in enumerate(BUCKETS_MS) if ms <= bound), len(BUCKETS_MS))
+        with self._lock:
+            series = self._get(op, path)
+            series.count += 1
+            series.errors += bool(error)
+            series.bytes_out += bytes_out
+            series.bytes_in += bytes_in
+            series.total_s += elapsed
+            series.max_s = max(series.max_s, elapsed)
+            series.buckets[index] += 1
+
+    def retry(self, op, path):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._get(op, path).retries += 1
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self.started = time.time()
+
+    def snapshot(self):
+        """Stato corrente come dict {op: {path: statistiche}}."""
+        with self._lock:
+            items = [(key, series.as_dict()) for key, series in self._series.items()]
+        result = {"since": self.started, "uptime_s": time.time() - self.started, "series": {}}
+        for (op, path), stats in sorted(items):
+            result["series"].setdefault(op, {})[path] = stats
+        return result
+
+    def to_json(self, indent=2):
+        return json.dumps(self.snapshot(), indent=indent)
+
+    def to_prometheus(self, prefix="llrf"):
+        """Formato testo di Prometheus (istogramma + contatori per serie)."""
+        with self._lock:
+            items = sorted(self._series.items())
+        lines = [f"# TYPE {prefix}_command_seconds histogram"]
+        for (op, path), series in items:
+            labels = f'op="{op}",path="{path}"'
+            cumulative = 0
+            for bound, n in zip(BUCKETS_MS, series.buckets):
+                cumulative += n
+                lines.append(f'{prefix}_command_seconds_bucket{{{labels},le="{bound / 1e3:g}"}} {cumulative}')
+            lines.append(f'{prefix}_command_seconds_bucket{{{labels},le="+Inf"}} {series.count}')
+            lines.append(f"{prefix}_command_seconds_sum{{{labels}}} {series.total_s:.6f}")
+            lines.append(f"{prefix}_command_seconds_count{{{labels}}} {series.count}")
+        for name, attr in [("errors", "errors"), ("retries", "retries"),
+                           ("bytes_sent", "bytes_out"), ("bytes_received", "bytes_in")]:
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            for (op, path), series in items:
+                lines.append(f'{prefix}_{name}_total{{op="{op}",path="{path}"}} {getattr(series, attr)}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, filename, prefix="llrf"):
+        with open(filename, "w") as f:
+            f.write(self.to_prometheus(prefix))
+
+    def format_text(self):
+        """Tabella leggibile per il pannello diagnostico della GUI."""
+        snap = self.snapshot()
+        lines = [f"{'op':<7}{'count':>7}{'mean':>9}{'p50':>8}{'p90':>8}{'max':>9}"
+                 f"{'err':>5}{'retry':>6}{'kB out':>9}{'kB in':>8}  register",
+                 "-" * 100]
+        for op, paths in snap["series"].items():
+            for path, s in paths.items():
+                lines.append(f"{op:<7}{s['count']:>7}{s['mean_ms']:>9.2f}{s['p50_ms']:>8.1f}"
+                             f"{s['p90_ms']:>8.1f}{s['max_ms']:>9.2f}{s['errors']:>5}{s['retries']:>6}"
+                             f"{s['bytes_out'] / 1e3:>9.1f}{s['bytes_in'] / 1e3:>8.1f}  {path}")
+        lines.append(f"(times in ms, since {time.strftime('%H:%M:%S', time.localtime(snap['since']))})")
+        return "\n".join(lines)
@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+Server SSH locale che emula libera-ireg, per provare LLRFConnection senza hardware.
+
+Implementa, su un albero di registri in memoria, il sottoinsieme di shell
+usato da LLRF.py: ``libera-ireg access path=value``, ``libera-ireg dump path``
+(anche di un sottoalbero), ``echo`` con ``$?``, comandi concatenati con ``;``,
+``&&`` e ``||``, ``exit N``, ``v=$(gunzip -c)`` / ``"$v"`` (o ``"$(gunzip -c)"``)
+per gli upload compressi e ``command -v``. Supporta sia exec channel che la
+shell interattiva con eco stile tty.
+
+Latenza, jitter e banda sono configurabili per simulare il link reale:
+
+    with MockLiberaServer(latency=0.005, jitter=0.001, bandwidth=1e6) as server:
+        conn = LLRFConnection(server.host, 'root', 'Jungle', port=server.port)
+        conn.connect()
+
+Solo nel mock, ``path[start:stop]=v0,v1,...`` scrive un intervallo di una
+tabella (utile per provare LLRFConnection.partial_table_command).
+"""
+import gzip
+import random
+import re
+import shlex
+import socket
+import threading
+import time
+
+import paramiko
+
+DEFAULT_PASSWORD = "Jungle"
+# lookahead: il separatore e' fuori da stringhe tra apici singoli o doppi
+_OUTSIDE_QUOTES = r"""(?=(?:[^'"]|'[^']*'|"[^"]*")*$)"""
+TABLE_LENGTH = 4096
+
+
+def default_registers(board="boards.kupvm1"):
+    """Albero di registri iniziale di una scheda kupvm."""
+    return {
+        f"{board}.dsp.ff_pulse_shape.mode": "Table",
+        f"{board}.dsp.ff_pulse_shape.table_amp": ",".join(["1.000000"] * TABLE_LENGTH),
+        f"{board}.dsp.ff_pulse_shape.table_phase": ",".join(["0.000000"] * TABLE_LENGTH),
+        f"{board}.dsp.ff_amp.amplitude": "1000",
+        f"{board}.dsp.ff_phase.phase": "0",
+        f"{board}.feed_forward.offset": "0.03",
+        f"{board}.feed_forward.duration": "5",
+    }
+
+
+class _Transport(paramiko.Transport):
+    """
+    Trasporto lato server che avvia il gestore di un canale solo dopo aver
+    inviato CHANNEL_SUCCESS alla richiesta exec/shell: altrimenti l'uscita
+    del comando (e la chiusura del canale) potrebbe precedere la risposta.
+    """
+
+    def __init__(self, sock):
+        super().__init__(sock)
+        self.pending_handlers = {}   # remote chanid -> (target, args)
+
+    def _send_user_message(self, data):
+        super()._send_user_message(data)
+        raw = data.asbytes()
+        if raw[:1] == bytes([paramiko.common.MSG_CHANNEL_SUCCESS]):
+            handler = self.pending_handlers.pop(int.from_bytes(raw[1:5], "big"), None)
+            if handler:
+                threading.Thread(target=handler[0], args=handler[1], daemon=True).start()
+
+
+class _ServerInterface(paramiko.ServerInterface):
+    def __init__(self, mock):
+        self.mock = mock
+
+    def check_auth_password(self, username, password):
+        if self.mock.password is None or password == self.mock.password:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        channel.transport.pending_handlers[channel.remote_chanid] = (self.mock._serve_shell, (channel,))
+        return True
+
+    def check_channel_exec_request(self, channel, command):
+        channel.transport.pending_handlers[channel.remote_chanid] = (
+            self.mock._serve_exec, (channel, command.decode()))
+        return True
+
+
+class MockLiberaServer:
+    def __init__(self, registers=None, latency=0.0, jitter=0.0, bandwidth=None,
+                 password=DEFAULT_PASSWORD, host="127.0.0.1", port=0):
+        self.registers = dict(registers if registers is not None else default_registers())
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth      # byte/s, None = illimitata
+        self.password = password
+        self.host = host
+        self.port = port
+        self.commands = []              # log di tutti i comandi eseguiti
+        self._lock = threading.Lock()
+        self._host_key = paramiko.RSAKey.generate(2048)
+        self._sock = None
+        self._transports = []
+        self._running = False
+
+    # --- ciclo di vita ---
+
+    def start(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((self.host, self.port))
+        self._sock.listen(8)
+        self.port = self._sock.getsockname()[1]
+        self._running = True
+        threading.Thread(target=self._accept_loop, name="mock-libera", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._running = False
+        for transport in self._transports:
+            transport.close()
+        if self._sock:
+            self._sock.close()
+
+    def drop_connections(self):
+        """Chiude le sessioni attive (simula la caduta del link)."""
+        for transport in self._transports:
+            transport.close()
+        self._transports = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                client, _ = self._sock.accept()
+            except OSError:
+                return
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            transport = _Transport(client)
+            transport.add_server_key(self._host_key)
+            transport.start_server(server=_ServerInterface(self))
+            self._transports.append(transport)
+
+    # --- simulazione del link ---
+
+    def _delay(self, nbytes=0):
+        delay = self.latency + (random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        if self.bandwidth:
+            delay += nbytes / self.bandwidth
+        if delay > 0:
+            time.sleep(delay)
+
+    # --- canali ---
+
+    def _serve_exec(self, channel, command):
+        stdin = b""
+        if "$(gunzip -c)" in command:
+            chunks = []
+            while True:
+                data = channel.recv(65536)
+                if not data:
+                    break
+                chunks.append(data)
+            stdin = b"".join(chunks)
+        self._delay(len(command) + len(stdin))
+        out, err, status = self.execute(command, stdin)
+        self._delay(len(out) + len(err))
+        if out:
+            channel.sendall(out.encode())
+        if err:
+            channel.sendall_stderr(err.encode())
+        channel.send_exit_status(status)
+        channel.close()
+
+    def _serve_shell(self, channel):
+        channel.sendall(b"Mock Libera LLRF\r\n# ")
+        buffer = ""
+        status = 0
+        while True:
+            data = channel.recv(65536)
+            if not data:
+                break
+            buffer += data.decode(errors="ignore")
+            while "\n" in buffer:
+                line, buffer = buffer.split("\n", 1)
+                line = line.rstrip("\r")
+                channel.sendall((line + "\r\n").encode())   # eco del tty
+                self._delay(len(line))
+                out, err, status = self.execute(line, last_status=status)
+                text = (out + err).replace("\n", "\r\n")
+                self._delay(len(text))
+                channel.sendall((text + "# ").encode())
+        channel.close()
+
+    # --- interprete ---
+
+    def execute(self, command_line, stdin=b"", last_status=0):
+        """Esegue una riga di comandi separati da ``;``, ``&&`` o ``||``: restituisce (out, err, status)."""
+        out, err, status = [], [], last_status
+        variables = {}
+        for sequence in re.split(";" + _OUTSIDE_QUOTES, command_line):
+            parts = re.split(r"(&&|\|\|)" + _OUTSIDE_QUOTES, sequence)
+            for i in range(0, len(parts), 2):
+                command = parts[i].strip()
+                operator = parts[i - 1] if i else None
+                if not command:
+                    continue
+                # a && b: b solo se a e' riuscito; a || b: b solo se a e' fallito
+                if (operator == "&&" and status != 0) or (operator == "||" and status == 0):
+                    continue
+                with self._lock:
+                    self.commands.append(command)
+                if re.fullmatch(r"exit \d+", command):
+                    return "".join(out), "".join(err), int(command.split()[1])
+                o, e, status = self._execute_one(command, stdin, status, variables)
+                out.append(o)
+                err.append(e)
+        return "".join(out), "".join(err), status
+
+    def _execute_one(self, command, stdin, last_status, variables=None):
+        if command.startswith("echo"):
+            words = shlex.split(command[4:].replace("$?", str(last_status)))
+            return " ".join(words) + "\n", "", 0
+        if command.startswith("command -v"):
+            name = command.split()[-1]
+            if name in ("gunzip", "libera-ireg"):
+                return f"/bin/{name}\n", "", 0
+            return "", "", 1
+        assigned = re.fullmatch(r"(\w+)=\$\(gunzip -c\)", command)
+        if assigned:
+            try:
+                variables[assigned.group(1)] = gzip.decompress(stdin).decode()
+            except OSError as e:
+                return "", f"gunzip: {e}\n", 1
+            return "", "", 0
+        words = command.split(None, 2)
+        if words[:1] != ["libera-ireg"] or len(words) < 3:
+            return "", f"sh: {words[0]}: not found\n", 127
+        if words[1] == "access":
+            return self._access(words[2].strip(), stdin, variables)
+        if words[1] == "dump":
+            return self._dump(words[2].strip())
+        return "", f"libera-ireg: unknown action {words[1]}\n", 1
+
+    def _access(self, assignment, stdin, variables=None):
+        if "=" not in assignment:
+            return self._dump(assignment)
+        path, value = assignment.split("=", 1)
+        value = value.strip()
+        if value == '"$(gunzip -c)"':
+            try:
+                value = gzip.decompress(stdin).decode()
+            except OSError as e:
+                return "", f"gunzip: {e}\n", 1
+        elif re.fullmatch(r'"\$\w+"', value):
+            value = (variables or {}).get(value[2:-1], "")
+        elif "'" in value or '"' in value:
+            value = "".join(shlex.split(value))     # quoting della shell, es. shlex.quote
+        ranged = re.fullmatch(r"(.+)\[(\d+):(\d+)\]", path)
+        with self._lock:
+            if ranged:
+                path, start, stop = ranged.group(1), int(ranged.group(2)), int(ranged.group(3))
+                if path not in self.registers:
+                    return "", f"libera-ireg: no such node {path}\n", 1
+                table = self.registers[path].split(",")
+                table[start:stop] = value.split(",")
+                self.registers[path] = ",".join(table)
+            elif path not in self.registers:
+                return "", f"libera-ireg: no such node {path}\n", 1
+            else:
+                self.registers[path] = value
+        return "", "", 0
+
+    def _dump(self, path):
+        with self._lock:
+            lines = [f"{key}={value}" for key, value in sorted(self.registers.items())
+                     if key == path or key.startswith(path + ".")]
+        if not lines:
+            return "", f"libera-ireg: no such node {path}\n", 1
+        return "\n".join(lines) + "\n", "", 0
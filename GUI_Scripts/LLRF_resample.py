@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Ricampionamento delle forme d'onda sulla griglia della tabella (4096 punti).
+
+Le griglie (indici e pesi) dipendono solo da lunghezza d'ingresso, lunghezza
+d'uscita, finestra e modo: vengono calcolate una volta e tenute in cache,
+quindi ricampionare costa un gather e poche operazioni vettoriali. Ogni
+funzione accetta un array 1D o una pila (..., N) di forme d'onda, ricampionate
+tutte nella stessa chiamata:
+
+    table = resample(wave, 4096)                          # = np.interp sulla griglia
+    tables = resample(candidates, 4096)                   # (200, N) → (200, 4096)
+    table = resample(capture, 4096, mode='sinc')          # cattura lunga, anti-aliasing
+    tables = to_table(candidates, 4096, start=0, stop=3000)   # zeri fuori dalla finestra
+
+Modi:
+    'linear'     interpolazione lineare, identica a np.interp(linspace(0, 1, M),
+                 linspace(0, 1, N), x) (default, nessun filtro)
+    'sinc'       sinc con finestra di Kaiser, taglio alla Nyquist dell'uscita
+                 quando si sottocampiona; rapporti oltre SINC_MAX_RATIO passano
+                 prima da una media a blocchi interi. Con scipy i pesi sono una
+                 matrice sparsa e la pila viene filtrata con un solo prodotto
+    'polyphase'  scipy.signal.resample_poly con fattori razionali (up, down);
+                 se i fattori sono troppo grandi il rapporto viene approssimato
+                 e l'ultimo passo (quasi 1:1) e' lineare
+"""
+import functools
+from fractions import Fraction
+
+import numpy as np
+
+RESAMPLE_MODES = ("linear", "sinc", "polyphase")
+SINC_ZEROS = 8               # zeri della sinc per lato (nell'unita' del campione d'uscita)
+SINC_BETA = 8.0              # parametro della finestra di Kaiser
+SINC_MAX_RATIO = 16          # oltre, media a blocchi prima della sinc
+POLYPHASE_MAX_FACTOR = 256
+PLAN_CACHE_SIZE = 64
+
+
+def _frozen(array):
+    array.flags.writeable = False
+    return array
+
+
+@functools.lru_cache(maxsize=PLAN_CACHE_SIZE)
+def unit_grid(length):
+    """np.linspace(0, 1, length) in sola lettura, calcolato una volta."""
+    return _frozen(np.linspace(0, 1, length))
+
+
+@functools.lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _linear_plan(n_in, n_out):
+    """(j, j1, dx, w): stessi passi di np.interp, cosi' il risultato e' identico bit per bit."""
+    xp, x = unit_grid(n_in), unit_grid(n_out)
+    j = np.clip(np.searchsorted(xp, x, side="right") - 1, 0, n_in - 1)
+    # oltre l'ultimo nodo np.interp restituisce l'ultimo valore: j1 = j, w = 0
+    j1 = np.minimum(j + 1, n_in - 1)
+    dx = np.where(j1 > j, xp[j1] - xp[j], 1.0)
+    w = np.where(j1 > j, x - xp[j], 0.0)
+    return _frozen(j), _frozen(j1), _frozen(dx), _frozen(w)
+
+
+def _linear(x, n_out):
+    n_in = x.shape[-1]
+    if n_in == 1:
+        return np.repeat(x, n_out, axis=-1)
+    j, j1, dx, w = _linear_plan(n_in, n_out)
+    y0 = np.take(x, j, axis=-1)
+    y = np.take(x, j1, axis=-1)
+    y -= y0
+    y /= dx
+    y *= w
+    y += y0
+    return y
+
+
+@functools.lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _sinc_plan(n_in, n_out):
+    """Indici (n_out, taps) e pesi normalizzati della sinc con finestra di Kaiser."""
+    ratio = (n_in - 1) / (n_out - 1) if n_out > 1 else 1.0
+    scale = max(ratio, 1.0)           # sottocampionamento: taglio alla Nyquist dell'uscita
+    half = SINC_ZEROS * scale
+    centers = np.arange(n_out) * ratio
+    first = np.floor(centers - half).astype(int)
+    taps = int(np.ceil(2 * half)) + 2
+    idx = first[:, None] + np.arange(taps)
+    t = (idx - centers[:, None]) / half
+    weights = np.sinc((idx - centers[:, None]) / scale)
+    weights *= np.i0(SINC_BETA * np.sqrt(np.clip(1 - t * t, 0, None))) / np.i0(SINC_BETA)
+    weights[np.abs(t) > 1] = 0
+    # guadagno in continua esatto anche ai bordi (campioni oltre i bordi = bordo)
+    weights /= weights.sum(axis=1, keepdims=True)
+    return _frozen(np.clip(idx, 0, n_in - 1)), _frozen(weights)
+
+
+@functools.lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _sinc_matrix(n_in, n_out):
+    """Il piano della sinc come matrice sparsa (n_out, n_in); None senza scipy."""
+    try:
+        from scipy import sparse
+    except ImportError:
+        return None
+    idx, weights = _sinc_plan(n_in, n_out)
+    rows = np.repeat(np.arange(n_out), idx.shape[1])
+    # gli indici ripetuti ai bordi vengono sommati
+    matrix = sparse.csr_matrix((weights.ravel(), (rows, idx.ravel())), shape=(n_out, n_in))
+    matrix.eliminate_zeros()
+    return matrix
+
+
+def _sinc(x, n_out):
+    n_in = x.shape[-1]
+    ratio = (n_in - 1) / max(n_out - 1, 1)
+    if ratio > SINC_MAX_RATIO:
+        # media a blocchi di q campioni: riduce i tap della sinc senza aliasing
+        # oltre il primo zero del blocco; l'ultimo blocco incompleto e' scartato
+        q = int(ratio // SINC_MAX_RATIO)
+        n_blocks = n_in // q
+        x = x[..., :n_blocks * q].reshape(x.shape[:-1] + (n_blocks, q)).mean(axis=-1)
+        n_in = n_blocks
+    if n_in == 1:
+        return np.repeat(x, n_out, axis=-1)
+    matrix = _sinc_matrix(n_in, n_out)
+    if matrix is None:
+        idx, weights = _sinc_plan(n_in, n_out)
+        return np.einsum("...ij,ij->...i", x[..., idx], weights)
+    flat = x.reshape(-1, n_in)
+    return np.asarray(matrix @ flat.T).T.reshape(x.shape[:-1] + (n_out,))
+
+
+@functools.lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _polyphase_factors(n_in, n_out):
+    ratio = Fraction(n_out - 1, n_in - 1)
+    if max(ratio.numerator, ratio.denominator) > POLYPHASE_MAX_FACTOR:
+        ratio = ratio.limit_denominator(POLYPHASE_MAX_FACTOR)
+    return ratio.numerator, ratio.denominator
+
+
+def _polyphase(x, n_out):
+    try:
+        from scipy.signal import resample_poly
+    except ImportError:
+        raise ImportError("mode='polyphase' requires scipy (use mode='sinc' otherwise)")
+    n_in = x.shape[-1]
+    if n_in < 2 or n_out < 2:
+        return _linear(x, n_out)
+    up, down = _polyphase_factors(n_in, n_out)
+    y = resample_poly(x, up, down, axis=-1, padtype="line")
+    # campione k di y alla posizione k*down/up dell'ingresso: con il rapporto
+    # esatto coincide con la griglia, altrimenti si riporta la griglia a n_out
+    # punti (ultimo passo quasi 1:1, gia' filtrato)
+    m = (n_in - 1) * up // down + 1
+    y = y[..., :m]
+    if m == n_out and Fraction(up, down) == Fraction(n_out - 1, n_in - 1):
+        return y
+    return _linear(y, n_out)
+
+
+_RESAMPLERS = {"linear": _linear, "sinc": _sinc, "polyphase": _polyphase}
+
+
+def resample(values, length, mode="linear"):
+    """
+    ``values`` (N,) o (..., N) su ``length`` punti equispaziati dal primo
+    all'ultimo campione; restituisce sempre un nuovo array (..., length).
+    """
+    if mode not in _RESAMPLERS:
+        raise ValueError(f"Unknown resample mode {mode!r} (expected one of {RESAMPLE_MODES})")
+    x = np.asarray(values, dtype=float)
+    if x.shape[-1] == 0:
+        raise ValueError("Cannot resample an empty waveform")
+    if x.shape[-1] == length and mode == "linear":
+        return x.copy()
+    return _RESAMPLERS[mode](x, int(length))
+
+
+def to_table(values, length, start=0, stop=None, mode="linear", fill=0.0):
+    """
+    Tabella di ``length`` punti con ``values`` ricampionati sugli indici
+    ``start:stop`` e ``fill`` altrove (come i *_AndTime); per una pila
+    restituisce una tabella per riga.
+    """
+    stop = length if stop is None else min(stop, length)
+    if not 0 <= start < stop:
+        raise ValueError(f"Empty table window [{start}:{stop}] for length {length}")
+    x = np.asarray(values, dtype=float)
+    table = np.full(x.shape[:-1] + (length,), float(fill))
+    table[..., start:stop] = resample(x, stop - start, mode)
+    return table
+
+
+def clear_cache():
+    """Svuota le griglie in cache (es. dopo scansioni con molte lunghezze diverse)."""
+    for cached in (unit_grid, _linear_plan, _sinc_plan, _sinc_matrix, _polyphase_factors):
+        cached.cache_clear()
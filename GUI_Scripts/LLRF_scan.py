@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+Scansioni di parametri ordinate per minimizzare le operazioni costose.
+
+Gli assi della griglia sono registri del feed-forward; ognuno ha un costo
+(upload di tabella >> intervallo > scrittura scalare). Gli assi costosi
+diventano i piu' esterni e la griglia viene percorsa a serpentina, quindi
+tra due punti consecutivi cambia un solo asse: una scansione 5 forme x
+20 ampiezze x 20 fasi carica 5 tabelle invece di 2000, e ogni punto invia
+solo i registri cambiati, in un'unica transazione.
+
+    scan = ParameterScan(conn, {
+        "max_amp": np.linspace(100, 1000, 20),
+        "phase": np.linspace(-90, 90, 20),
+        "shape": [np.loadtxt('Lintext_amp.txt'), 'capture.trc',      # array, Waveform, file
+                  {"kind": "flat_top", "t_start": 2, "t_end": 20, "level": 0.9,   # o forma di
+                   "droop": 0.1, "offset": 0, "duration": 34}],                # LLRF_shapes
+    }, dwell=0.2, measure=read_probe, checkpoint='scan.jsonl')
+    print(scan.plan())            # operazioni per asse nell'ordine scelto
+    results = scan.run()
+
+Mentre il punto corrente attende (``dwell``) la tabella del prossimo cambio
+di forma viene ricampionata e serializzata in un thread separato. Con
+``checkpoint`` ogni punto completato viene aggiunto a un file JSON lines:
+rilanciando la stessa scansione i punti gia' fatti vengono saltati e il
+primo punto eseguito riscrive tutti i registri. L'header del file contiene
+un digest dei valori di ogni asse (e del contenuto dei file di forma): un
+checkpoint di una scansione diversa viene rifiutato.
+
+Assi: max_amp, phase, offset, duration (scalari), shape / phase_shape
+(tabelle table_amp / table_phase). I valori scalari vengono controllati alla
+creazione (numeri finiti, fase entro LIMITS come in FF_Change_Phase).
+"""
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from LLRF_waveforms import as_waveform
+
+# asse → (registro relativo alla scheda, costo); le tabelle sono in dsp.ff_pulse_shape
+AXES = {
+    "shape": ("table_amp", 1000),
+    "phase_shape": ("table_phase", 1000),
+    "duration": ("feed_forward.duration", 2),
+    "offset": ("feed_forward.offset", 2),
+    "max_amp": ("dsp.ff_amp.amplitude", 1),
+    "phase": ("dsp.ff_phase.phase", 1),
+}
+TABLE_AXES = ("shape", "phase_shape")
+# limiti degli assi scalari, come nei metodi FF_Change_* (i valori vengono scritti direttamente)
+LIMITS = {"phase": (-400, 400)}
+
+
+def serpentine(sizes):
+    """Indici della griglia a serpentina: il primo asse e' il piu' esterno, tra due punti cambia un solo indice."""
+    if not sizes:
+        return [()]
+    inner = serpentine(sizes[1:])
+    points = []
+    for i in range(sizes[0]):
+        for rest in (inner if i % 2 == 0 else reversed(inner)):
+            points.append((i,) + rest)
+    return points
+
+
+def count_changes(points, naxes):
+    """Quante volte cambia ogni asse percorrendo ``points`` (il primo punto li scrive tutti)."""
+    changes = [0] * naxes
+    previous = None
+    for point in points:
+        for j in range(naxes):
+            if previous is None or point[j] != previous[j]:
+                changes[j] += 1
+        previous = point
+    return changes
+
+
+def _update_digest(h, value):
+    """Aggiunge a ``h`` il contenuto di un valore d'asse: numero, file, array, Waveform o forma."""
+    if isinstance(value, dict):
+        h.update(json.dumps(value, sort_keys=True, default=_jsonable).encode())
+    elif isinstance(value, str):
+        # file di forma: conta il contenuto, non solo il nome
+        h.update(value.encode())
+        with open(value, "rb") as f:
+            h.update(f.read())
+    elif hasattr(value, "values") and not isinstance(value, np.ndarray):
+        h.update(np.ascontiguousarray(value.values, dtype=float).tobytes())
+        if getattr(value, "time", None) is not None:
+            h.update(np.ascontiguousarray(value.time, dtype=float).tobytes())
+    else:
+        h.update(np.ascontiguousarray(value, dtype=float).tobytes())
+    h.update(b"|")
+
+
+def axes_digest(values):
+    """Digest dei valori di ogni asse, per riconoscere il checkpoint della stessa scansione."""
+    h = hashlib.blake2b(digest_size=16)
+    for axis in sorted(values):
+        h.update(axis.encode() + b":")
+        for value in values[axis]:
+            _update_digest(h, value)
+    return h.hexdigest()
+
+
+def _check_scalar_axis(axis, values):
+    """ValueError se un valore dell'asse non e' un numero finito o e' fuori da LIMITS."""
+    low, high = LIMITS.get(axis, (-np.inf, np.inf))
+    for value in values:
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Scan axis {axis}: {value!r} is not a number") from None
+        if not np.isfinite(number) or number < low or number > high:
+            raise ValueError(f"Scan axis {axis}: {value!r} outside [{low}, {high}]")
+
+
+def _jsonable(value):
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+class ParameterScan:
+    def __init__(self, conn, axes, dwell=0.0, measure=None, checkpoint=None, order=None):
+        unknown = set(axes) - set(AXES)
+        if unknown:
+            raise ValueError(f"Unknown scan axes {sorted(unknown)} (expected {sorted(AXES)})")
+        for axis, values in axes.items():
+            if axis not in TABLE_AXES:
+                _check_scalar_axis(axis, values)
+        self.conn = conn
+        self.dwell = dwell
+        self.measure = measure
+        self.checkpoint = checkpoint
+        # assi costosi all'esterno (ordinamento stabile rispetto a quello dato)
+        self.order = list(order) if order else sorted(axes, key=lambda a: -AXES[a][1])
+        self.values = {axis: list(axes[axis]) for axis in self.order}
+        self.points = serpentine([len(self.values[axis]) for axis in self.order])
+        self._tables = {}           # (asse, indice) → Future di (stringa, valori)
+        self._stop = False
+
+    def __len__(self):
+        return len(self.points)
+
+    # --- piano ---
+
+    def plan(self):
+        """Scritture per asse nell'ordine scelto, e upload se ogni punto rinviasse tutto."""
+        planned = count_changes(self.points, len(self.order))
+        tables = [axis for axis in self.order if axis in TABLE_AXES]
+        return {
+            "order": self.order,
+            "points": len(self.points),
+            "writes": dict(zip(self.order, planned)),
+            "table_uploads": sum(n for axis, n in zip(self.order, planned) if axis in TABLE_AXES),
+            "table_uploads_resend_all": len(self.points) * len(tables),
+        }
+
+    def label(self, axis, index):
+        """Valore dell'asse per i risultati: numero, nome del file o indice della forma."""
+        value = self.values[axis][index]
+        if axis in TABLE_AXES:
+            if isinstance(value, dict):
+                return value.get("name", index)
+            return value if isinstance(value, str) else index
+        return float(value)
+
+    def point(self, k):
+        return {axis: self.label(axis, i) for axis, i in zip(self.order, self.points[k])}
+
+    # --- tabelle ---
+
+    def _build_table(self, axis, index):
+        value = self.values[axis][index]
+        register = AXES[axis][0]
+        if isinstance(value, dict):
+            # forma di LLRF_shapes: {"kind": ..., parametri}, dalla cache delle forme
+            params = {k: v for k, v in value.items() if k not in ("kind", "name")}
+            values, table_string = self.conn._shape_table(value["kind"], register, **params)
+            return table_string, values
+        if isinstance(value, str):
+            from LLRF_loaders import load_waveform_file
+            value = load_waveform_file(value)
+        wave = as_waveform(value)
+        if axis == "shape" and (np.max(wave.values) > 1 or np.min(wave.values) < 0):
+            wave = wave.rescaled()   # come Set_Arbitrary_Shape; l'ampiezza e' un altro asse
+        values = wave.device_table(mode=getattr(self.conn, "resample_mode", "linear"))
+        return self.conn._format_table(values, register), values
+
+    def _prepare(self, pool, k, previous):
+        """Avvia la preparazione delle tabelle che cambiano passando da ``previous`` al punto ``k``."""
+        for j, (axis, i) in enumerate(zip(self.order, self.points[k])):
+            if axis not in TABLE_AXES or (previous is not None and previous[j] == i):
+                continue
+            if (axis, i) not in self._tables:
+                self._tables[(axis, i)] = pool.submit(self._build_table, axis, i)
+
+    # --- esecuzione ---
+
+    def _apply(self, k, previous):
+        point = self.points[k]
+        scalars = []
+        for j, (axis, i) in enumerate(zip(self.order, point)):
+            if previous is not None and previous[j] == i:
+                continue
+            register = AXES[axis][0]
+            if axis in TABLE_AXES:
+                table_string, values = self._tables.pop((axis, i)).result()
+                self.conn.upload_table(register, table_string, values)
+            else:
+                value = float(self.values[axis][i])
+                if axis == "offset" and value == 0:
+                    value = 0.03      # come FF_Change_Interval
+                scalars.append((f"{self.conn.board}.{register}", value))
+        if scalars:
+            with self.conn.transaction() as tx:
+                for path, value in scalars:
+                    tx.write(path, value)
+
+    def _load_checkpoint(self):
+        header = {"order": self.order, "sizes": [len(self.values[a]) for a in self.order],
+                  "digest": axes_digest(self.values)}
+        done = {}
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            with open(self.checkpoint) as f:
+                lines = [json.loads(line) for line in f if line.strip()]
+            if lines and lines[0].get("header") != header:
+                raise ValueError(f"{self.checkpoint} belongs to a different scan "
+                                 "(axes, sizes or values differ)")
+            done = {entry["index"]: entry for entry in lines[1:]}
+        elif self.checkpoint:
+            with open(self.checkpoint, "w") as f:
+                f.write(json.dumps({"header": header}) + "\n")
+        return done
+
+    def stop(self):
+        """Interrompe la scansione dopo il punto corrente (riprende dal checkpoint)."""
+        self._stop = True
+
+    def run(self, progress=None):
+        """
+        Esegue i punti mancanti; restituisce un dizionario per punto con i
+        valori degli assi, il risultato di ``measure(point)`` e il tempo.
+        ``progress(k, total, entry)`` viene chiamata dopo ogni punto.
+        """
+        self._stop = False
+        done = self._load_checkpoint()
+        results = [done[k] for k in sorted(done)]
+        todo = [k for k in range(len(self.points)) if k not in done]
+        log = open(self.checkpoint, "a") if self.checkpoint else None
+        previous = None
+        try:
+            with ThreadPoolExecutor(1, thread_name_prefix="llrf-scan") as pool:
+                if todo:
+                    self._prepare(pool, todo[0], None)
+                for n, k in enumerate(todo):
+                    start = time.perf_counter()
+                    self._apply(k, previous)
+                    previous = self.points[k]
+                    # la tabella del punto successivo si prepara durante l'attesa
+                    if n + 1 < len(todo):
+                        self._prepare(pool, todo[n + 1], previous)
+                    if self.dwell:
+                        time.sleep(self.dwell)
+                    point = self.point(k)
+                    entry = {"index": k, "point": point,
+                             "result": self.measure(point) if self.measure else None,
+                             "elapsed": time.perf_counter() - start}
+                    results.append(entry)
+                    if log:
+                        log.write(json.dumps(entry, default=_jsonable) + "\n")
+                        log.flush()
+                    if progress:
+                        progress(len(results), len(self.points), entry)
+                    if self._stop:
+                        break
+        finally:
+            self._tables.clear()
+            if log:
+                log.close()
+        return results
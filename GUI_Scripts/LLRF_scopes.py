@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Lettori dei formati binari degli oscilloscopi, senza passare dal testo.
+
+Ogni lettore interpreta l'intestazione e mappa in memoria (np.memmap) il
+blocco dei campioni grezzi; il risultato e' uno ScopeTrace con i campioni
+interi come vista sul file, la scala verticale e la base dei tempi:
+
+    trace = read_scope('C1--pulse--00000.trc')
+    trace.raw                  # memmap int8/int16, nessuna copia
+    trace.values()             # raw * gain + offset [V]
+    trace.time_us()            # t0 + i * dt [µs]
+    wave = trace.waveform(max_points=4096)   # Waveform (valore, tempo in µs)
+
+Con ``max_points`` vengono letti solo i campioni necessari all'interpolazione
+(la scala e' affine, quindi si interpola direttamente sui valori grezzi).
+
+Formati:
+    .trc   LeCroy (blocco WAVEDESC, anche con intestazione SCPI "#9...")
+    .isf   Tektronix (preambolo WFMPRE + CURVE #<n><len>)
+    .wfm   Tektronix WFM#003 (solo il primo frame; le versioni #001/#002 non sono supportate)
+    .bin   campioni grezzi senza intestazione; dtype e scala da un file
+           <nome>.bin.json opzionale, es. {"dtype": "<i2", "dt": 4e-9, "t0": 0,
+           "gain": 1e-3, "offset": 0, "header_bytes": 0, "channels": 1, "channel": 0}.
+           Senza "dt" la base dei tempi e' quella implicita di 34 µs (file 1D).
+"""
+import json
+import os
+import re
+import struct
+
+import numpy as np
+
+from LLRF_waveforms import Waveform
+
+
+class ScopeTrace:
+    __slots__ = ("raw", "gain", "offset", "t0", "dt", "source")
+
+    def __init__(self, raw, gain=1.0, offset=0.0, t0=0.0, dt=None, source=None):
+        self.raw = raw           # campioni grezzi (memmap)
+        self.gain = float(gain)
+        self.offset = float(offset)
+        self.t0 = float(t0)      # [s]
+        self.dt = dt             # [s]; None = base dei tempi implicita
+        self.source = source
+
+    def __len__(self):
+        return self.raw.shape[0]
+
+    def _scale(self, raw):
+        if self.gain == 1.0 and self.offset == 0.0 and raw.dtype.kind == "f":
+            return raw
+        return raw * self.gain + self.offset
+
+    def values(self):
+        """Valori fisici; per campioni float senza scala e' la vista sul file."""
+        return self._scale(self.raw)
+
+    def time_us(self, positions=None):
+        if self.dt is None:
+            return None
+        if positions is None:
+            positions = np.arange(len(self))
+        return (self.t0 + positions * self.dt) * 1e6
+
+    def waveform(self, max_points=None):
+        n = len(self)
+        if max_points and n > max_points:
+            # come Waveform.resampled, ma leggendo dal memmap solo gli indici necessari
+            positions = np.linspace(0, n - 1, max_points)
+            i0 = np.minimum(positions.astype(int), n - 2)
+            frac = positions - i0
+            raw = self.raw[i0] * (1 - frac) + self.raw[i0 + 1] * frac
+            return Waveform(self._scale(raw), self.time_us(positions))
+        return Waveform(self.values(), self.time_us())
+
+
+def _memmap(path, dtype, offset, count):
+    if count <= 0:
+        raise ValueError(f"{os.path.basename(path)}: no samples")
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+
+
+# --- LeCroy .trc ---
+
+def read_lecroy_trc(path):
+    with open(path, "rb") as f:
+        head = f.read(4096)
+    start = head.find(b"WAVEDESC")
+    if start < 0:
+        raise ValueError(f"{os.path.basename(path)}: WAVEDESC block not found")
+    endian = "<" if struct.unpack_from("<h", head, start + 34)[0] == 1 else ">"
+
+    def field(fmt, pos):
+        return struct.unpack_from(endian + fmt, head, start + pos)[0]
+
+    comm_type = field("h", 32)                      # 0 = byte, 1 = word
+    wave_descriptor, user_text = field("l", 36), field("l", 40)
+    trigtime, ris_time, res_array1 = field("l", 48), field("l", 52), field("l", 56)
+    wave_array_1 = field("l", 60)
+    first_valid = field("l", 124)
+    gain, voffset = field("f", 156), field("f", 160)
+    dt, t0 = field("f", 176), field("d", 180)
+    dtype = np.dtype(endian + ("i2" if comm_type == 1 else "i1"))
+    data = start + wave_descriptor + user_text + trigtime + ris_time + res_array1
+    count = wave_array_1 // dtype.itemsize
+    raw = _memmap(path, dtype, data, count)[first_valid:]
+    return ScopeTrace(raw, gain=gain, offset=-voffset, t0=t0 + first_valid * dt, dt=dt, source=path)
+
+
+# --- Tektronix .isf ---
+
+_ISF_KEYS = {  # prefisso (forma breve) → nome
+    "BYT_N": "bytes", "BYT_O": "order", "BN_F": "format", "ENC": "encoding", "NR_P": "points",
+    "XIN": "xincr", "XZE": "xzero", "PT_O": "pt_off", "YMU": "ymult", "YOF": "yoff", "YZE": "yzero",
+}
+
+
+def read_tek_isf(path):
+    with open(path, "rb") as f:
+        head = f.read(4096)
+    curve = re.search(rb"CURV[E]?\s+#(\d)", head)
+    if not curve:
+        raise ValueError(f"{os.path.basename(path)}: CURVE block not found")
+    ndigits = int(curve.group(1))
+    nbytes = int(head[curve.end():curve.end() + ndigits])
+    data = curve.end() + ndigits
+    preamble = {}
+    for item in head[:curve.start()].decode("ascii", "replace").split(";"):
+        parts = item.strip().split(None, 1)
+        if len(parts) != 2:
+            continue
+        key = parts[0].split(":")[-1].upper()
+        for prefix, name in _ISF_KEYS.items():
+            if key.startswith(prefix):
+                preamble[name] = parts[1].strip().strip('"')
+    if preamble.get("encoding", "BIN").upper().startswith("ASC"):
+        raise ValueError(f"{os.path.basename(path)}: ASCII-encoded .isf is not supported")
+    width = int(preamble.get("bytes", 2))
+    endian = "<" if preamble.get("order", "MSB").upper().startswith("LSB") else ">"
+    kind = "u" if preamble.get("format", "RI").upper() == "RP" else "i"
+    dtype = np.dtype(f"{endian}{kind}{width}")
+    raw = _memmap(path, dtype, data, nbytes // width)
+    ymult, yoff, yzero = (float(preamble.get(k, d)) for k, d in (("ymult", 1), ("yoff", 0), ("yzero", 0)))
+    xincr, xzero = float(preamble.get("xincr", 1)), float(preamble.get("xzero", 0))
+    pt_off = float(preamble.get("pt_off", 0))
+    return ScopeTrace(raw, gain=ymult, offset=yzero - yoff * ymult,
+                      t0=xzero - pt_off * xincr, dt=xincr, source=path)
+
+
+# --- Tektronix .wfm ---
+
+_WFM_FORMATS = {0: "i2", 1: "i4", 2: "u4", 3: "u8", 4: "f4", 5: "f8", 6: "u1", 7: "i1"}
+
+
+def read_tek_wfm(path):
+    with open(path, "rb") as f:
+        head = f.read(838)
+    if len(head) < 838:
+        raise ValueError(f"{os.path.basename(path)}: truncated .wfm header")
+    endian = "<" if head[:2] == b"\x0f\x0f" else ">"
+    version = head[2:10]
+    if version != b":WFM#003":
+        raise ValueError(f"{os.path.basename(path)}: unsupported .wfm version {version!r} (only WFM#003)")
+
+    def field(fmt, pos):
+        return struct.unpack_from(endian + fmt, head, pos)[0]
+
+    curve_buffer = field("i", 16)
+    vscale, voffset = field("d", 168), field("d", 176)
+    fmt = field("i", 240)
+    tscale, tstart = field("d", 488), field("d", 496)
+    data_start, postcharge_start = field("I", 826), field("I", 830)
+    if fmt not in _WFM_FORMATS:
+        raise ValueError(f"{os.path.basename(path)}: unknown sample format {fmt}")
+    dtype = np.dtype(endian + _WFM_FORMATS[fmt])
+    count = (postcharge_start - data_start) // dtype.itemsize
+    raw = _memmap(path, dtype, curve_buffer + data_start, count)
+    return ScopeTrace(raw, gain=vscale, offset=voffset, t0=tstart, dt=tscale, source=path)
+
+
+# --- raw .bin ---
+
+def read_raw_bin(path, dtype="<f8", dt=None, t0=0.0, gain=1.0, offset=0.0,
+                 header_bytes=0, channels=1, channel=0):
+    sidecar = path + ".json"
+    if os.path.exists(sidecar):
+        with open(sidecar) as f:
+            spec = json.load(f)
+        dtype = spec.get("dtype", dtype)
+        dt, t0 = spec.get("dt", dt), spec.get("t0", t0)
+        gain, offset = spec.get("gain", gain), spec.get("offset", offset)
+        header_bytes = spec.get("header_bytes", header_bytes)
+        channels, channel = spec.get("channels", channels), spec.get("channel", channel)
+    dtype = np.dtype(dtype)
+    count = (os.path.getsize(path) - header_bytes) // dtype.itemsize // channels
+    raw = _memmap(path, dtype, header_bytes, count * channels)
+    if channels > 1:
+        raw = raw.reshape(count, channels)[:, channel]   # vista con stride, nessuna copia
+    return ScopeTrace(raw, gain=gain, offset=offset, t0=t0, dt=dt, source=path)
+
+
+SCOPE_READERS = {
+    ".trc": read_lecroy_trc,
+    ".isf": read_tek_isf,
+    ".wfm": read_tek_wfm,
+    ".bin": read_raw_bin,
+}
+
+
+def is_scope_file(path):
+    return os.path.splitext(path)[1].lower() in SCOPE_READERS
+
+
+def read_scope(path):
+    """ScopeTrace dal lettore scelto in base all'estensione."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in SCOPE_READERS:
+        raise ValueError(f"Unknown scope format {ext!r}")
+    return SCOPE_READERS[ext](path)
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Libreria di forme d'impulso sulla base dei tempi della tabella.
+
+Ogni forma e' valutata sui 4096 campioni della finestra del feed-forward
+(np.linspace(offset, offset + duration, 4096), come Single_ramp), con i
+tempi in µs assoluti e zero fuori dalla parte attiva. I parametri scalari
+possono essere array: la forma viene generata per tutte le combinazioni
+(broadcast) in un'unica chiamata, una tabella per riga:
+
+    table = generate('raised_cosine', t_start=2, t_end=20, level=0.8, rise=1.5,
+                     offset=0, duration=34)
+    tables = generate('flat_top', t_start=2, t_end=20, level=0.8,
+                      droop=np.linspace(0, 0.2, 50), offset=0, duration=34)   # (50, 4096)
+
+cached_table() memorizza in una cache LRU la tabella (in sola lettura) e la
+stringa del comando gia' serializzata, indicizzate dai parametri: rigenerare
+la stessa forma in una scansione o in una preview non costa nulla.
+
+    values, table_string = cached_table('spline', times=(2, 8, 14, 20),
+                                        values=(0, 0.9, 1.0, 0), offset=0, duration=34)
+
+Forme:
+    single_ramp       rampa di Single_ramp (pendenza riferita all'inizio della finestra)
+    piecewise_linear  spezzata per i punti (times, values)
+    multi_ramp        segmenti (t0, t1, v0, v1) consecutivi o separati
+    exponential       v_end + (v_start - v_end) exp(-(t - t_start) / tau)
+    cavity_fill       sovra-pilotaggio per riempire la cavita' (costante tau) in t_fill, poi level
+    raised_cosine     piatto con fronti a coseno rialzato (rise / fall)
+    flat_top          piatto con compensazione lineare del droop (e fronti lineari)
+    spline            spline cubica naturale per i punti (times, values)
+"""
+import functools
+
+import numpy as np
+
+from LLRF_tables import format_table
+from LLRF_waveforms import DEVICE_TABLE_LENGTH
+
+SHAPE_CACHE_SIZE = 256
+
+
+@functools.lru_cache(maxsize=16)
+def _index(length):
+    index = np.arange(length, dtype=float)
+    index.flags.writeable = False
+    return index
+
+
+def timebase(offset, duration, length=DEVICE_TABLE_LENGTH):
+    """np.linspace(offset, offset + duration, length) anche per offset/duration array (..., length)."""
+    offset = np.asarray(offset, dtype=float)[..., None]
+    stop = offset + np.asarray(duration, dtype=float)[..., None]
+    t = _index(length) * ((stop - offset) / (length - 1)) + offset
+    t[..., -1] = stop[..., 0]
+    return t
+
+
+def _col(*params):
+    """Parametri in broadcast, con un asse finale per i campioni."""
+    return [p[..., None] for p in np.broadcast_arrays(*(np.asarray(p, dtype=float) for p in params))]
+
+
+def _window(t, t_start, t_end, values):
+    return np.where((t >= t_start) & (t <= t_end), values, 0.0)
+
+
+def _edge(x, width):
+    """Frazione 0..1 di un fronte largo ``width`` a distanza ``x`` dal suo inizio (gradino se width = 0)."""
+    return np.where(width > 0, np.clip(x / np.where(width > 0, width, 1.0), 0, 1), 1.0)
+
+
+# --- forme ---
+
+def single_ramp(init_t, final_t, init_amp, final_amp, offset, duration, length=DEVICE_TABLE_LENGTH):
+    init_t, final_t, init_amp, final_amp, offset, duration = _col(
+        init_t, final_t, init_amp, final_amp, offset, duration)
+    t = timebase(offset[..., 0], duration[..., 0], length)
+    slope = (final_amp - init_amp) / (final_t - init_t)
+    return _window(t, init_t, final_t, slope * (t - offset) + init_amp)
+
+
+def piecewise_linear(times, values, offset, duration, length=DEVICE_TABLE_LENGTH):
+    """``times`` (K,) crescenti, ``values`` (..., K): una spezzata per riga."""
+    times = np.asarray(times, dtype=float)
+    values = np.asarray(values, dtype=float)
+    t = timebase(offset, duration, length)
+    j = np.clip(np.searchsorted(times, t, side="right") - 1, 0, len(times) - 2)
+    frac = (t - times[j]) / (times[j + 1] - times[j])
+    y = values[..., j] * (1 - frac) + values[..., j + 1] * frac
+    return _window(t, times[0], times[-1], y)
+
+
+def multi_ramp(segments, offset, duration, length=DEVICE_TABLE_LENGTH):
+    """``segments``: sequenza di (t0, t1, v0, v1); i segmenti successivi prevalgono sulle sovrapposizioni."""
+    t = timebase(offset, duration, length)
+    y = np.zeros(t.shape)
+    for t0, t1, v0, v1 in segments:
+        t0, t1, v0, v1 = _col(t0, t1, v0, v1)
+        inside = (t >= t0) & (t <= t1)
+        y = np.where(inside, v0 + (v1 - v0) * (t - t0) / (t1 - t0), y)
+    return y
+
+
+def exponential(t_start, t_end, v_start, v_end, tau, offset, duration, length=DEVICE_TABLE_LENGTH):
+    t_start, t_end, v_start, v_end, tau = _col(t_start, t_end, v_start, v_end, tau)
+    t = timebase(offset, duration, length)
+    return _window(t, t_start, t_end, v_end + (v_start - v_end) * np.exp(-(t - t_start) / tau))
+
+
+def cavity_fill(t_start, t_fill, t_end, level, tau, offset, duration, length=DEVICE_TABLE_LENGTH):
+    """
+    Pilotaggio a gradino compensato: durante ``t_fill`` il livello e'
+    level / (1 - exp(-t_fill / tau)), cosi' una cavita' con costante di tempo
+    ``tau`` arriva a ``level`` alla fine del riempimento; poi resta a ``level``.
+    """
+    t_start, t_fill, t_end, level, tau = _col(t_start, t_fill, t_end, level, tau)
+    t = timebase(offset, duration, length)
+    overdrive = level / -np.expm1(-t_fill / tau)
+    return _window(t, t_start, t_end, np.where(t < t_start + t_fill, overdrive, level))
+
+
+def raised_cosine(t_start, t_end, level, rise, fall=None, offset=0.0, duration=34.0,
+                  length=DEVICE_TABLE_LENGTH):
+    fall = rise if fall is None else fall
+    t_start, t_end, level, rise, fall = _col(t_start, t_end, level, rise, fall)
+    t = timebase(offset, duration, length)
+    up = _edge(t - t_start, rise)
+    down = _edge(t_end - t, fall)
+    edge = 0.25 * (1 - np.cos(np.pi * up)) * (1 - np.cos(np.pi * down))
+    return _window(t, t_start, t_end, level * edge)
+
+
+def flat_top(t_start, t_end, level, droop, rise=0.0, offset=0.0, duration=34.0,
+             length=DEVICE_TABLE_LENGTH):
+    """
+    Piatto che sale linearmente di ``droop`` (frazione di ``level``) tra fine
+    fronte e fine impulso, per compensare il calo del campo; fronti lineari di ``rise``.
+    """
+    t_start, t_end, level, droop, rise = _col(t_start, t_end, level, droop, rise)
+    t = timebase(offset, duration, length)
+    top_start = t_start + rise
+    slope_in = _edge(t - t_start, rise)
+    compensation = 1 + droop * np.clip((t - top_start) / (t_end - top_start), 0, 1)
+    return _window(t, t_start, t_end, level * slope_in * compensation)
+
+
+@functools.lru_cache(maxsize=64)
+def _spline_matrix(times):
+    """Matrice (K, K) che porta i valori nei nodi alle derivate seconde (spline naturale)."""
+    x = np.array(times)
+    k = len(x)
+    h = np.diff(x)
+    a = np.zeros((k, k))
+    b = np.zeros((k, k))
+    a[0, 0] = a[-1, -1] = 1.0
+    for i in range(1, k - 1):
+        a[i, i - 1], a[i, i], a[i, i + 1] = h[i - 1], 2 * (h[i - 1] + h[i]), h[i]
+        b[i, i - 1], b[i, i], b[i, i + 1] = 6 / h[i - 1], -6 / h[i - 1] - 6 / h[i], 6 / h[i]
+    matrix = np.linalg.solve(a, b)
+    matrix.flags.writeable = False
+    return matrix
+
+
+def spline(times, values, offset, duration, length=DEVICE_TABLE_LENGTH):
+    """Spline cubica naturale per ``times`` (K,) e ``values`` (..., K), zero fuori dai nodi."""
+    times = np.asarray(times, dtype=float)
+    values = np.asarray(values, dtype=float)
+    if len(times) < 3:
+        return piecewise_linear(times, values, offset, duration, length)
+    m = values @ _spline_matrix(tuple(times.tolist())).T        # derivate seconde (..., K)
+    t = timebase(offset, duration, length)
+    j = np.clip(np.searchsorted(times, t, side="right") - 1, 0, len(times) - 2)
+    h = times[j + 1] - times[j]
+    a = (times[j + 1] - t) / h
+    b = (t - times[j]) / h
+    y = (a * values[..., j] + b * values[..., j + 1]
+         + ((a ** 3 - a) * m[..., j] + (b ** 3 - b) * m[..., j + 1]) * h * h / 6)
+    return _window(t, times[0], times[-1], y)
+
+
+SHAPES = {
+    "single_ramp": single_ramp,
+    "piecewise_linear": piecewise_linear,
+    "multi_ramp": multi_ramp,
+    "exponential": exponential,
+    "cavity_fill": cavity_fill,
+    "raised_cosine": raised_cosine,
+    "flat_top": flat_top,
+    "spline": spline,
+}
+
+
+def generate(kind, **params):
+    """Forma ``kind`` (vettoriale, senza cache): (length,) o (..., length) con parametri array."""
+    try:
+        shape = SHAPES[kind]
+    except KeyError:
+        raise ValueError(f"Unknown shape {kind!r} (expected one of {sorted(SHAPES)})")
+    return shape(**params)
+
+
+def _freeze(value):
+    """Parametri hashabili per la cache (array e liste → tuple)."""
+    if isinstance(value, np.ndarray):
+        value = value.tolist()
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+@functools.lru_cache(maxsize=SHAPE_CACHE_SIZE)
+def _cached(kind, frozen, resolution):
+    values = generate(kind, **dict(frozen))
+    if values.ndim != 1:
+        raise ValueError("cached_table generates a single table: use generate() for batches")
+    values.flags.writeable = False
+    return values, format_table(values, resolution=resolution)
+
+
+def cached_table(kind, resolution=None, **params):
+    """
+    (tabella in sola lettura, stringa serializzata) per una forma, in cache LRU
+    per (kind, parametri, resolution); ``resolution`` come in format_table.
+    """
+    frozen = tuple(sorted((name, _freeze(value)) for name, value in params.items()))
+    return _cached(kind, frozen, resolution)
+
+
+def cache_info():
+    return _cached.cache_info()
+
+
+def clear_cache():
+    _cached.cache_clear()
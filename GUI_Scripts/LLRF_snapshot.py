@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+Snapshot dell'intero sottoalbero della scheda, confronto e ripristino minimo.
+
+Snapshot.capture() legge tutti i registri di ``boards.kupvm1`` (o di un altro
+sottoalbero) con un solo ``libera-ireg dump`` e li conserva come stringhe,
+con origine e ora; save() li scrive in JSON compresso (gzip). diff() confronta
+due snapshot (o uno snapshot e il dispositivo, catturato al momento) e
+restore() scrive solo i registri diversi e scrivibili (di default quelli del
+feed-forward, RESTORE_PREFIXES): gli scalari concatenati in transazioni da
+RESTORE_BATCH scritture (un round trip ciascuna), le tabelle con
+upload_table; alla fine il dispositivo viene riletto e le differenze
+rimaste vengono riportate.
+
+    snap = Snapshot.capture(conn)
+    snap.save()                                  # boards.kupvm1_20250101-120000.json.gz
+    ...
+    before = Snapshot.load('boards.kupvm1_20250101-120000.json.gz')
+    print(format_diff(diff(before, Snapshot.capture(conn))))
+    report = restore(conn, before)               # solo le differenze
+    report['errors'], report['remaining']        # scritture rifiutate, differenze rimaste
+
+    python LLRF_snapshot.py save --ip 192.168.0.109 [-o file]
+    python LLRF_snapshot.py diff before.json.gz after.json.gz
+    python LLRF_snapshot.py diff before.json.gz --ip 192.168.0.109   # contro il dispositivo
+    python LLRF_snapshot.py restore before.json.gz --ip 192.168.0.109 [--dry-run] [--include dsp.ff_amp]
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import shlex
+import sys
+import time
+
+import numpy as np
+
+from LLRF_tables import parse_table
+
+SNAPSHOT_FORMAT = 1
+COMPRESS_LEVEL = 6
+# Scritture scalari concatenate in un solo comando durante il ripristino
+RESTORE_BATCH = 50
+# Registri caricati con upload_table invece che con una scrittura scalare
+TABLE_REGISTERS = ("table_amp", "table_phase")
+# Registri (relativi alla scheda) che restore() scrive di default: quelli che
+# LLRFConnection configura; lo stato e i contatori della scheda restano esclusi
+RESTORE_PREFIXES = ("dsp.ff_pulse_shape", "dsp.ff_amp", "dsp.ff_phase", "feed_forward")
+SHORT_VALUE = 40
+# Tabella ripristinabile: solo numeri e virgole (il valore finisce non quotato nel comando)
+PLAIN_TABLE = re.compile(r"[0-9eE+\-.,]+")
+
+
+class Snapshot:
+    """Valori (stringhe come nel dump) dei registri di un sottoalbero, con origine e ora."""
+
+    def __init__(self, registers, root, host=None, taken=None):
+        self.registers = dict(registers)
+        self.root = root
+        self.host = host
+        self.taken = time.time() if taken is None else taken
+
+    @classmethod
+    def capture(cls, conn, root=None):
+        """Legge il sottoalbero ``root`` (default la scheda della connessione) con un solo dump."""
+        from LLRF import parse_register_dump
+        root = root or conn.board
+        out, _ = conn.run_command(f"libera-ireg dump {root}")
+        registers = {path: value for path, value in parse_register_dump(out).items()
+                     if path == root or path.startswith(root + ".")}
+        if not registers:
+            raise RuntimeError(f"Empty dump for {root}")
+        return cls(registers, root, conn.ip)
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, "rt") as f:
+            data = json.load(f)
+        if data.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"{path}: unsupported snapshot format {data.get('format')!r}")
+        return cls(data["registers"], data["root"], data.get("host"), data["taken"])
+
+    def save(self, path=None):
+        """Scrive lo snapshot (JSON gzip) e restituisce il percorso usato."""
+        path = path or self.default_filename()
+        data = {"format": SNAPSHOT_FORMAT, "root": self.root, "host": self.host,
+                "taken": self.taken, "registers": self.registers}
+        tmp = path + ".tmp"
+        with gzip.open(tmp, "wt", compresslevel=COMPRESS_LEVEL) as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+        return path
+
+    def default_filename(self):
+        return f"{self.root}_{time.strftime('%Y%m%d-%H%M%S', time.localtime(self.taken))}.json.gz"
+
+    def __len__(self):
+        return len(self.registers)
+
+    def __repr__(self):
+        taken = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.taken))
+        return f"<Snapshot {self.root} from {self.host} at {taken}: {len(self)} registers>"
+
+
+def _numeric(value):
+    try:
+        return parse_table(value)
+    except ValueError:
+        return None
+
+
+def _same(a, b):
+    """Stesso valore: stringhe uguali o stessi numeri ("1" e "1.000000")."""
+    if a == b:
+        return True
+    if a is None or b is None:
+        return False
+    x, y = _numeric(a), _numeric(b)
+    return x is not None and y is not None and np.array_equal(x, y)
+
+
+def diff(old, new):
+    """
+    Registri diversi tra due snapshot: ``{path: (valore in old, valore in new)}``,
+    None per i registri presenti in uno solo dei due.
+    """
+    paths = sorted(set(old.registers) | set(new.registers))
+    return {path: (old.registers.get(path), new.registers.get(path)) for path in paths
+            if not _same(old.registers.get(path), new.registers.get(path))}
+
+
+def _short(value):
+    if value is None:
+        return "(missing)"
+    return value if len(value) <= SHORT_VALUE else f"{value[:SHORT_VALUE]}... ({value.count(',') + 1} values)"
+
+
+def format_diff(changes):
+    """Righe leggibili di un diff; per le tabelle il numero di campioni diversi."""
+    lines = []
+    for path, (a, b) in changes.items():
+        x = None if a is None else _numeric(a)
+        y = None if b is None else _numeric(b)
+        if x is not None and y is not None and x.size == y.size and x.size > 1:
+            delta = np.abs(x - y)
+            lines.append(f"{path}: {int(np.count_nonzero(delta))} of {x.size} samples differ "
+                         f"(max {np.nanmax(delta):.6g})")
+        else:
+            lines.append(f"{path}: {_short(a)} → {_short(b)}")
+    return "\n".join(lines) if lines else "No differences"
+
+
+def _selector(root, include):
+    """Filtro dei path da ripristinare: prefissi relativi a ``root``, funzione path → bool o None (tutti)."""
+    if include is None:
+        return lambda path: True
+    if callable(include):
+        return include
+    prefixes = tuple(f"{root}.{prefix}" for prefix in include)
+    return lambda path: any(path == p or path.startswith(p + ".") for p in prefixes)
+
+
+def restore(conn, snapshot, dry_run=False, include=RESTORE_PREFIXES):
+    """
+    Riporta il dispositivo allo stato di ``snapshot`` scrivendo solo i registri
+    selezionati da ``include`` e diversi da quelli attuali (letti con un dump).
+    Gli scalari partono quotati (shlex.quote) in transazioni da RESTORE_BATCH
+    scritture, le tabelle con upload_table solo se contengono soltanto numeri e
+    virgole; i registri che il dispositivo non ha piu' vengono ignorati. Restituisce {'changes': differenze da applicare, 'errors':
+    path → errore del dispositivo, 'remaining': differenze ancora presenti
+    dopo il ripristino (None con ``dry_run``)}.
+    """
+    selected = _selector(snapshot.root, include)
+    live = Snapshot.capture(conn, snapshot.root)
+    changes = {path: values for path, values in diff(live, snapshot).items()
+               if values[0] is not None and values[1] is not None and selected(path)}
+    missing = sorted(path for path in set(snapshot.registers) - set(live.registers) if selected(path))
+    if missing:
+        print(f"Not on the device, skipped: {missing}")
+    report = {"changes": changes, "errors": {}, "remaining": None}
+    if dry_run:
+        return report
+    if not changes:
+        report["remaining"] = {}
+        return report
+
+    table_prefix = f"{conn.board}.dsp.ff_pulse_shape."
+    scalars, tables = [], []
+    for path, (_, value) in changes.items():
+        register = path[len(table_prefix):] if path.startswith(table_prefix) else None
+        if register in TABLE_REGISTERS:
+            if PLAIN_TABLE.fullmatch(value):
+                tables.append((path, register, value))
+            else:
+                report["errors"][path] = "not a plain numeric table in the snapshot, not restored"
+        else:
+            # i valori arrivano alla shell del dispositivo: sempre quotati
+            scalars.append((path, shlex.quote(value)))
+
+    for start in range(0, len(scalars), RESTORE_BATCH):
+        with conn.transaction(use_cache=False) as tx:
+            for path, value in scalars[start:start + RESTORE_BATCH]:
+                tx.write(path, value)
+        report["errors"].update(tx.errors)
+    for path, register, value in tables:
+        # il digest dell'ultimo upload non descrive piu' il dispositivo
+        conn.uploaded_tables.pop(register, None)
+        conn.upload_table(register, value, parse_table(value))
+        if conn.last_upload.get("error"):
+            report["errors"][path] = conn.last_upload["error"]
+    if conn.cache is not None:
+        conn.cache.invalidate()
+
+    # verifica: quello che differisce ancora dopo il ripristino
+    after = Snapshot.capture(conn, snapshot.root)
+    report["remaining"] = {path: values for path, values in diff(after, snapshot).items()
+                           if path in changes}
+    batches = -(-len(scalars) // RESTORE_BATCH)
+    print(f"Restore: {len(changes)} registers to write ({len(scalars)} scalar in {batches} round trips, "
+          f"{len(tables)} tables), {len(report['errors'])} rejected, "
+          f"{len(report['remaining'])} still different")
+    for path, error in report["errors"].items():
+        print(f"  {path}: {error}")
+    return report
+
+
+def _connect(args):
+    from LLRF import LLRFConnection
+    password = args.password or os.environ.get("LLRF_PASSWORD")
+    if password is None:
+        from getpass import getpass
+        password = getpass(f"Password for {args.user}@{args.ip}: ")
+    extra = {"board": args.board} if args.board else {}
+    conn = LLRFConnection(args.ip, args.user, password, port=args.port, **extra)
+    conn.connect()
+    return conn
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("action", choices=("save", "diff", "restore"))
+    parser.add_argument("snapshots", nargs="*", help="snapshot files (.json.gz)")
+    parser.add_argument("-o", "--output", help="snapshot file to write (save)")
+    parser.add_argument("--ip", help="device address (diff against the live device, save, restore)")
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", help="SSH password (default: $LLRF_PASSWORD or prompt)")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--board", help="board subtree (default boards.kupvm1)")
+    parser.add_argument("--dry-run", action="store_true", help="restore: only print the differences")
+    parser.add_argument("--include", action="append", metavar="PREFIX",
+                        help="restore: board-relative register prefix to restore (repeatable, "
+                             f"default {', '.join(RESTORE_PREFIXES)})")
+    parser.add_argument("--all", action="store_true", help="restore: every register of the snapshot")
+    args = parser.parse_args(argv)
+
+    needs_device = args.action != "diff" or len(args.snapshots) < 2
+    expected = {"save": 0, "diff": 1 if args.ip else 2, "restore": 1}[args.action]
+    if len(args.snapshots) != expected or (needs_device and not args.ip):
+        parser.error(f"{args.action}: expected {expected} snapshot file(s)"
+                     + (" and --ip" if needs_device else ""))
+
+    conn = _connect(args) if needs_device else None
+    try:
+        if args.action == "save":
+            snap = Snapshot.capture(conn)
+            print(f"{snap} → {snap.save(args.output)}")
+        elif args.action == "diff":
+            old = Snapshot.load(args.snapshots[0])
+            new = Snapshot.load(args.snapshots[1]) if conn is None else Snapshot.capture(conn)
+            print(format_diff(diff(old, new)))
+        else:
+            include = None if args.all else (args.include or RESTORE_PREFIXES)
+            report = restore(conn, Snapshot.load(args.snapshots[0]), dry_run=args.dry_run, include=include)
+            print(format_diff(report["changes"] if args.dry_run else report["remaining"]))
+            if report["errors"] or report["remaining"]:
+                return 1
+    finally:
+        if conn is not None:
+            conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
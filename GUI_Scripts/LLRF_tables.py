@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Serializzazione vettoriale delle tabelle ff_pulse_shape (table_amp / table_phase).
+
+format_table(values) restituisce esattamente la stessa stringa di
+",".join(f"{x:.6f}" for x in values), ma scrive le cifre con operazioni NumPy
+in un unico buffer preallocato invece di formattare 4096 float uno alla volta.
+
+Con ``resolution`` la tabella viene quantizzata sul passo del registro e
+scritta con il minimo numero di decimali che identifica ancora il livello,
+senza zeri finali: stringhe piu' corte a parita' di contenuto sul dispositivo.
+
+parse_table(text) fa il percorso inverso (readback di un dump), sempre in
+NumPy, e compare_tables() confronta la tabella inviata con quella riletta.
+
+    python LLRF_tables.py     → micro-benchmark contro il join con f-string
+"""
+import math
+import time
+import warnings
+
+import numpy as np
+
+DECIMALS = 6
+
+# Passo assunto dei registri tabella (tabelle a 16 bit con segno): da
+# aggiornare se la documentazione del firmware indica una risoluzione diversa.
+TABLE_AMP_RESOLUTION = 2.0 ** -15
+TABLE_PHASE_RESOLUTION = 180.0 / 2 ** 15
+
+_COMMA, _DOT, _MINUS, _ZERO = ord(","), ord("."), ord("-"), ord("0")
+_POW10 = 10 ** np.arange(19, dtype=np.int64)
+
+# Indici fuori tolleranza riportati per esteso da compare_tables
+MAX_REPORTED_MISMATCHES = 16
+
+
+def format_table_reference(values, decimals=DECIMALS):
+    """Implementazione storica (loop Python), usata come riferimento e fallback."""
+    return ",".join(f"{x:.{decimals}f}" for x in np.asarray(values, dtype=float).ravel())
+
+
+def decimals_for_resolution(resolution):
+    """Minimo numero di decimali che distingue livelli distanti ``resolution``."""
+    return max(0, math.ceil(-math.log10(resolution) - 1e-12))
+
+
+def format_table(values, decimals=DECIMALS, resolution=None):
+    """
+    Serializza ``values`` come "v0,v1,..." con ``decimals`` cifre decimali.
+
+    Senza ``resolution`` l'output e' identico byte per byte a
+    ``",".join(f"{x:.6f}" for x in values)``. Con ``resolution`` i valori sono
+    arrotondati al multiplo piu' vicino del passo, ``decimals`` viene ricavato
+    dal passo e gli zeri finali sono omessi ("0.5", "1", "-0.25").
+    """
+    x = np.asarray(values, dtype=float).ravel()
+    if x.size == 0:
+        return ""
+
+    trim = resolution is not None
+    if trim:
+        x = np.rint(x / resolution) * resolution
+        decimals = decimals_for_resolution(resolution)
+
+    scale = 10.0 ** decimals
+    scaled = np.abs(x) * scale
+    if not np.all(np.isfinite(scaled)) or scaled.max() >= 2.0 ** 52:
+        # nan/inf o valori enormi: nessun registro li accetta, ma manteniamo
+        # comunque lo stesso output del formato storico
+        return format_table_reference(x, decimals)
+
+    q = np.rint(scaled).astype(np.int64)
+    # Dove la parte frazionaria e' ~0.5 l'errore della moltiplicazione puo'
+    # cambiare il verso dell'arrotondamento: quei pochi elementi sono
+    # riformattati con Python per restare identici a f"{x:.6f}".
+    frac = scaled - np.floor(scaled)
+    ambiguous = np.flatnonzero(np.abs(frac - 0.5) <= scaled * 2.0 ** -50 + 1e-300)
+    for i in ambiguous:
+        q[i] = int(f"{abs(x[i]):.{decimals}f}".replace(".", ""))
+
+    int_part = q // _POW10[decimals]
+    frac_part = q % _POW10[decimals]
+    negative = np.signbit(x)
+    if trim:
+        negative &= q != 0
+
+    n_int = np.ones(x.size, dtype=np.int64)
+    for k in range(1, 19):
+        n_int += int_part >= _POW10[k]
+
+    if trim:
+        # cifre decimali effettive per elemento, senza zeri finali
+        n_frac = np.zeros(x.size, dtype=np.int64)
+        for k in range(decimals):
+            n_frac += (frac_part % _POW10[decimals - k]) != 0
+        frac_part = frac_part // _POW10[decimals - n_frac]
+        has_dot = n_frac > 0
+    else:
+        n_frac = np.full(x.size, decimals, dtype=np.int64)
+        has_dot = np.full(x.size, decimals > 0)
+
+    length = negative + n_int + has_dot + n_frac
+    ends = np.cumsum(length + 1) - 1  # posizione della virgola dopo ogni valore
+
+    buf = np.empty(int(ends[-1]) + 1, dtype=np.uint8)
+    buf[ends] = _COMMA
+    for k in range(decimals):
+        mask = k < n_frac
+        buf[(ends - 1 - k)[mask]] = (frac_part // _POW10[k] % 10)[mask] + _ZERO
+    buf[(ends - 1 - n_frac)[has_dot]] = _DOT
+    int_end = ends - 1 - n_frac - has_dot
+    for k in range(int(n_int.max())):
+        mask = k < n_int
+        buf[(int_end - k)[mask]] = (int_part // _POW10[k] % 10)[mask] + _ZERO
+    buf[(int_end - n_int)[negative]] = _MINUS
+
+    return buf[:-1].tobytes().decode("ascii")
+
+
+def parse_table(text):
+    """
+    Inverso di format_table: "v0,v1,..." → array float64.
+
+    Il parsing e' quello in C di np.fromstring (nessun loop Python sugli
+    elementi, stesso valore di float() per ogni campo); un campo non numerico
+    solleva ValueError invece di troncare la tabella.
+    """
+    data = text.strip().strip("[]")
+    if not data:
+        return np.empty(0)
+    with warnings.catch_warnings():
+        # NumPy segnala i dati non letti fino in fondo con un warning
+        warnings.simplefilter("error")
+        try:
+            values = np.fromstring(data, dtype=float, sep=",")
+        except (ValueError, Warning):
+            values = None
+    if values is None or values.size != data.count(",") + 1:
+        raise ValueError(f"Not a numeric table: {data[:60]!r}...")
+    return values
+
+
+def compare_tables(expected, actual, tolerance):
+    """
+    Confronta la tabella inviata con quella riletta, elemento per elemento.
+
+    Restituisce un resoconto: ``ok``, numero di ``mismatches`` oltre
+    ``tolerance`` (lunghezze diverse contano come tutta la tabella),
+    ``max_error`` e i primi MAX_REPORTED_MISMATCHES indici con i due valori.
+    """
+    expected = np.asarray(expected, dtype=float).ravel()
+    actual = np.asarray(actual, dtype=float).ravel()
+    report = {'ok': True, 'length': expected.size, 'readback_length': actual.size,
+              'tolerance': tolerance, 'mismatches': 0, 'max_error': 0.0, 'first': []}
+    if actual.size != expected.size:
+        report.update(ok=False, mismatches=max(actual.size, expected.size), max_error=float("inf"))
+        return report
+    error = np.abs(actual - expected)
+    bad = np.flatnonzero(~(error <= tolerance))     # nan compreso
+    report['max_error'] = float(np.max(error)) if error.size else 0.0
+    if bad.size:
+        report.update(ok=False, mismatches=int(bad.size),
+                      first=[(int(i), float(expected[i]), float(actual[i]))
+                             for i in bad[:MAX_REPORTED_MISMATCHES]])
+    return report
+
+
+def benchmark(n=4096, repeat=200):
+    """Confronta format_table con il join storico su una tabella di ``n`` punti."""
+    rng = np.random.default_rng(0)
+    table = rng.uniform(-1, 1, n)
+    table[n // 2:] = 0.0
+
+    assert format_table(table) == format_table_reference(table)
+
+    results = {}
+    for label, func in [("f-string join", format_table_reference),
+                        ("format_table", format_table),
+                        ("format_table (quantized)",
+                         lambda t: format_table(t, resolution=TABLE_AMP_RESOLUTION))]:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            text = func(table)
+        elapsed = (time.perf_counter() - start) / repeat
+        results[label] = (elapsed, len(text))
+
+    print("=" * 60)
+    print(f" Table serializer benchmark ({n} points, {repeat} runs)")
+    print("=" * 60)
+    base = results["f-string join"][0]
+    for label, (elapsed, size) in results.items():
+        print(f"  {label:<26} {elapsed * 1e3:8.3f} ms  x{base / elapsed:5.1f}  {size} bytes")
+
+    text = format_table(table)
+    assert np.array_equal(parse_table(text), [float(v) for v in text.split(",")])
+    for label, func in [("float() split", lambda t: [float(v) for v in t.split(",")]),
+                        ("parse_table", parse_table)]:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func(text)
+        results[label] = ((time.perf_counter() - start) / repeat, len(text))
+        print(f"  {label:<26} {results[label][0] * 1e3:8.3f} ms  (readback parse)")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Strumenti sulle forme d'onda usati dalla GUI e da LLRFConnection.
+
+Waveform e' il tipo immutabile con cui GUI e connessione si scambiano le
+forme d'onda: buffer dei valori in sola lettura, base dei tempi esplicita
+(colonna dei tempi dei file 2D) o implicita (campioni uniformi sulla
+finestra di 34 µs). Normalizzazione, traslazione dei tempi e finestre
+restituiscono nuovi Waveform che condividono i buffer, e il ricampionamento
+sulla griglia della tabella (4096 punti, LLRF_resample) viene calcolato
+una sola volta:
+
+    wave = Waveform.from_array(np.loadtxt('dueCollonneTest.txt'))
+    wave = wave.normalized().shifted_time(0.5)
+    table = wave.device_table()      # cache: le chiamate successive sono gratuite
+
+ShiftBank precalcola, al caricamento di una forma d'onda, tutte le sue
+versioni traslate nel range dello slider: la sorgente viene affiancata da
+``M`` campioni di riempimento per lato e letta con una sliding window, cosi'
+la riga ``k`` (traslazione di ``k`` campioni) e' una vista sullo stesso
+buffer. Spostare lo slider costa O(1) per shift interi, e la memoria e'
+quella della sorgente piu' il riempimento, non N x numero di shift.
+
+Gli shift frazionari (es. 10 ns con un campione ogni 17 ns) vengono
+interpolati tra le due righe adiacenti (``fractional='linear'``) oppure
+ottenuti come ritardo frazionario nel dominio della frequenza
+(``fractional='fft'``, spettro calcolato una sola volta):
+
+    bank = ShiftBank(signal, samples_per_us=N / 34.0, max_shift_us=34.0, fill=1.0)
+    row = bank.shifted(2.37)      # vista (shift intero) o nuovo array
+"""
+import math
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from LLRF_resample import resample
+
+# Griglia della tabella di ff_pulse_shape: 4096 punti su 34 µs
+DEVICE_TABLE_LENGTH = 4096
+DEVICE_WINDOW_US = 34.0
+
+
+def _readonly(array, dtype=float):
+    """Array in sola lettura; copia solo se l'input e' ancora scrivibile."""
+    array = np.asarray(array, dtype=dtype)
+    if array.flags.writeable:
+        array = array.copy()
+        array.flags.writeable = False
+    return array
+
+
+class Waveform:
+    """
+    Forma d'onda immutabile: ``values`` e ``time`` (o None) sono in sola
+    lettura. Un array gia' in sola lettura viene adottato senza copia, uno
+    scrivibile viene copiato una volta: chi lo ha passato puo' continuare a
+    modificarlo senza effetti sul Waveform (niente aliasing tra thread).
+    """
+    __slots__ = ("values", "time", "_cache")
+
+    def __init__(self, values, time=None):
+        self.values = _readonly(values)
+        if self.values.ndim != 1:
+            raise ValueError("Waveform values must be 1-D (use Waveform.from_array for 2-D data)")
+        self.time = None if time is None else _readonly(time)
+        if self.time is not None and self.time.shape != self.values.shape:
+            raise ValueError("Waveform time and values must have the same length")
+        self._cache = {}
+
+    @classmethod
+    def from_array(cls, array):
+        """1D → valori su base dei tempi implicita; 2D → colonne (valore, tempo in µs)."""
+        array = np.asarray(array, dtype=float)
+        if array.ndim == 2:
+            return cls(array[:, 0], array[:, 1])
+        return cls(array)
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        if copy or (dtype is not None and np.dtype(dtype) != self.values.dtype):
+            return self.values.astype(dtype or self.values.dtype)
+        return self.values
+
+    @property
+    def has_time(self):
+        return self.time is not None
+
+    @property
+    def ndim(self):
+        """Come l'array storico: 2 con colonna dei tempi, altrimenti 1."""
+        return 2 if self.time is not None else 1
+
+    @property
+    def t_start(self):
+        return float(self.time[0]) if self.time is not None else 0.0
+
+    @property
+    def t_end(self):
+        return float(self.time[-1]) if self.time is not None else DEVICE_WINDOW_US
+
+    def _cached(self, key, compute):
+        try:
+            return self._cache[key]
+        except KeyError:
+            value = self._cache[key] = compute()
+            return value
+
+    def timebase(self):
+        """Tempi dei campioni [µs]: espliciti, o uniformi sulla finestra del dispositivo."""
+        if self.time is not None:
+            return self.time
+        return self._cached("timebase", lambda: _readonly(np.linspace(0, DEVICE_WINDOW_US, len(self))))
+
+    def with_values(self, values):
+        """Stessa base dei tempi, nuovi valori."""
+        return Waveform(values, self.time)
+
+    def shifted_time(self, dt):
+        """Base dei tempi traslata di ``dt`` µs (i valori sono condivisi)."""
+        return Waveform(self.values, self.timebase() + dt)
+
+    def starting_at(self, t0):
+        """Base dei tempi traslata in modo che il primo campione sia a ``t0``."""
+        return self.shifted_time(t0 - self.t_start) if self.time is not None else self
+
+    def window(self, start, stop):
+        """Campioni ``start:stop`` (viste, nessuna copia)."""
+        return Waveform(self.values[start:stop], None if self.time is None else self.time[start:stop])
+
+    def normalized(self):
+        """Valori divisi per il massimo (come al caricamento in GUI)."""
+        return self._cached("normalized", lambda: self.with_values(self.values / np.max(self.values)))
+
+    def rescaled(self):
+        """Valori riportati in [0, 1] (min → 0, max → 1)."""
+        def compute():
+            shifted = self.values - np.min(self.values)
+            return self.with_values(shifted / np.max(shifted))
+        return self._cached("rescaled", compute)
+
+    def resampled(self, length, mode="linear"):
+        """Valori su ``length`` punti equispaziati (vedi LLRF_resample; cache per length e modo)."""
+        return self._cached(("resampled", length, mode), lambda: _readonly(
+            resample(self.values, length, mode)))
+
+    def device_table(self, length=DEVICE_TABLE_LENGTH, mode="linear"):
+        """Valori sulla griglia della tabella del dispositivo."""
+        return self.resampled(length, mode)
+
+    def as_array(self):
+        """Rappresentazione storica: 1D, oppure colonne (valore, tempo)."""
+        if self.time is None:
+            return self.values
+        return np.column_stack([self.values, self.time])
+
+
+def as_waveform(wave):
+    """Waveform cosi' com'e', altrimenti costruito da un array 1D/2D."""
+    return wave if isinstance(wave, Waveform) else Waveform.from_array(wave)
+
+
+class ShiftBank:
+    def __init__(self, signal, samples_per_us, max_shift_us, fill=0.0, fractional="linear"):
+        if fractional not in ("linear", "fft", None):
+            raise ValueError(f"Unknown fractional shift method {fractional!r}")
+        signal = np.asarray(signal, dtype=float)
+        self.n = signal.shape[0]
+        self.samples_per_us = float(samples_per_us)
+        self.fill = float(fill)
+        self.fractional = fractional
+        # +1 per poter interpolare tra le righe k e k+1 anche allo shift massimo
+        self.margin = int(math.ceil(max_shift_us * self.samples_per_us)) + 1
+        self.padded = np.full(self.n + 2 * self.margin, self.fill)
+        self.padded[self.margin:self.margin + self.n] = signal
+        self.padded.flags.writeable = False
+        self.rows = sliding_window_view(self.padded, self.n)
+        self._spectrum = None
+
+    def row(self, k):
+        """Vista (sola lettura) della sorgente traslata di ``k`` campioni interi."""
+        k = max(-self.margin, min(self.margin, int(k)))
+        return self.rows[self.margin - k]
+
+    def shifted(self, shift_us):
+        """Forma d'onda traslata di ``shift_us``; i campioni scoperti valgono ``fill``."""
+        s = shift_us * self.samples_per_us
+        k = math.floor(s)
+        frac = s - k
+        if self.fractional is None or frac < 1e-9:
+            return self.row(k)
+        if 1 - frac < 1e-9:
+            return self.row(k + 1)
+        if self.fractional == "fft":
+            return self._fft_shift(s)
+        # y[i] = x(i - s): interpolazione tra x[i - k] e x[i - k - 1]
+        a = self.row(k)
+        b = self.row(k + 1)
+        return a + frac * (b - a)
+
+    def _fft_shift(self, s):
+        """Ritardo frazionario con fase lineare sullo spettro della sorgente con riempimento."""
+        if self._spectrum is None:
+            self._spectrum = np.fft.rfft(self.padded - self.fill)
+            self._freqs = np.fft.rfftfreq(self.padded.shape[0])
+        delayed = np.fft.irfft(self._spectrum * np.exp(-2j * np.pi * self._freqs * s),
+                               n=self.padded.shape[0])
+        return delayed[self.margin:self.margin + self.n] + self.fill
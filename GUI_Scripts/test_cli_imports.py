@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+"""
+Il percorso headless (LLRF_cli + LLRF) non deve importare PyQt5, pyqtgraph
+o PIL e deve restare entro IMPORT_BUDGET_S; check_imports() lo verifica in
+un interprete nuovo.
+
+    python -m pytest test_cli_imports.py
+"""
+from LLRF_cli import check_imports
+
+
+def test_cli_imports_no_gui_within_budget():
+    assert check_imports() is True